@@ -0,0 +1,443 @@
+import LdapConnection
+import LdapFilter
+import OperationStatistics
+import Member
+import ldap
+import marshal
+import os
+import sqlite3
+import time
+
+# The only attributes copied into the mirror: those the read-only tools use.
+# Anything else, and userPassword in particular, never leaves the server.
+REPLICATED_ATTRIBUTES = Member.MEMBER_ATTRIBUTES + ['objectClass', 'member', 'memberUid', 'modifyTimestamp']
+
+class ReplicaError(Exception):
+    '''
+    Raised when the local replica cannot be used, e.g. because it has never been
+    synchronized.
+    '''
+    pass
+
+class DirectoryReplica(LdapConnection.LdapConnection):
+    """
+    Class to read the member directory from a local SQLite mirror of ou=users and
+    ou=groups, instead of from the LDAP server.
+    
+    A DirectoryReplica can be used wherever a read-only LdapConnection is used
+    (see MemberDatabase.local_replica). Searches are answered from the mirror;
+    changes are refused. The mirror is kept up to date with sync.
+    """
+    
+    def __init__(self, path, loggingFacility, pageSize = LdapConnection.LdapConnection.PAGE_SIZE):
+        '''
+        (DirectoryReplica, str, Logger, int) -> None
+        
+        Opens (and if needed creates) the mirror in the SQLite database at path.
+        No connection to the LDAP server is made. A new database file is only
+        readable by its owner.
+        '''
+        self._hostname = path
+        self._dn = "replica"
+        self._pageSize = pageSize
+        self._logger = loggingFacility
+        self._connection = None
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0600))
+        self._db = sqlite3.connect(path)
+        self._db.text_factory = str
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, parent TEXT NOT NULL, dn TEXT NOT NULL, attributes BLOB NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+    
+    def close(self):
+        '''
+        (DirectoryReplica) -> None
+        
+        Closes the SQLite database.
+        '''
+        self._db.close()
+    
+    def replicated_bases(self):
+        '''
+        (DirectoryReplica) -> list
+        
+        Returns the subtrees that are mirrored, as a list of tuples (baseDN, scope).
+        '''
+        return [(self.MEMBERS_BASEDN + self.SUFFIX, ldap.SCOPE_ONELEVEL), (self.GROUPS_BASEDN + self.SUFFIX, ldap.SCOPE_SUBTREE)]
+    
+    def last_sync(self):
+        '''
+        (DirectoryReplica) -> str (or None)
+        
+        Returns the time of the last successful sync as 'YYYY-MM-DD HH:MM:SS', or
+        None if the mirror has never been synchronized.
+        '''
+        return self._get_state("lastsync")
+    
+    def sync(self, directory, full = False):
+        '''
+        (DirectoryReplica, LdapConnection, bool) -> (int, int)
+        
+        Brings the mirror up to date with directory. The first sync (or any sync
+        with full set to True) copies all records. Later syncs only read the records
+        whose modifyTimestamp is at least the newest one seen, plus the list of DNs
+        to find deleted records. If the server keeps a contextCSN (the syncprov
+        overlay), a sync in which it has not changed reads nothing else. Returns a
+        tuple (number of records written, number of records deleted).
+        
+        Only the REPLICATED_ATTRIBUTES are copied. A mirror that was written with
+        another list of attributes is copied again in full.
+        '''
+        attributeList = ",".join(REPLICATED_ATTRIBUTES)
+        if self._get_state("attributes") != attributeList:
+            full = True
+        contextCSN = self._context_csn(directory)
+        if not full and self.last_sync() is not None and contextCSN is not None and contextCSN == self._get_state("contextcsn"):
+            self._set_state("lastsync", time.strftime("%Y-%m-%d %H:%M:%S"))
+            self._db.commit()
+            return 0, 0
+        written = 0
+        deleted = 0
+        try:
+            for baseDN, scope in self.replicated_bases():
+                newest = self._get_state("newest:" + baseDN.lower())
+                incremental = not full and newest is not None
+                if not incremental:
+                    newest = None
+                    deleted += self._db.execute("DELETE FROM entries WHERE " + self._scope_condition(scope), self._scope_arguments(baseDN, scope)).rowcount
+                    searchFilter = "(objectClass=*)"
+                else:
+                    searchFilter = "(modifyTimestamp>=%s)" % newest
+                for DN, attributes in directory.search_paged(searchFilter, baseDN, scope, REPLICATED_ATTRIBUTES):
+                    self._store(DN, attributes)
+                    for timestamp in attributes.get('modifyTimestamp', []):
+                        if newest is None or timestamp > newest:
+                            newest = timestamp
+                    written += 1
+                if incremental:
+                    deleted += self._remove_deleted(directory, baseDN, scope)
+                if newest is not None:
+                    self._set_state("newest:" + baseDN.lower(), newest)
+            if contextCSN is not None:
+                self._set_state("contextcsn", contextCSN)
+            self._set_state("attributes", attributeList)
+            self._set_state("lastsync", time.strftime("%Y-%m-%d %H:%M:%S"))
+        except:
+            self._db.rollback()
+            raise
+        self._db.commit()
+        self._logger.debug("Synchronized replica %s: %i records written, %i deleted" % (self._hostname, written, deleted))
+        return written, deleted
+    
+    @OperationStatistics.timed("search")
+    def search(self, searchFilter, baseDN, searchScope, targetAttributes, suppressNoResults = True):
+        '''
+        (DirectoryReplica, str, str, ldap.SCOPE, list, bool) -> list
+        
+        Searches the mirror like LdapConnection.search.
+        '''
+        results = list(self.search_paged(searchFilter, baseDN, searchScope, targetAttributes))
+        if not results and not suppressNoResults:
+            raise ldap.NO_RESULTS_RETURNED
+        return results
+    
+    @OperationStatistics.timed_iteration("search")
+    def search_paged(self, searchFilter, baseDN, searchScope, targetAttributes, pageSize = None):
+        '''
+        (DirectoryReplica, str, str, ldap.SCOPE, list, int) -> generator
+        
+        Searches the mirror like LdapConnection.search_paged. Searching below a
+        record that is not in the mirror throws an LDAP exception
+        (ldap.NO_SUCH_OBJECT), like the server does.
+        '''
+        tree = LdapFilter.parse(searchFilter)
+        if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (baseDN.lower(),)).fetchone() is None and not self._is_replicated_base(baseDN):
+            raise ldap.NO_SUCH_OBJECT({'desc': "No such object", 'matched': self.SUFFIX[1:]})
+        cursor = self._db.execute("SELECT dn, attributes FROM entries WHERE " + self._scope_condition(searchScope) + " ORDER BY key", self._scope_arguments(baseDN, searchScope))
+        for DN, attributes in cursor:
+            attributes = marshal.loads(str(attributes))
+            if LdapFilter.matches(tree, attributes):
+                yield DN, select_attributes(attributes, targetAttributes)
+    
+    def add(self, toAddDN, attributes):
+        '''
+        (DirectoryReplica, str, dict) -> None
+        
+        Refuses to add: the mirror is read-only.
+        '''
+        self._refuse()
+    
+    def delete(self, toDeleteDN):
+        '''
+        (DirectoryReplica, str) -> None
+        
+        Refuses to delete: the mirror is read-only.
+        '''
+        self._refuse()
+    
+    def modify(self, toModifyDN, modifications):
+        '''
+        (DirectoryReplica, str, list) -> None
+        
+        Refuses to modify: the mirror is read-only.
+        '''
+        self._refuse()
+    
+    def password(self, memberDN, passwordToSet):
+        '''
+        (DirectoryReplica, str, str) -> None
+        
+        Refuses to set a password: the mirror is read-only.
+        '''
+        self._refuse()
+    
+    def batch(self):
+        '''
+        (DirectoryReplica) -> ReplicaBatch
+        
+        Returns a new ReplicaBatch, which answers lookups like an LdapBatch.
+        '''
+        return ReplicaBatch(self)
+    
+    def _refuse(self):
+        '''
+        (DirectoryReplica) -> None
+        
+        Throws an LDAP exception (ldap.UNWILLING_TO_PERFORM) for a change.
+        '''
+        raise ldap.UNWILLING_TO_PERFORM({'desc': "Server is unwilling to perform", 'info': "The local replica is read-only."})
+    
+    def _store(self, DN, attributes):
+        '''
+        (DirectoryReplica, str, dict) -> None
+        
+        Writes the record DN with attributes to the mirror, replacing any older copy.
+        Attributes that are not in REPLICATED_ATTRIBUTES are left out.
+        '''
+        attributes = select_attributes(attributes, REPLICATED_ATTRIBUTES)
+        key = DN.lower()
+        parent = key.split(",", 1)[1] if "," in key else ""
+        self._db.execute("INSERT OR REPLACE INTO entries (key, parent, dn, attributes) VALUES (?, ?, ?, ?)", (key, parent, DN, sqlite3.Binary(marshal.dumps(attributes))))
+    
+    def _remove_deleted(self, directory, baseDN, scope):
+        '''
+        (DirectoryReplica, LdapConnection, str, ldap.SCOPE) -> int
+        
+        Deletes the records under baseDN that no longer exist in directory, and
+        returns their number. Only the DNs are read from the directory.
+        '''
+        existing = set()
+        for DN, attributes in directory.search_paged("(objectClass=*)", baseDN, scope, ['1.1']):
+            existing.add(DN.lower())
+        deleted = []
+        for (key,) in self._db.execute("SELECT key FROM entries WHERE " + self._scope_condition(scope), self._scope_arguments(baseDN, scope)):
+            if key not in existing:
+                deleted.append((key,))
+        self._db.executemany("DELETE FROM entries WHERE key = ?", deleted)
+        return len(deleted)
+    
+    def _context_csn(self, directory):
+        '''
+        (DirectoryReplica, LdapConnection) -> str (or None)
+        
+        Returns the contextCSN of the directory suffix, which changes with every
+        change in the directory, or None if the server does not keep one.
+        '''
+        try:
+            results = directory.search("(objectClass=*)", self.SUFFIX[1:], ldap.SCOPE_BASE, ['contextCSN'])
+        except ldap.LDAPError:
+            return None
+        if not results:
+            return None
+        values = results[0][1].get('contextCSN')
+        if not values:
+            return None
+        return ";".join(sorted(values))
+    
+    def _is_replicated_base(self, baseDN):
+        '''
+        (DirectoryReplica, str) -> bool
+        
+        Returns True iff baseDN is the root of one of the mirrored subtrees.
+        '''
+        for replicatedBaseDN, scope in self.replicated_bases():
+            if baseDN.lower() == replicatedBaseDN.lower():
+                return True
+        return False
+    
+    def _scope_condition(self, scope):
+        '''
+        (DirectoryReplica, ldap.SCOPE) -> str
+        
+        Returns the SQL condition that selects the records in scope of a base DN,
+        to be used with the arguments from _scope_arguments.
+        '''
+        if scope == ldap.SCOPE_BASE:
+            return "key = ?"
+        elif scope == ldap.SCOPE_ONELEVEL:
+            return "parent = ?"
+        else:
+            return "(key = ? OR substr(key, -?) = ?)"
+    
+    def _scope_arguments(self, baseDN, scope):
+        '''
+        (DirectoryReplica, str, ldap.SCOPE) -> tuple
+        
+        Returns the arguments for the condition from _scope_condition.
+        '''
+        key = baseDN.lower()
+        if scope == ldap.SCOPE_SUBTREE:
+            return (key, len(key) + 1, "," + key)
+        return (key,)
+    
+    def _get_state(self, name):
+        '''
+        (DirectoryReplica, str) -> str (or None)
+        
+        Returns the stored value of the sync state name, or None if it is not set.
+        '''
+        row = self._db.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+    
+    def _set_state(self, name, value):
+        '''
+        (DirectoryReplica, str, str) -> None
+        
+        Stores value as the sync state name.
+        '''
+        self._db.execute("INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)", (name, value))
+
+
+class ReplicaBatch:
+    """
+    Class to answer the lookups of an LdapBatch from a DirectoryReplica.
+    
+    Lookups are answered right away; collect returns their results in the same
+    form as LdapBatch.collect. Changes are refused, like in the DirectoryReplica.
+    """
+    
+    def __init__(self, replica):
+        '''
+        (ReplicaBatch, DirectoryReplica) -> None
+        
+        Initialize an empty batch on replica.
+        '''
+        self._replica = replica
+        self._results = []
+    
+    def __len__(self):
+        '''
+        (ReplicaBatch) -> int
+        
+        Returns the number of operations whose results have not been collected yet.
+        '''
+        return len(self._results)
+    
+    def search(self, searchFilter, baseDN, searchScope, targetAttributes):
+        '''
+        (ReplicaBatch, str, str, ldap.SCOPE, list) -> int
+        
+        Searches like LdapBatch.search.
+        '''
+        try:
+            result = self._replica.search(searchFilter, baseDN, searchScope, targetAttributes)
+        except ldap.LDAPError, e:
+            result = e
+        return self._append(result)
+    
+    def attributes(self, DN, extraAttributes = []):
+        '''
+        (ReplicaBatch, str, list) -> int
+        
+        Looks up the attributes of the record DN like LdapBatch.attributes.
+        '''
+        return self.search("(cn=*)", DN, ldap.SCOPE_BASE, ['*'] + extraAttributes)
+    
+    def add(self, toAddDN, attributes):
+        '''
+        (ReplicaBatch, str, dict) -> int
+        
+        Refuses the addition of a record.
+        '''
+        return self._refuse()
+    
+    def delete(self, toDeleteDN):
+        '''
+        (ReplicaBatch, str) -> int
+        
+        Refuses the deletion of a record.
+        '''
+        return self._refuse()
+    
+    def modify(self, toModifyDN, modifications):
+        '''
+        (ReplicaBatch, str, list) -> int
+        
+        Refuses the modification of a record.
+        '''
+        return self._refuse()
+    
+    def password(self, memberDN, passwordToSet):
+        '''
+        (ReplicaBatch, str, str) -> int
+        
+        Refuses the setting of a password.
+        '''
+        return self._refuse()
+    
+    def collect(self, raiseErrors = False):
+        '''
+        (ReplicaBatch, bool) -> list
+        
+        Returns the results of all operations so far, like LdapBatch.collect.
+        '''
+        results = self._results
+        self._results = []
+        if raiseErrors:
+            for result in results:
+                if isinstance(result, ldap.LDAPError):
+                    raise result
+        return results
+    
+    def _refuse(self):
+        '''
+        (ReplicaBatch) -> int
+        
+        Registers the refusal of a change as the result of an operation.
+        '''
+        try:
+            self._replica._refuse()
+        except ldap.LDAPError, e:
+            return self._append(e)
+    
+    def _append(self, result):
+        '''
+        (ReplicaBatch, object) -> int
+        
+        Registers the result of an operation, and returns its position in the batch.
+        '''
+        self._results.append(result)
+        return len(self._results) - 1
+
+### END OF CLASS
+
+def select_attributes(attributes, targetAttributes):
+    '''
+    (dict, list) -> dict
+    
+    Returns the part of attributes that a search for targetAttributes returns:
+    all user attributes for '*' (and for no targetAttributes at all), plus the
+    attributes named in targetAttributes, and none for '1.1'. modifyTimestamp is
+    only returned when asked for by name, as it is an operational attribute.
+    '''
+    if not targetAttributes:
+        targetAttributes = ['*']
+    wanted = set([name.lower() for name in targetAttributes])
+    selected = {}
+    for name, values in attributes.items():
+        if name.lower() in wanted or ('*' in wanted and name.lower() != "modifytimestamp"):
+            selected[name] = list(values)
+    return selected
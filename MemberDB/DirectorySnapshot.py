@@ -0,0 +1,134 @@
+import Member
+import LdapConnection
+import SqlConnection
+import ldap
+
+class DirectorySnapshot:
+    '''
+    Class to answer questions about all members and groups in the MemberDatabase
+    from one read of the directory.
+    '''
+    
+    def __init__(self, directory, database, getMember = None):
+        '''
+        (DirectorySnapshot, LdapConnection, SqlConnection, function) -> None
+        
+        Reads all members (with the attributes in Member.MEMBER_ATTRIBUTES) and all
+        groups (with their members) from the directory, in one paged search each.
+        All other methods work on this data only, so the number of round trips does
+        not depend on the number of members, users or roles.
+        
+        getMember(lidnummer, attributes) returns the Member for a lidnummer, such as
+        MemberDatabase.get_member; by default, a new Member is made every time.
+        '''
+        self._directory = directory
+        self._database = database
+        if getMember is None:
+            getMember = lambda lidnummer, attributes: Member.Member(directory, database, lidnummer, attributes)
+        self._getMember = getMember
+        self._members = {}
+        self._numberOfUsers = 0
+        for entry in directory.search_members_paged(directory.EMPTY_MEMBER_FILTER, Member.MEMBER_ATTRIBUTES):
+            self._members[entry[0].lower()] = entry
+            if 'uid' in entry[1]:
+                self._numberOfUsers += 1
+        # Group lists by (subOU, name), in the order in which the directory returned them.
+        self._groups = {}
+        self._groupOrder = []
+        searchFilter = "objectClass=groupOfNames"
+        baseDN = directory.GROUPS_BASEDN + directory.SUFFIX
+        for groupDN, attributes in directory.search_paged(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['cn', 'member']):
+            memberDNs = []
+            for memberDN in attributes.get('member', []):
+                if memberDN != directory.STRUCTURAL_USER:
+                    memberDNs.append(memberDN)
+            key = (directory.extract_group_sub_ou(groupDN), directory.extract_cn(groupDN))
+            if key not in self._groups:
+                self._groupOrder.append(key)
+                self._groups[key] = memberDNs
+    
+    def number_of_members(self):
+        '''
+        (DirectorySnapshot) -> int
+        
+        Returns the number of members in the snapshot.
+        '''
+        return len(self._members)
+    
+    def number_of_users(self):
+        '''
+        (DirectorySnapshot) -> int
+        
+        Returns the number of users in the snapshot.
+        '''
+        return self._numberOfUsers
+    
+    def has_group(self, groupName, groupSubOU = ''):
+        '''
+        (DirectorySnapshot, str, str) -> bool
+        
+        Returns True iff the group existed when the snapshot was taken. See Group
+        for the meaning of groupSubOU.
+        '''
+        return self._group_member_dns(groupName, groupSubOU) is not None
+    
+    def group_members(self, groupName, groupSubOU = ''):
+        '''
+        (DirectorySnapshot, str, str) -> list
+        
+        Returns a list of Members who are a member of the group, like Group.members.
+        The Members have their attributes loaded from the snapshot. Returns an empty
+        list if the group does not exist.
+        '''
+        memberDNs = self._group_member_dns(groupName, groupSubOU)
+        if memberDNs is None:
+            return []
+        members = []
+        for memberDN in memberDNs:
+            entry = self._members.get(memberDN.lower())
+            if entry is None:
+                members.append(self._getMember(int(self._directory.extract_cn(memberDN)), None))
+            else:
+                members.append(self._getMember(int(entry[1]['cn'][0]), entry[1]))
+        return members
+    
+    def number_of_group_members(self, groupName, groupSubOU = ''):
+        '''
+        (DirectorySnapshot, str, str) -> int
+        
+        Returns the number of members of the group, or 0 if it does not exist.
+        '''
+        memberDNs = self._group_member_dns(groupName, groupSubOU)
+        if memberDNs is None:
+            return 0
+        return len(memberDNs)
+    
+    def out_of_band_members(self):
+        '''
+        (DirectorySnapshot) -> list
+        
+        Returns a list of Members with out-of-band status.
+        '''
+        return self.group_members("type-outofband")
+    
+    def role_names(self):
+        '''
+        (DirectorySnapshot) -> list
+        
+        Returns the names of all Roles in the snapshot, in the order in which the
+        directory returned them.
+        '''
+        roleNames = []
+        for groupSubOU, groupName in self._groupOrder:
+            if groupSubOU == '' and groupName.startswith(self._directory.ROLE_PREFIX):
+                roleNames.append(groupName)
+        return roleNames
+    
+    def _group_member_dns(self, groupName, groupSubOU):
+        '''
+        (DirectorySnapshot, str, str) -> list (or None)
+        
+        Returns the member DNs of the group, without the structural user, or None if
+        the group is not in the snapshot.
+        '''
+        return self._groups.get((groupSubOU, groupName))
@@ -0,0 +1,366 @@
+import LdapConnection
+import LdapFilter
+import DirectoryReplica
+import ldap
+import time
+
+class FakeLdapConnection(LdapConnection.LdapConnection):
+    """
+    Class to stand in for an LdapConnection in benchmarks, holding the directory
+    in memory.
+    
+    Every operation is counted per type, and every round trip to the (imaginary)
+    server waits latency seconds. Operations in one batch share a round trip, as
+    they do in an LdapBatch.
+    """
+    
+    def __init__(self, entries, loggingFacility, latency = 0.0, pageSize = LdapConnection.LdapConnection.PAGE_SIZE):
+        '''
+        (FakeLdapConnection, dict, Logger, float, int) -> None
+        
+        Initializes the FakeLdapConnection with entries, a dict that maps each DN to
+        its attributes (a dict of lists). The dict is used as it is, not copied.
+        '''
+        self._hostname = "memory"
+        self._dn = "fake"
+        self._pageSize = pageSize
+        self._logger = loggingFacility
+        self._connection = None
+        self._latency = latency
+        self._entries = {}
+        self._children = {}
+        for DN, attributes in entries.items():
+            self._store(DN, attributes)
+        self.reset_counts()
+    
+    def reset_counts(self):
+        '''
+        (FakeLdapConnection) -> None
+        
+        Sets the operation and round trip counts to zero.
+        '''
+        self.operations = {}
+        self.roundTrips = 0
+    
+    def search(self, searchFilter, baseDN, searchScope, targetAttributes, suppressNoResults = True):
+        '''
+        (FakeLdapConnection, str, str, ldap.SCOPE, list, bool) -> list
+        
+        Searches like LdapConnection.search, in one round trip.
+        '''
+        self._count('search')
+        self._round_trip()
+        results = self._search(searchFilter, baseDN, searchScope, targetAttributes)
+        if not results and not suppressNoResults:
+            raise ldap.NO_RESULTS_RETURNED
+        return results
+    
+    def search_paged(self, searchFilter, baseDN, searchScope, targetAttributes, pageSize = None):
+        '''
+        (FakeLdapConnection, str, str, ldap.SCOPE, list, int) -> generator
+        
+        Searches like LdapConnection.search_paged, with one round trip per page.
+        '''
+        if pageSize is None:
+            pageSize = self._pageSize
+        self._count('search')
+        self._round_trip()
+        results = self._search(searchFilter, baseDN, searchScope, targetAttributes)
+        for start in range(0, len(results), pageSize):
+            if start > 0:
+                self._round_trip()
+            for entry in results[start:start + pageSize]:
+                yield entry
+    
+    def add(self, toAddDN, attributes):
+        '''
+        (FakeLdapConnection, str, dict) -> None
+        
+        Adds a record like LdapConnection.add, in one round trip.
+        '''
+        self._count('add')
+        self._round_trip()
+        self._add(toAddDN, attributes)
+    
+    def delete(self, toDeleteDN):
+        '''
+        (FakeLdapConnection, str) -> None
+        
+        Deletes a record like LdapConnection.delete, in one round trip.
+        '''
+        self._count('delete')
+        self._round_trip()
+        self._delete(toDeleteDN)
+    
+    def modify(self, toModifyDN, modifications):
+        '''
+        (FakeLdapConnection, str, list) -> None
+        
+        Modifies a record like LdapConnection.modify, in one round trip.
+        '''
+        self._count('modify')
+        self._round_trip()
+        self._modify(toModifyDN, modifications)
+    
+    def password(self, memberDN, passwordToSet):
+        '''
+        (FakeLdapConnection, str, str) -> None
+        
+        Sets a password like LdapConnection.password, in one round trip.
+        '''
+        self._count('password')
+        self._round_trip()
+        self._password(memberDN, passwordToSet)
+    
+    def batch(self):
+        '''
+        (FakeLdapConnection) -> FakeLdapBatch
+        
+        Returns a new FakeLdapBatch on this connection.
+        '''
+        return FakeLdapBatch(self)
+    
+    def _count(self, operation):
+        '''
+        (FakeLdapConnection, str) -> None
+        
+        Counts one operation of type operation.
+        '''
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+    
+    def _round_trip(self):
+        '''
+        (FakeLdapConnection) -> None
+        
+        Counts one round trip to the server and waits for its latency.
+        '''
+        self.roundTrips += 1
+        if self._latency:
+            time.sleep(self._latency)
+    
+    def _search(self, searchFilter, baseDN, searchScope, targetAttributes):
+        '''
+        (FakeLdapConnection, str, str, ldap.SCOPE, list) -> list
+        
+        Returns the records matching the search, without counting anything.
+        '''
+        tree = LdapFilter.parse(searchFilter)
+        key = baseDN.lower()
+        if key not in self._entries and key not in self._children:
+            raise ldap.NO_SUCH_OBJECT({'desc': "No such object"})
+        if searchScope == ldap.SCOPE_BASE:
+            keys = [key]
+        elif searchScope == ldap.SCOPE_ONELEVEL:
+            keys = sorted(self._children.get(key, []))
+        else:
+            keys = [key]
+            pending = [key]
+            while pending:
+                children = sorted(self._children.get(pending.pop(), []))
+                keys.extend(children)
+                pending.extend(children)
+        results = []
+        for key in keys:
+            if key not in self._entries:
+                continue
+            DN, attributes = self._entries[key]
+            if LdapFilter.matches(tree, attributes):
+                results.append((DN, DirectoryReplica.select_attributes(attributes, targetAttributes)))
+        return results
+    
+    def _store(self, DN, attributes):
+        '''
+        (FakeLdapConnection, str, dict) -> None
+        
+        Stores the record DN with attributes.
+        '''
+        key = DN.lower()
+        self._entries[key] = (DN, attributes)
+        if "," in key:
+            self._children.setdefault(key.split(",", 1)[1], set()).add(key)
+    
+    def _add(self, toAddDN, attributes):
+        '''
+        (FakeLdapConnection, str, dict) -> None
+        
+        Adds the record toAddDN, without counting anything.
+        '''
+        if toAddDN.lower() in self._entries:
+            raise ldap.ALREADY_EXISTS({'desc': "Already exists"})
+        attributes = dict([(name, list(values)) for name, values in attributes.items()])
+        attributes['modifyTimestamp'] = [timestamp()]
+        self._store(toAddDN, attributes)
+    
+    def _delete(self, toDeleteDN):
+        '''
+        (FakeLdapConnection, str) -> None
+        
+        Deletes the record toDeleteDN, without counting anything.
+        '''
+        key = toDeleteDN.lower()
+        if key not in self._entries:
+            raise ldap.NO_SUCH_OBJECT({'desc': "No such object"})
+        del self._entries[key]
+        if "," in key:
+            self._children.get(key.split(",", 1)[1], set()).discard(key)
+    
+    def _modify(self, toModifyDN, modifications):
+        '''
+        (FakeLdapConnection, str, list) -> None
+        
+        Applies modifications to the record toModifyDN, without counting anything.
+        Like the server, it applies all of them or none.
+        '''
+        key = toModifyDN.lower()
+        if key not in self._entries:
+            raise ldap.NO_SUCH_OBJECT({'desc': "No such object"})
+        attributes = dict([(name, list(values)) for name, values in self._entries[key][1].items()])
+        for operation, name, values in modifications:
+            if values is None:
+                values = []
+            elif not isinstance(values, list):
+                values = [values]
+            current = attributes.setdefault(name, [])
+            if operation == ldap.MOD_ADD:
+                for value in values:
+                    if value in current:
+                        raise ldap.TYPE_OR_VALUE_EXISTS({'desc': "Type or value exists"})
+                    current.append(value)
+            elif operation == ldap.MOD_DELETE:
+                if not current:
+                    raise ldap.NO_SUCH_ATTRIBUTE({'desc': "No such attribute"})
+                if not values:
+                    del current[:]
+                for value in values:
+                    if value not in current:
+                        raise ldap.NO_SUCH_ATTRIBUTE({'desc': "No such attribute"})
+                    current.remove(value)
+            else:
+                current[:] = values
+            if not current:
+                del attributes[name]
+        attributes['modifyTimestamp'] = [timestamp()]
+        self._entries[key] = (self._entries[key][0], attributes)
+    
+    def _password(self, memberDN, passwordToSet):
+        '''
+        (FakeLdapConnection, str, str) -> None
+        
+        Sets the password of the record memberDN, without counting anything.
+        '''
+        self._modify(memberDN, [(ldap.MOD_REPLACE, 'userPassword', [passwordToSet])])
+
+
+class FakeLdapBatch:
+    """
+    Class to stand in for an LdapBatch on a FakeLdapConnection.
+    
+    Operations are carried out right away and counted; collecting their results
+    costs one round trip for the whole batch.
+    """
+    
+    def __init__(self, connection):
+        '''
+        (FakeLdapBatch, FakeLdapConnection) -> None
+        
+        Initialize an empty batch on connection.
+        '''
+        self._connection = connection
+        self._results = []
+    
+    def __len__(self):
+        '''
+        (FakeLdapBatch) -> int
+        
+        Returns the number of operations whose results have not been collected yet.
+        '''
+        return len(self._results)
+    
+    def search(self, searchFilter, baseDN, searchScope, targetAttributes):
+        '''
+        (FakeLdapBatch, str, str, ldap.SCOPE, list) -> int
+        
+        Searches like LdapBatch.search.
+        '''
+        return self._run('search', self._connection._search, searchFilter, baseDN, searchScope, targetAttributes)
+    
+    def attributes(self, DN, extraAttributes = []):
+        '''
+        (FakeLdapBatch, str, list) -> int
+        
+        Looks up the attributes of the record DN like LdapBatch.attributes.
+        '''
+        return self.search("(cn=*)", DN, ldap.SCOPE_BASE, ['*'] + extraAttributes)
+    
+    def add(self, toAddDN, attributes):
+        '''
+        (FakeLdapBatch, str, dict) -> int
+        
+        Adds a record like LdapBatch.add.
+        '''
+        return self._run('add', self._connection._add, toAddDN, attributes)
+    
+    def delete(self, toDeleteDN):
+        '''
+        (FakeLdapBatch, str) -> int
+        
+        Deletes a record like LdapBatch.delete.
+        '''
+        return self._run('delete', self._connection._delete, toDeleteDN)
+    
+    def modify(self, toModifyDN, modifications):
+        '''
+        (FakeLdapBatch, str, list) -> int
+        
+        Modifies a record like LdapBatch.modify.
+        '''
+        return self._run('modify', self._connection._modify, toModifyDN, modifications)
+    
+    def password(self, memberDN, passwordToSet):
+        '''
+        (FakeLdapBatch, str, str) -> int
+        
+        Sets a password like LdapBatch.password.
+        '''
+        return self._run('password', self._connection._password, memberDN, passwordToSet)
+    
+    def collect(self, raiseErrors = False):
+        '''
+        (FakeLdapBatch, bool) -> list
+        
+        Returns the results of all operations so far like LdapBatch.collect, in one
+        round trip.
+        '''
+        results = self._results
+        self._results = []
+        if results:
+            self._connection._round_trip()
+        if raiseErrors:
+            for result in results:
+                if isinstance(result, ldap.LDAPError):
+                    raise result
+        return results
+    
+    def _run(self, operation, function, *arguments):
+        '''
+        (FakeLdapBatch, str, function, ...) -> int
+        
+        Counts and carries out an operation, and registers its result.
+        '''
+        self._connection._count(operation)
+        try:
+            result = function(*arguments)
+        except ldap.LDAPError, e:
+            result = e
+        self._results.append(result)
+        return len(self._results) - 1
+
+### END OF CLASS
+
+def timestamp():
+    '''
+    () -> str
+    
+    Returns the current time as an LDAP generalized time.
+    '''
+    return time.strftime("%Y%m%d%H%M%SZ", time.gmtime())
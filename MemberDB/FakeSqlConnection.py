@@ -0,0 +1,147 @@
+import SqlConnection
+import contextlib
+import sqlite3
+import time
+
+class FakeSqlConnection(SqlConnection.SqlConnection):
+    '''
+    Class to stand in for an SqlConnection in benchmarks, holding the usernames
+    table in an in-memory SQLite database.
+    
+    Every query is counted, and every round trip to the (imaginary) server waits
+    latency seconds. dosql_many costs one round trip for all of its rows.
+    '''
+    
+    def __init__(self, usernames, loggingFacility, latency = 0.0):
+        '''
+        (FakeSqlConnection, list, Logger, float) -> None
+        
+        Initializes the FakeSqlConnection with the rows (lidnummer, username) of the
+        usernames table in usernames.
+        '''
+        self._logger = loggingFacility
+        self._latency = latency
+        self._transactionDepth = 0
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute("CREATE TABLE usernames (lidnummer INTEGER NOT NULL, username TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX usernames_username ON usernames (username)")
+        self._db.executemany("INSERT INTO usernames (lidnummer, username) VALUES (?, ?)", usernames)
+        self._db.commit()
+        self.reset_counts()
+    
+    def __str__(self):
+        '''
+        (FakeSqlConnection) -> str
+        
+        Returns a human-readable representation of the connection.
+        '''
+        return "fake @ memory"
+    
+    def reset_counts(self):
+        '''
+        (FakeSqlConnection) -> None
+        
+        Sets the query and round trip counts to zero.
+        '''
+        self.operations = {}
+        self.roundTrips = 0
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        (FakeSqlConnection) -> context manager
+        
+        Groups queries into one transaction like SqlConnection.transaction.
+        '''
+        self._transactionDepth += 1
+        try:
+            yield self
+        except:
+            self._transactionDepth -= 1
+            if self._transactionDepth == 0:
+                self._db.rollback()
+            raise
+        self._transactionDepth -= 1
+        if self._transactionDepth == 0:
+            self._round_trip()
+            self._db.commit()
+    
+    def dosql(self, sql, value, expectRows, dryrun=False):
+        '''
+        (FakeSqlConnection, str, tuple, bool, bool) -> list (or None)
+        
+        Executes the query like SqlConnection.dosql, in one round trip.
+        '''
+        if dryrun:
+            return None
+        self._count('sql')
+        self._round_trip()
+        if value == "":
+            value = ()
+        elif not isinstance(value, tuple):
+            value = (value,)
+        try:
+            cursor = self._db.execute(sql.replace("%s", "?"), value)
+        except sqlite3.Error, e:
+            self._logger.error("Error executing previous query: %s" % str(e))
+            if expectRows or self.in_transaction():
+                raise SqlConnection.SqlError(str(e))
+            return None
+        rows = None
+        if expectRows:
+            rows = [list(row) for row in cursor.fetchall()]
+        if self._transactionDepth == 0:
+            self._db.commit()
+        return rows
+    
+    def dosql_many(self, sql, values, dryrun=False):
+        '''
+        (FakeSqlConnection, str, list, bool) -> None
+        
+        Executes the query for every tuple in values like SqlConnection.dosql_many,
+        in one round trip.
+        '''
+        if dryrun or not values:
+            return
+        self._count('sql')
+        with self.transaction():
+            try:
+                self._db.executemany(sql.replace("%s", "?"), values)
+            except sqlite3.Error, e:
+                self._logger.error("Error executing previous query: %s" % str(e))
+                raise SqlConnection.SqlError(str(e))
+    
+    def in_transaction(self):
+        '''
+        (FakeSqlConnection) -> bool
+        
+        Returns True iff a transaction is open, like SqlConnection.in_transaction.
+        '''
+        return self._transactionDepth > 0
+    
+    def close(self):
+        '''
+        (FakeSqlConnection) -> None
+        
+        Closes the in-memory database.
+        '''
+        self._db.close()
+    
+    def _count(self, operation):
+        '''
+        (FakeSqlConnection, str) -> None
+        
+        Counts one operation of type operation.
+        '''
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+    
+    def _round_trip(self):
+        '''
+        (FakeSqlConnection) -> None
+        
+        Counts one round trip to the server and waits for its latency.
+        '''
+        self.roundTrips += 1
+        if self._latency:
+            time.sleep(self._latency)
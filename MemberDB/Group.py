@@ -3,10 +3,14 @@ import LdapConnection
 import SqlConnection
 import ldap
 
-class Group():
+class Group(object):
     '''
     Class to manipulate a group in the MemberDatabase.
+    
+    Groups are hashable (by name and subOU). Use MemberDatabase.get_group to get
+    the shared instance for a group.
     '''
+    __slots__ = ('_directory', '_database', '_name', '_subOU', '__weakref__')
 
     def __init__(self, directory, database, groupName, groupSubOU = ''):
         '''
@@ -46,10 +50,11 @@ class Group():
         '''
         (Group, Group) -> bool
         
-        Returns True iff the two Groups are equivalent (i.e. have the same group name).
+        Returns True iff the two Groups are equivalent (i.e. have the same group name
+        and subOU).
         '''
         if isinstance(otherGroup, self.__class__):
-            return self._name == otherGroup.get_name() and self._subOU == otherGroup.getSubOU()
+            return self._name == otherGroup.get_name() and self._subOU == otherGroup.get_subOU()
         else:
             return False
     
@@ -61,14 +66,23 @@ class Group():
         group names).
         '''
         return not self.__eq__(otherGroup)
+    
+    def __hash__(self):
+        '''
+        (Group) -> int
+        
+        Returns a hash of Group that agrees with __eq__.
+        '''
+        return hash((self._name, self._subOU))
 
     def __contains__(self, member):
         '''
         (Group, Member) -> bool
         
-        Returns True iff the Member is a member of the Group.
+        Returns True iff the Member is a member of the Group. Costs one lookup of
+        the Group; use member_dns to test many Members.
         '''
-        return member in self.members()
+        return member.DN().lower() in self.member_dns()
     
     def exists(self):
         '''
@@ -145,23 +159,96 @@ class Group():
         '''
         self._directory.delete(self.DN())
     
-    def add(self, member):
+    def add(self, member, batch = None):
         '''
-        (Group, Member) -> None
+        (Group, Member, LdapBatch) -> None
         
-        Add member to group.
+        Add member to group. The member and memberUid attributes are changed in
+        one modification. If batch is given, the modification is sent as part of
+        the batch, and the caller is responsible for collecting its result.
+        '''
+        self.add_many([member], batch)
+    
+    def add_many(self, members, batch = None):
         '''
-        self._directory.modify(self.DN(), [(ldap.MOD_ADD, "member", member.DN())])
-        self._directory.modify(self.DN(), [(ldap.MOD_ADD, "memberUid", member.get_username())])
+        (Group, list, LdapBatch) -> None
         
-    def remove(self, member):
+        Add all Members in members to the group, in one modification of the member
+        and memberUid attributes. The usernames are taken from the attributes of the
+        Members, so hydrated Members cost no extra lookups. None of the Members may
+        be in the group already, or the whole modification fails. See add for the
+        use of batch.
         '''
-        (Group, Member) -> None
+        self._modify_many(ldap.MOD_ADD, members, batch)
         
-        Remove member from group.
+    def remove(self, member, batch = None):
+        '''
+        (Group, Member, LdapBatch) -> None
+        
+        Remove member from group. The member and memberUid attributes are changed
+        in one modification. If batch is given, the modification is sent as part of
+        the batch, and the caller is responsible for collecting its result.
+        '''
+        self.remove_many([member], batch)
+    
+    def remove_many(self, members, batch = None):
+        '''
+        (Group, list, LdapBatch) -> None
+        
+        Remove all Members in members from the group, in one modification like
+        add_many. All of the Members must be in the group, or the whole modification
+        fails. Only the usernames that are in memberUid are deleted from it, which
+        costs one lookup of the Group. See add for the use of batch.
+        '''
+        self._modify_many(ldap.MOD_DELETE, members, batch)
+    
+    def member_dns(self):
         '''
-        self._directory.modify(self.DN(), [(ldap.MOD_DELETE, "member", member.DN())])
-        self._directory.modify(self.DN(), [(ldap.MOD_DELETE, "memberUid", member.get_username())])
+        (Group) -> set
+        
+        Returns the DNs of the members of the Group, in lowercase, as a set. Use this
+        to test many Members for membership with one lookup.
+        '''
+        try:
+            memberDNs = self.attributes(['member'])['member']
+        except KeyError:
+            return set()
+        return set([memberDN.lower() for memberDN in memberDNs])
+    
+    def member_uids(self):
+        '''
+        (Group) -> set
+        
+        Returns the usernames in the memberUid attribute of the Group, as a set.
+        '''
+        return set(self.attributes(['memberUid']).get('memberUid', []))
+    
+    def _modify_many(self, operation, members, batch):
+        '''
+        (Group, ldap.MOD, list, LdapBatch) -> None
+        
+        Adds or deletes (depending on operation) the DNs and usernames of members to
+        or from the member and memberUid attributes, in one modification.
+        '''
+        if not members:
+            return
+        memberDNs = [member.DN() for member in members]
+        if operation == ldap.MOD_DELETE:
+            # Deleting a username that is not in memberUid would make the whole
+            # modification fail, and leave the DNs in the group.
+            memberUids = self.member_uids()
+            usernames = [member.get_username() for member in members if member.is_user() and member.get_username() in memberUids]
+        else:
+            usernames = [member.get_username() for member in members]
+        modifications = [(operation, "member", memberDNs)]
+        if usernames:
+            modifications.append((operation, "memberUid", usernames))
+        if batch is None:
+            self._directory.modify(self.DN(), modifications)
+        else:
+            batch.modify(self.DN(), modifications)
+        for member in members:
+            member.invalidate_group_list()
     
     def DN(self):
         '''
@@ -0,0 +1,70 @@
+import threading
+
+class LazyConnection(object):
+    '''
+    Class to stand in for a connector (an LdapConnection or SqlConnection) that
+    is only created, and so only connects, when it is first used.
+    
+    Constants of the connector class, such as LdapConnection.SUFFIX, can be read
+    without connecting.
+    '''
+    
+    def __init__(self, connectorClass, *arguments):
+        '''
+        (LazyConnection, class, ...) -> None
+        
+        Initializes the LazyConnection for a connector that will be created as
+        connectorClass(*arguments) on first use.
+        '''
+        self._connectorClass = connectorClass
+        self._arguments = arguments
+        self._connector = None
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name):
+        '''
+        (LazyConnection, str) -> object
+        
+        Returns the attribute name of the connector, creating the connector first
+        if needed. Only called for attributes that the LazyConnection itself does
+        not have.
+        '''
+        if self._connector is None:
+            value = getattr(self._connectorClass, name, None)
+            if value is not None and not callable(value):
+                return value
+        return getattr(self.connector(), name)
+    
+    def __str__(self):
+        '''
+        (LazyConnection) -> str
+        
+        Returns the human-readable representation of the connector, without
+        connecting if that has not happened yet.
+        '''
+        if self._connector is None:
+            return "%s (not connected)" % self._connectorClass.__name__
+        return str(self._connector)
+    
+    def connector(self):
+        '''
+        (LazyConnection) -> object
+        
+        Returns the connector, creating it (and so connecting) on first use.
+        '''
+        if self._connector is None:
+            self._lock.acquire()
+            try:
+                if self._connector is None:
+                    self._connector = self._connectorClass(*self._arguments)
+            finally:
+                self._lock.release()
+        return self._connector
+    
+    def is_connected(self):
+        '''
+        (LazyConnection) -> bool
+        
+        Returns True iff the connector has been created.
+        '''
+        return self._connector is not None
@@ -1,5 +1,7 @@
 import ldap
 import ldap.modlist as modlist
+from ldap.controls import SimplePagedResultsControl
+import OperationStatistics
 import sys
 import logging
 import re
@@ -15,18 +17,21 @@ class LdapConnection:
     EMPTY_MEMBER_FILTER = "objectClass=inetOrgPerson"
     STRUCTURAL_USER = "cn=structuraluser," + SYSUSERS_BASEDN + SUFFIX
     ROLE_PREFIX = "role-"
+    PAGE_SIZE = 500
    
-    def __init__(self, hostname, DN, password, loggingFacility):
+    def __init__(self, hostname, DN, password, loggingFacility, pageSize = PAGE_SIZE):
         '''
-        (LdapConnection, str, str, str, Logger) -> None
+        (LdapConnection, str, str, str, Logger, int) -> None
         
         Takes all the credentials to start an LDAP connection and creates
-        the connection object.
+        the connection object. pageSize is the default number of records per
+        page for paged searches (see search_paged).
         
         Will handle any LDAP errors itself and stop exection upon failure.
         '''
         self._hostname = hostname
         self._dn = DN
+        self._pageSize = pageSize
         self._connection = ldap.initialize(hostname)
         self._logger = loggingFacility
         try:
@@ -44,6 +49,7 @@ class LdapConnection:
         '''
         return self._dn + " @ " + self._hostname
 
+    @OperationStatistics.timed("search")
     def search(self, searchFilter, baseDN, searchScope, targetAttributes, suppressNoResults = True):
         '''
         (LdapConnection, str, str, ldap.SCOPE, list, bool) -> list
@@ -69,6 +75,43 @@ class LdapConnection:
             else:
                 return []
 
+    @OperationStatistics.timed_iteration("search")
+    def search_paged(self, searchFilter, baseDN, searchScope, targetAttributes, pageSize = None):
+        '''
+        (LdapConnection, str, str, ldap.SCOPE, list, int) -> generator
+        
+        Searches like search, but uses the Simple Paged Results control (RFC 2696)
+        to retrieve the records in pages of pageSize records (by default the
+        pageSize of the connection). Returns a generator that yields the records
+        one by one, each record being a tuple (DN, attributes) like in search.
+        
+        As soon as a page has arrived, the next page is requested, so the server
+        prepares the next page while the caller processes the current one. Only
+        one page is held in memory at a time, and server size limits do not apply
+        to the search as a whole.
+        '''
+        if pageSize is None:
+            pageSize = self._pageSize
+        pageControl = SimplePagedResultsControl(True, size=pageSize, cookie='')
+        ldapResultId = self._connection.search_ext(baseDN, searchScope, searchFilter, targetAttributes, serverctrls=[pageControl])
+        try:
+            while ldapResultId is not None:
+                resultType, resultData, resultId, serverControls = self._connection.result3(ldapResultId)
+                ldapResultId = None
+                pageControl.cookie = ''
+                for control in serverControls:
+                    if control.controlType == SimplePagedResultsControl.controlType:
+                        pageControl.cookie = control.cookie
+                if pageControl.cookie:
+                    ldapResultId = self._connection.search_ext(baseDN, searchScope, searchFilter, targetAttributes, serverctrls=[pageControl])
+                for entry in resultData:
+                    yield entry
+        finally:
+            # The caller stopped early: the outstanding page is no longer needed.
+            if ldapResultId is not None:
+                self._connection.abandon(ldapResultId)
+
+    @OperationStatistics.timed("attributes")
     def attributes(self, DN, extraAttributes = None):
         '''
         (LdapConnection, str, list) -> list
@@ -87,6 +130,7 @@ class LdapConnection:
         results = self.search("(cn=*)", DN, ldap.SCOPE_BASE, targetAttributes)
         return results[0][1]
 
+    @OperationStatistics.timed("add")
     def add(self, toAddDN, attributes):
         '''
         (LdapConnection, str, dict) -> None
@@ -101,6 +145,7 @@ class LdapConnection:
         self._connection.add_s(toAddDN, ldif)
         self._logger.debug("Added " + toAddDN)
 
+    @OperationStatistics.timed("delete")
     def delete(self, toDeleteDN):
         '''
         (LdapConnection, str) -> None
@@ -112,6 +157,7 @@ class LdapConnection:
         self._connection.delete_s(toDeleteDN)
         self._logger.debug("Deleted " + toDeleteDN)
 
+    @OperationStatistics.timed("modify")
     def modify(self, toModifyDN, modifications):
         '''
         (LdapConnection, str, list) -> None
@@ -132,6 +178,7 @@ class LdapConnection:
             modifiedAttributes.append(mod[1])
         self._logger.debug("Modified " + toModifyDN + " " + str(modifiedAttributes))
     
+    @OperationStatistics.timed("password")
     def password(self, memberDN, passwordToSet):
         '''
         (LdapConnection, str, str) -> None
@@ -140,6 +187,15 @@ class LdapConnection:
         is that the password is set to passwordToSet.
         '''
         self._connection.passwd_s(memberDN, None, passwordToSet)
+
+    def batch(self):
+        '''
+        (LdapConnection) -> LdapBatch
+        
+        Returns a new LdapBatch, with which many operations can be sent over this
+        connection before their results are collected.
+        '''
+        return LdapBatch(self._connection, self._logger)
         
     def search_members(self, searchFilter, targetAttributes):
         '''
@@ -155,6 +211,16 @@ class LdapConnection:
         '''
         return self.search(searchFilter, self.MEMBERS_BASEDN + self.SUFFIX, ldap.SCOPE_ONELEVEL, targetAttributes)
 
+    def search_members_paged(self, searchFilter, targetAttributes, pageSize = None):
+        '''
+        (LdapConnection, str, list, int) -> generator
+        
+        Searches for the member records matching searchFilter like search_members,
+        but returns a generator that yields the records page by page, as described
+        in search_paged.
+        '''
+        return self.search_paged(searchFilter, self.MEMBERS_BASEDN + self.SUFFIX, ldap.SCOPE_ONELEVEL, targetAttributes, pageSize)
+
     def extract_cn(self, dn):
         '''
         (LdapConnection, str) -> str
@@ -174,4 +240,136 @@ class LdapConnection:
         p = re.compile('^cn=[^,]+,(.*)'+self.GROUPS_BASEDN+self.SUFFIX+'$')
         m = p.match(dn)
         return m.group(1)
+
+
+class LdapBatch:
+    """
+    Class to pipeline LDAP operations over one LdapConnection.
+    
+    Each operation is sent right away, without waiting for the result of the
+    previous one. The results are collected afterwards, so the round trips of
+    all operations in the batch overlap. Create one with LdapConnection.batch().
+    """
+    
+    def __init__(self, connection, loggingFacility):
+        '''
+        (LdapBatch, LDAPObject, Logger) -> None
+        
+        Initialize an empty batch on the bound python-ldap connection object.
+        '''
+        self._connection = connection
+        self._logger = loggingFacility
+        self._pending = []
+    
+    def __len__(self):
+        '''
+        (LdapBatch) -> int
+        
+        Returns the number of operations that have been sent, but whose results
+        have not been collected yet.
+        '''
+        return len(self._pending)
+    
+    def search(self, searchFilter, baseDN, searchScope, targetAttributes):
+        '''
+        (LdapBatch, str, str, ldap.SCOPE, list) -> int
         
+        Sends a search like LdapConnection.search. Returns the position of the
+        operation in the list returned by collect.
+        '''
+        ldapResultId = self._connection.search(baseDN, searchScope, searchFilter, targetAttributes)
+        return self._append(ldapResultId, None)
+    
+    def attributes(self, DN, extraAttributes = []):
+        '''
+        (LdapBatch, str, list) -> int
+        
+        Sends a lookup of the attributes of the record DN like
+        LdapConnection.attributes. Its result in collect is the list of records
+        found, which holds exactly one record (DN, attributes).
+        '''
+        targetAttributes = ['*']
+        targetAttributes.extend(extraAttributes)
+        return self.search("(cn=*)", DN, ldap.SCOPE_BASE, targetAttributes)
+    
+    def add(self, toAddDN, attributes):
+        '''
+        (LdapBatch, str, dict) -> int
+        
+        Sends the addition of a record like LdapConnection.add.
+        '''
+        ldapResultId = self._connection.add(toAddDN, modlist.addModlist(attributes))
+        return self._append(ldapResultId, "Added " + toAddDN)
+    
+    def delete(self, toDeleteDN):
+        '''
+        (LdapBatch, str) -> int
+        
+        Sends the deletion of a record like LdapConnection.delete.
+        '''
+        ldapResultId = self._connection.delete(toDeleteDN)
+        return self._append(ldapResultId, "Deleted " + toDeleteDN)
+    
+    def modify(self, toModifyDN, modifications):
+        '''
+        (LdapBatch, str, list) -> int
+        
+        Sends the modification of a record like LdapConnection.modify.
+        '''
+        ldapResultId = self._connection.modify(toModifyDN, modifications)
+        modifiedAttributes = []
+        for mod in modifications:
+            modifiedAttributes.append(mod[1])
+        return self._append(ldapResultId, "Modified " + toModifyDN + " " + str(modifiedAttributes))
+    
+    def password(self, memberDN, passwordToSet):
+        '''
+        (LdapBatch, str, str) -> int
+        
+        Sends the setting of a password like LdapConnection.password.
+        '''
+        ldapResultId = self._connection.passwd(memberDN, None, passwordToSet)
+        return self._append(ldapResultId, None)
+    
+    @OperationStatistics.timed("batch", lambda arguments: "%i operations" % len(arguments[0]))
+    def collect(self, raiseErrors = False):
+        '''
+        (LdapBatch, bool) -> list
+        
+        Waits for the results of all operations sent so far and returns them as a
+        list, in the order in which the operations were sent. For a search, the
+        result is the list of records found; for other operations it is None. If an
+        operation failed, its result is the LDAP exception instead.
+        
+        If raiseErrors is True, the first LDAP exception is raised once all results
+        have been collected. Afterwards, the batch is empty and can be reused.
+        '''
+        pending = self._pending
+        self._pending = []
+        results = []
+        for ldapResultId, logMessage in pending:
+            try:
+                resultType, resultData = self._connection.result(ldapResultId, 1)
+            except ldap.LDAPError, e:
+                results.append(e)
+                continue
+            if logMessage is not None:
+                self._logger.debug(logMessage)
+            if resultType == ldap.RES_SEARCH_RESULT:
+                results.append(resultData)
+            else:
+                results.append(None)
+        if raiseErrors:
+            for result in results:
+                if isinstance(result, ldap.LDAPError):
+                    raise result
+        return results
+    
+    def _append(self, ldapResultId, logMessage):
+        '''
+        (LdapBatch, int, str) -> int
+        
+        Registers a sent operation, and returns its position in the batch.
+        '''
+        self._pending.append((ldapResultId, logMessage))
+        return len(self._pending) - 1
@@ -0,0 +1,137 @@
+import ldap
+import re
+
+# Comparison operators, longest first so that '>=' is not read as '='.
+OPERATORS = ['>=', '<=', '~=', '=']
+
+def parse(searchFilter):
+    '''
+    (str) -> tuple
+    
+    Parses an LDAP search filter (RFC 4515) into a tree that can be evaluated
+    with matches. The outer parentheses may be left out, as in 'cn=*'.
+    
+    Will throw an LDAP exception (ldap.FILTER_ERROR) if searchFilter is not a
+    valid filter.
+    '''
+    searchFilter = searchFilter.strip()
+    if not searchFilter.startswith("("):
+        searchFilter = "(" + searchFilter + ")"
+    try:
+        tree, position = _parse_filter(searchFilter, 0)
+    except (IndexError, ValueError):
+        raise ldap.FILTER_ERROR({'desc': "Bad search filter", 'info': searchFilter})
+    if position != len(searchFilter):
+        raise ldap.FILTER_ERROR({'desc': "Bad search filter", 'info': searchFilter})
+    return tree
+
+def matches(tree, attributes):
+    '''
+    (tuple, dict) -> bool
+    
+    Returns True iff the record with attributes (a dict of lists, as returned by
+    a search) matches the filter tree returned by parse. Attribute names and
+    values are compared without regard to case.
+    '''
+    return _matches(tree, dict([(name.lower(), values) for name, values in attributes.items()]))
+
+def _parse_filter(searchFilter, position):
+    '''
+    (str, int) -> (tuple, int)
+    
+    Parses the parenthesized filter that starts at position, and returns its
+    tree together with the position right after it.
+    '''
+    if searchFilter[position] != "(":
+        raise ValueError(position)
+    position += 1
+    operator = searchFilter[position]
+    if operator in "&|":
+        position += 1
+        children = []
+        while searchFilter[position] == "(":
+            child, position = _parse_filter(searchFilter, position)
+            children.append(child)
+        tree = (operator, children)
+    elif operator == "!":
+        child, position = _parse_filter(searchFilter, position + 1)
+        tree = (operator, child)
+    else:
+        end = searchFilter.index(")", position)
+        tree = _parse_item(searchFilter[position:end])
+        position = end
+    if searchFilter[position] != ")":
+        raise ValueError(position)
+    return tree, position + 1
+
+def _parse_item(item):
+    '''
+    (str) -> tuple
+    
+    Parses a simple filter item without parentheses, such as 'sn=*jan*'.
+    '''
+    for operator in OPERATORS:
+        index = item.find(operator)
+        if index > 0 and "=" not in item[:index]:
+            break
+    else:
+        raise ValueError(item)
+    attribute = item[:index].strip().lower()
+    value = item[index + len(operator):]
+    if operator == ">=":
+        return ('>=', attribute, _unescape(value).lower())
+    elif operator == "<=":
+        return ('<=', attribute, _unescape(value).lower())
+    elif value == "*":
+        return ('present', attribute)
+    elif "*" in value:
+        pattern = ".*".join([re.escape(_unescape(fragment)) for fragment in value.split("*")])
+        return ('substring', attribute, re.compile("^" + pattern + "$", re.IGNORECASE | re.DOTALL))
+    else:
+        return ('=', attribute, _unescape(value).lower())
+
+def _unescape(value):
+    '''
+    (str) -> str
+    
+    Replaces the escapes of the form \\XX in a filter value by the characters
+    they stand for.
+    '''
+    return re.sub(r"\\([0-9A-Fa-f]{2})", lambda match: chr(int(match.group(1), 16)), value)
+
+def _matches(tree, attributes):
+    '''
+    (tuple, dict) -> bool
+    
+    Evaluates tree against attributes, of which the keys are lowercase.
+    '''
+    operator = tree[0]
+    if operator == "&":
+        for child in tree[1]:
+            if not _matches(child, attributes):
+                return False
+        return True
+    elif operator == "|":
+        for child in tree[1]:
+            if _matches(child, attributes):
+                return True
+        return False
+    elif operator == "!":
+        return not _matches(tree[1], attributes)
+    elif operator == "present":
+        return tree[1] == "objectclass" or tree[1] in attributes
+    values = attributes.get(tree[1], [])
+    if operator == "substring":
+        for value in values:
+            if tree[2].match(value):
+                return True
+        return False
+    for value in values:
+        value = value.lower()
+        if operator == "=" and value == tree[2]:
+            return True
+        elif operator == ">=" and value >= tree[2]:
+            return True
+        elif operator == "<=" and value <= tree[2]:
+            return True
+    return False
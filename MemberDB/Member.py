@@ -1,31 +1,44 @@
 import LdapConnection
 import SqlConnection
+import PasswordGenerator
 
 import ldap
-import subprocess
-from subprocess import Popen
-import random
-sysrand = random.SystemRandom()
 import re
 import logging
 
 
-WORDLIST_FILE = "woordenlijst"
+# Attributes fetched when Members are loaded in bulk from a search.
+MEMBER_ATTRIBUTES = ['cn', 'sn', 'mail', 'ou', 'uid']
 
-class Member:
+class Member(object):
     '''
     Class to manipulate a member in the MemberDatabase.
+    
+    Members are hashable (by lidnummer), so they can be kept in sets and used as
+    dict keys. Use MemberDatabase.get_member to get the shared instance for a
+    lidnummer.
     '''
+    __slots__ = ('_directory', '_database', '_lidnummer', '_attributes', '_complete', '_groupList', '__weakref__')
     
-    def __init__(self, directory, database, lidnummer):
+    def __init__(self, directory, database, lidnummer, attributes = None, complete = False):
         '''
-        (Member, LdapConnection, SqlConnection, int) -> None
+        (Member, LdapConnection, SqlConnection, int, dict, bool) -> None
         
         Initialize the Member instance of database from the lidnummer.
+        
+        The attributes of the Member are fetched from the directory once, on first
+        use, and cached in the instance. Methods that write to the entry of the
+        Member invalidate this cache. If the attributes are already known, they can
+        be passed in attributes, so that no lookup is needed at all. They should at
+        least contain the attributes in MEMBER_ATTRIBUTES that the Member has; if
+        complete is False, attributes() still looks up all of them once.
         '''
         self._directory = directory
         self._database = database
         self._lidnummer = lidnummer
+        self._attributes = attributes
+        self._complete = complete and attributes is not None
+        self._groupList = None
     
     def __str__(self):
         '''
@@ -56,6 +69,14 @@ class Member:
         lidnummers).
         '''
         return not self.__eq__(otherMember)
+    
+    def __hash__(self):
+        '''
+        (Member) -> int
+        
+        Returns a hash of Member that agrees with __eq__.
+        '''
+        return hash(self._lidnummer)
 
     @classmethod
     def from_username(cls, directory, database, username):
@@ -71,21 +92,55 @@ class Member:
             raise UsernameError("Username not found.")
         return cls(directory, database, lidnummer)
     
+    @classmethod
+    def from_entry(cls, directory, database, entry):
+        '''
+        (method, LdapConnection, SqlConnection, tuple) -> class
+        
+        Convert a search result entry (DN, attributes) to a Member that has
+        attributes already loaded. The entry should at least contain the
+        attributes in MEMBER_ATTRIBUTES that the Member has.
+        '''
+        DN, attributes = entry
+        return cls(directory, database, int(attributes['cn'][0]), attributes)
+    
     def group_list(self):
         '''
         (Member) -> list
         
         Looks up the names of the groups to which Member belongs and returns
-        a list of them.
-        '''
-        groupResults = self._directory.search('member=%s'%(self.DN()), self._directory.GROUPS_BASEDN+self._directory.SUFFIX, ldap.SCOPE_SUBTREE, ['cn'])
-        groupDNs = []
-        for groupResult in groupResults:
-            groupDNs.append(groupResult[0])    
-        grouplist = []
-        for groupDN in groupDNs:
-            grouplist.append(self._directory.extract_cn(groupDN))
-        return grouplist
+        a list of them. The list is cached after the first lookup, unless it has
+        already been provided with cache_group_list.
+        '''
+        if self._groupList is None:
+            groupResults = self._directory.search('member=%s'%(self.DN()), self._directory.GROUPS_BASEDN+self._directory.SUFFIX, ldap.SCOPE_SUBTREE, ['cn'])
+            groupDNs = []
+            for groupResult in groupResults:
+                groupDNs.append(groupResult[0])    
+            grouplist = []
+            for groupDN in groupDNs:
+                grouplist.append(self._directory.extract_cn(groupDN))
+            self._groupList = grouplist
+        return list(self._groupList)
+
+    def cache_group_list(self, groupNames):
+        '''
+        (Member, list) -> None
+        
+        Sets the names of the groups to which Member belongs, as found by a bulk
+        lookup (e.g. MemberDatabase.membership_index). group_list and role_list
+        will use these instead of searching the directory.
+        '''
+        self._groupList = list(groupNames)
+
+    def invalidate_group_list(self):
+        '''
+        (Member) -> None
+        
+        Discards the cached list of groups of the Member. Should be called whenever
+        the Member is added to or removed from a group.
+        '''
+        self._groupList = None
 
     def role_list(self):
         '''
@@ -106,7 +161,7 @@ class Member:
         Returns True iff the Member exists in the MemberDatabase.
         '''
         try:
-            self.attributes()
+            self._member_attributes()
         except ldap.NO_SUCH_OBJECT:
             return False;
         return True;
@@ -124,6 +179,7 @@ class Member:
         attributes['mail'] = [mail]
         attributes['ou'] = [department]
         self._directory.add(self.DN(), attributes)
+        self.invalidate_cache()
         
     def delete(self):
         '''
@@ -132,6 +188,7 @@ class Member:
         Deletes the Member from the MemberDatabase.
         '''
         self._directory.delete(self.DN())
+        self.invalidate_cache()
 
     def attributes(self, extraAttributes = []):
         '''
@@ -141,8 +198,78 @@ class Member:
         attributes and the ones specified in extraAttributes. Each key is an attribute
         name, and the corresponding element is a list of values assigned to
         this attribute.
+        
+        The default attributes are cached after the first lookup. If only the
+        attributes in MEMBER_ATTRIBUTES are cached (e.g. from a search), they are
+        looked up in full once. Asking for extraAttributes always results in a
+        fresh lookup, which is not cached.
+        '''
+        if extraAttributes:
+            return self._directory.attributes(self.DN(), extraAttributes)
+        if self._attributes is None or not self._complete:
+            self._attributes = self._directory.attributes(self.DN(), [])
+            self._complete = True
+        return self._attributes
+
+    def _member_attributes(self):
         '''
-        return self._directory.attributes(self.DN(), extraAttributes)
+        (Member) -> dict
+        
+        Returns the cached attributes of the Member, which may hold no more than
+        the attributes in MEMBER_ATTRIBUTES. They are looked up if none are cached.
+        '''
+        if self._attributes is None:
+            self.attributes()
+        return self._attributes
+
+    def cache_attributes(self, attributes, complete = False):
+        '''
+        (Member, dict, bool) -> None
+        
+        Sets the cached attributes of the Member to attributes, as found by a bulk
+        lookup (e.g. MemberDatabase.hydrate). The attributes should at least contain
+        the attributes in MEMBER_ATTRIBUTES that the Member has; complete tells
+        whether they are all of them, as attributes() promises.
+        '''
+        self._attributes = attributes
+        self._complete = complete
+
+    def update_cached_attribute(self, name, values):
+        '''
+        (Member, str, list) -> None
+        
+        Sets attribute name to values in the cached attributes of the Member, after
+        the same change has been written to the directory (e.g. by
+        MemberDatabase.make_users). If values is None, the attribute is removed.
+        Nothing happens if no attributes are cached.
+        '''
+        if self._attributes is None:
+            return
+        attributes = dict(self._attributes)
+        if values is None:
+            attributes.pop(name, None)
+        else:
+            attributes[name] = values
+        self._attributes = attributes
+
+    def has_cached_attributes(self):
+        '''
+        (Member) -> bool
+        
+        Returns True iff (at least) the attributes in MEMBER_ATTRIBUTES of the Member
+        are cached, so that reading them (e.g. with get_full_name) needs no lookup.
+        '''
+        return self._attributes is not None
+
+    def invalidate_cache(self):
+        '''
+        (Member) -> None
+        
+        Discards the cached attributes of the Member, so that the next lookup
+        fetches them from the directory again.
+        '''
+        self._attributes = None
+        self._complete = False
 
     def is_user(self):
         '''
@@ -150,7 +277,7 @@ class Member:
         
         Returns True iff the Member is a user (i.e. has a username).
         '''
-        return 'uid' in self.attributes()
+        return 'uid' in self._member_attributes()
     
     def username_exists(self, username):
         '''
@@ -203,6 +330,7 @@ class Member:
             self.register_username(username)
             logging.debug("Setting username %s for lidnummer %s.", username, str(self._lidnummer))
             self._directory.modify(self.DN(), [(ldap.MOD_ADD, "uid", username.encode("utf-8"))])
+            self.invalidate_cache()
             password = self.generate_password(passwordType)
             logging.debug("Setting generated password for username %s.", username)
             self.set_password(password)
@@ -223,9 +351,10 @@ class Member:
             raise LidnummerError("Lidnummer does not refer to a Member.")
         elif not self.is_user():
             raise MemberError("Member referred to by lidnummer is not a user.")
-        elif self.attributes()['uid'][0] != username:
+        elif self._member_attributes()['uid'][0] != username:
             raise UsernameError("Provided username does not match provided lidnummer. User removal canceled.")
         self._directory.modify(self.DN(), [(ldap.MOD_DELETE, "uid", None)])
+        self.invalidate_cache()
     
     def set_password(self, password):
         '''
@@ -233,13 +362,15 @@ class Member:
         
         Sets the password of Member to password.
         '''
-        self._directory.password(self.DN(), password)    
+        self._directory.password(self.DN(), password)
+        self.invalidate_cache()
     
     def generate_password(self, passwordType):
         '''
         (Member, int) -> str
         
-        Generates and returns one password of type passwordType.
+        Generates and returns one password of type passwordType. See
+        PasswordGenerator for how passwords are generated.
         
         Password types are as follows:
             
@@ -248,19 +379,7 @@ class Member:
             2 -> 11 characters, lowercase
             3 -> 5 random Dutch words, lowercase
         '''
-        if passwordType == 0:
-            passToSet = Popen(["pwgen", "-ncs", "-y", "8", "1"], stdout=subprocess.PIPE).communicate()[0]
-        elif passwordType == 1:
-            passToSet = Popen(["pwgen", "-0cs", "9", "1"], stdout=subprocess.PIPE).communicate()[0]
-        elif passwordType == 2:
-            passToSet = Popen(["pwgen", "-0As", "11", "1"], stdout=subprocess.PIPE).communicate()[0]
-        elif passwordType == 3:
-            file = open(WORDLIST_FILE, 'r')
-            words = file.read().splitlines()
-            passToSet = ''.join(sysrand.sample(words, 5))
-        else:
-            raise Exception("Password type should be 0, 1, 2 or 3.")
-        return passToSet
+        return PasswordGenerator.generate_password(passwordType)
     
     def get_lidnummer(self):
         '''
@@ -284,7 +403,7 @@ class Member:
         
         Returns the full name of the Member.
         '''
-        return self.attributes()['sn'][0]
+        return self._member_attributes()['sn'][0]
     
     def get_mail(self):
         '''
@@ -292,7 +411,7 @@ class Member:
         
         Returns the e-mail address of the Member.
         '''
-        return self.attributes()['mail'][0]
+        return self._member_attributes()['mail'][0]
     
     def get_afdeling(self):
         '''
@@ -300,7 +419,7 @@ class Member:
         
         Returns the afdeling of the Member.
         '''
-        return self.attributes()['ou'][0]
+        return self._member_attributes()['ou'][0]
     
     def get_username(self):
         '''
@@ -309,8 +428,8 @@ class Member:
         Returns the username of the Member. Raises UsernameError if the username does not exist.
         '''
         try:
-            return self.attributes()['uid'][0]
-        except IndexError:
+            return self._member_attributes()['uid'][0]
+        except (KeyError, IndexError):
             raise UsernameError("Member does not have a username.")
 
 ### END OF CLASS
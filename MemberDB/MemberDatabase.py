@@ -1,72 +1,618 @@
 import Role
 import Group
 import Member
+import DirectorySnapshot
+import UsernameRegistry
+import SearchIndex
+import DirectoryReplica
+import MembershipQuery
 import LdapConnection
 import SqlConnection
+import LazyConnection
+
+import PasswordGenerator
 
 import logging
 import ldap
+import weakref
 
-class MemberDatabase:
+class MemberDatabase(object):
     '''
     Class to access and manage a member database in an LDAP directory and MySQL database.
     '''
+    # Number of members whose groups are looked up in one search filter.
+    MEMBERS_PER_SEARCH = 200
     
     def __init__(self, ldapConfig, sqlConfig, loggingFacility):
         '''
         (MemberDatabase, dict, dict, Logger) -> None
         
-        Initializes the MemberDatabase, by connecting to the associated LDAP directory
-        and SQL database.
+        Initializes the MemberDatabase for the associated LDAP directory and SQL
+        database. Each of them is only connected to when it is first used, so a
+        tool that stops at an argument error, or never needs the SQL database,
+        does not pay for the connection.
         
         ldapConfig contains three keys: name (hostname of server), dn (user as whom
-        to bind), password.
+        to bind), password. Optionally, it contains pagesize (number of records per
+        page for paged searches).
 
         sqlConfig contains five keys: host (hostname of server), port (port of server),
         user (username as whom to connect), password and name (database to which to
-        connect).
+        connect). Optionally, it contains poolsize (maximum number of connections
+        used at once).
+        '''
+        pageSize = int(ldapConfig.get('pagesize', LdapConnection.LdapConnection.PAGE_SIZE))
+        directory = LazyConnection.LazyConnection(LdapConnection.LdapConnection, ldapConfig['name'], ldapConfig['dn'], ldapConfig['password'], loggingFacility, pageSize)
+        poolSize = int(sqlConfig.get('poolsize', SqlConnection.SqlConnection.POOL_SIZE))
+        database = LazyConnection.LazyConnection(SqlConnection.SqlConnection, sqlConfig['host'], int(sqlConfig['port']), sqlConfig['name'], sqlConfig['user'], sqlConfig['password'], loggingFacility, poolSize)
+        self._use_connectors(directory, database, loggingFacility, pageSize)
+    
+    @classmethod
+    def from_connectors(cls, directory, database, loggingFacility, pageSize = LdapConnection.LdapConnection.PAGE_SIZE):
+        '''
+        (method, LdapConnection, SqlConnection, Logger, int) -> class
+        
+        Returns a MemberDatabase that uses the given (already connected) connectors,
+        such as the fakes used by benchmark.py. pageSize is the page size of the
+        local replicas made with replica.
         '''
-        self._directory = LdapConnection.LdapConnection(ldapConfig['name'], ldapConfig['dn'], ldapConfig['password'], loggingFacility)
-        self._database = SqlConnection.SqlConnection(sqlConfig['host'], int(sqlConfig['port']), sqlConfig['name'], sqlConfig['user'], sqlConfig['password'], loggingFacility)
+        memberDatabase = cls.__new__(cls)
+        memberDatabase._use_connectors(directory, database, loggingFacility, pageSize)
+        return memberDatabase
+    
+    def _use_connectors(self, directory, database, loggingFacility, pageSize):
+        '''
+        (MemberDatabase, LdapConnection, SqlConnection, Logger, int) -> None
+        
+        Sets the connectors of the MemberDatabase and empties its caches.
+        '''
+        self._directory = directory
+        self._pageSize = pageSize
+        self._database = database
         self._logger = loggingFacility
+        self._membershipIndex = None
+        self._searchIndex = None
+        self._clear_identity_map()
         
     def get_connectors(self):
         '''
         (MemberDatabase) -> LdapConnection, SqlConnection
         
         Returns the connectors that are generated during the initiation of
-        the MemberDatabase.
+        the MemberDatabase. Unless the MemberDatabase was made with
+        from_connectors, these are LazyConnections that connect on first use.
         '''
         return self._directory, self._database
+    
+    def connect(self):
+        '''
+        (MemberDatabase) -> None
+        
+        Connects to the directory and the SQL database right away instead of on
+        first use, e.g. so that a long-running process does not make its first
+        request wait for the connections.
+        '''
+        for connector in self.get_connectors():
+            if isinstance(connector, LazyConnection.LazyConnection):
+                connector.connector()
+    
+    def clear_caches(self):
+        '''
+        (MemberDatabase) -> None
+        
+        Discards everything the MemberDatabase has cached (such as the membership
+        index and the identity map). Long-running processes that reuse one
+        MemberDatabase should call this before every operation. The search index is
+        kept, because it is brought up to date before every use.
+        '''
+        self._membershipIndex = None
+        self._clear_identity_map()
+    
+    def get_member(self, lidnummer, attributes = None):
+        '''
+        (MemberDatabase, int, dict) -> Member
+        
+        Returns the Member with lidnummer. Until clear_caches, the same lidnummer
+        always gives the same instance, so its cached attributes and groups are
+        shared by everything that holds it. If attributes are given (e.g. from a
+        search for MEMBER_ATTRIBUTES), they are cached in the Member as a partial
+        set; Member.attributes() still looks up the rest.
+        '''
+        member = self._members.get(lidnummer)
+        if member is None:
+            member = Member.Member(self._directory, self._database, lidnummer, attributes)
+            self._members[lidnummer] = member
+        elif attributes is not None:
+            member.cache_attributes(attributes)
+        return member
+    
+    def get_group(self, groupName, groupSubOU = ''):
+        '''
+        (MemberDatabase, str, str) -> Group
+        
+        Returns the Group with groupName in groupSubOU (see Group), as the same
+        instance every time until clear_caches.
+        '''
+        key = (groupName.lower(), groupSubOU.lower())
+        group = self._groups.get(key)
+        if group is None:
+            group = Group.Group(self._directory, self._database, groupName, groupSubOU)
+            self._groups[key] = group
+        return group
+    
+    def get_group_by_dn(self, groupDN):
+        '''
+        (MemberDatabase, str) -> Group
+        
+        Returns the Group at groupDN like get_group.
+        '''
+        return self.get_group(self._directory.extract_cn(groupDN), self._directory.extract_group_sub_ou(groupDN))
+    
+    def get_role(self, roleName):
+        '''
+        (MemberDatabase, str) -> Role
+        
+        Returns the Role with roleName, as the same instance every time until
+        clear_caches.
+        '''
+        role = self._roles.get(roleName.lower())
+        if role is None:
+            role = Role.Role(self._directory, self._database, roleName)
+            self._roles[roleName.lower()] = role
+        return role
+    
+    def _clear_identity_map(self):
+        '''
+        (MemberDatabase) -> None
         
-    def search_users(self, searchFilter = "objectClass=inetOrgPerson"):
+        Empties the identity map of get_member, get_group and get_role. The map only
+        holds weak references, so instances nobody uses anymore are freed as usual.
         '''
-        (MemberDatabase, str, list) -> list
+        self._members = weakref.WeakValueDictionary()
+        self._groups = weakref.WeakValueDictionary()
+        self._roles = weakref.WeakValueDictionary()
+        
+    def replica(self, path):
+        '''
+        (MemberDatabase, str) -> DirectoryReplica
+        
+        Returns the local mirror of the directory in the SQLite database at path.
+        Use DirectoryReplica.sync with the connector from get_connectors to bring it
+        up to date.
+        '''
+        return DirectoryReplica.DirectoryReplica(path, self._logger, self._pageSize)
+    
+    def local_replica(self, path):
+        '''
+        (MemberDatabase, str) -> MemberDatabase
+        
+        Returns a MemberDatabase that reads the directory from the local mirror at
+        path instead of from the LDAP server, and shares the SQL database with this
+        one. Changes to the directory are refused.
+        
+        Will throw a ReplicaError if the mirror has never been synchronized. The
+        caller should close the mirror (the directory connector of the returned
+        MemberDatabase) when done with it.
+        '''
+        replica = self.replica(path)
+        try:
+            lastSync = replica.last_sync()
+            if lastSync is None:
+                raise DirectoryReplica.ReplicaError("The local replica %s has never been synchronized. Run sync_replica.py first." % path)
+            self._logger.info("Reading from the local replica, last synchronized at %s." % lastSync)
+            return self.from_connectors(replica, self._database, self._logger, self._pageSize)
+        except:
+            replica.close()
+            raise
+    
+    def search_users(self, searchFilter = "objectClass=inetOrgPerson", hydrate = False):
+        '''
+        (MemberDatabase, str, bool) -> list
         
         Searches for the user records matching searchFilter and return them as a list
-        of Members.
+        of Members. See search_members for the meaning of hydrate.
         
         Will throw an LDAP exception (ldap.NO_RESULTS_RETURNED) if the search returns
         no results.
         '''
         searchFilter = "(&("+searchFilter+")(uid=*))"
-        return self.search_members(searchFilter)
+        return self.search_members(searchFilter, hydrate)
         
-    def search_members(self, searchFilter = "objectClass=inetOrgPerson"):
+    def search_members(self, searchFilter = "objectClass=inetOrgPerson", hydrate = False):
         '''
-        (LdapConnection, str, list) -> list
+        (MemberDatabase, str, bool) -> list
         
         Searches for the member records matching searchFilter and return them as a list
-        of Members.
+        of Members. If hydrate is True, the attributes in Member.MEMBER_ATTRIBUTES
+        are fetched in the same search, and the Members are returned with these
+        attributes already loaded. Use this when the attributes of (many of) the
+        Members are going to be read.
 
         Will throw an LDAP exception (ldap.NO_RESULTS_RETURNED) if the search returns
         no results.
         '''
-        memberEntries = self._directory.search_members(searchFilter, ['cn'])
-        members = []
-        for entry in memberEntries:
-            members.append(Member.Member(self._directory, self._database, int(entry[1]['cn'][0])))
-        return members        
+        return list(self.iter_members(searchFilter, hydrate))
+    
+    def iter_users(self, searchFilter = "objectClass=inetOrgPerson", hydrate = False):
+        '''
+        (MemberDatabase, str, bool) -> generator
+        
+        Streaming variant of search_users: returns a generator that yields the
+        matching users as Members while the results arrive page by page.
+        '''
+        searchFilter = "(&("+searchFilter+")(uid=*))"
+        return self.iter_members(searchFilter, hydrate)
+    
+    def iter_members(self, searchFilter = "objectClass=inetOrgPerson", hydrate = False):
+        '''
+        (MemberDatabase, str, bool) -> generator
+        
+        Streaming variant of search_members: returns a generator that yields the
+        matching Members while the results arrive page by page.
+        '''
+        if hydrate:
+            for DN, attributes in self._directory.search_members_paged(searchFilter, Member.MEMBER_ATTRIBUTES):
+                yield self.get_member(int(attributes['cn'][0]), attributes)
+        else:
+            for DN, attributes in self._directory.search_members_paged(searchFilter, ['cn']):
+                yield self.get_member(int(attributes['cn'][0]))
+    
+    def users_by_username(self, usernames):
+        '''
+        (MemberDatabase, list) -> dict
+        
+        Looks up the users with the given usernames in one search. Returns a dict
+        that maps each username that was found to its Member, with the attributes
+        of the Member loaded.
+        '''
+        if not usernames:
+            return {}
+        searchFilter = "(|" + "".join(["(uid=%s)" % username for username in usernames]) + ")"
+        users = {}
+        for member in self.iter_members(searchFilter, hydrate=True):
+            users[member.get_username()] = member
+        return users
+    
+    def hydrate(self, members):
+        '''
+        (MemberDatabase, list) -> list
+        
+        Loads the attributes of all Members in members with pipelined lookups, so
+        that reading them costs one overlapping batch instead of one round trip per
+        Member. Members that do not exist in the directory are left as they are, and
+        returned as a list.
+        '''
+        batch = self._directory.batch()
+        for member in members:
+            batch.attributes(member.DN())
+        results = batch.collect()
+        missing = []
+        for member, result in zip(members, results):
+            if not isinstance(result, ldap.LDAPError) and result:
+                member.cache_attributes(result[0][1], complete=True)
+            else:
+                missing.append(member)
+        return missing
+    
+    def search_index(self, path):
+        '''
+        (MemberDatabase, str) -> SearchIndex
+        
+        Returns the SearchIndex stored at path, brought up to date with the
+        directory. The index is kept in memory, so later searches in the same
+        process only read the records modified in the meantime.
+        '''
+        if self._searchIndex is None or self._searchIndex.path() != path:
+            self._searchIndex = SearchIndex.SearchIndex(self._directory, path, self._logger)
+        self._searchIndex.refresh()
+        return self._searchIndex
+    
+    def search_members_indexed(self, indexPath, attribute, pattern, usersOnly = False):
+        '''
+        (MemberDatabase, str, str, str, bool) -> list
+        
+        Searches for the Members of which attribute (sn, mail or uid) matches the
+        LDAP substring pattern (e.g. '*jan*'), using the SearchIndex at indexPath
+        instead of a substring search in the directory. Only the matching records
+        are read from the directory, and they are checked against pattern again. If
+        usersOnly is True, only users are returned. The Members are returned with
+        their attributes loaded, sorted by lidnummer.
+        '''
+        index = self.search_index(indexPath)
+        members = [self.get_member(lidnummer) for lidnummer in index.search(attribute, pattern, usersOnly)]
+        missing = set()
+        for member in self.hydrate(members):
+            index.discard(member.get_lidnummer())
+            missing.add(member.get_lidnummer())
+        found = []
+        for member in members:
+            if member.get_lidnummer() in missing:
+                continue
+            attributes = member.attributes()
+            if usersOnly and 'uid' not in attributes:
+                continue
+            if SearchIndex.matches(pattern, attributes.get(attribute, [])):
+                found.append(member)
+        return found
+    
+    def username_registry(self):
+        '''
+        (MemberDatabase) -> UsernameRegistry
+        
+        Loads all usernames that have ever been assigned, and returns them as a
+        UsernameRegistry to check and suggest usernames in memory.
+        '''
+        return UsernameRegistry.UsernameRegistry(self._database)
+    
+    def used_usernames(self, usernames):
+        '''
+        (MemberDatabase, list) -> set
+        
+        Returns the set of usernames in usernames that are in use or have ever been
+        used before, as found with one query on the usernames table.
+        '''
+        if not usernames:
+            return set()
+        sql = "SELECT username FROM usernames WHERE username IN (%s)" % ", ".join(["%s"] * len(usernames))
+        rows = self._database.dosql(sql, tuple(usernames), True)
+        used = set()
+        for row in rows:
+            used.add(row[0])
+        return used
+    
+    def register_usernames(self, registrations):
+        '''
+        (MemberDatabase, list) -> None
+        
+        Registers many usernames in the usernames table at once, like
+        Member.register_username. registrations is a list of (Member, username).
+        All of them are registered in one transaction, so either all or none are;
+        raises an SqlConnection.SqlError if they could not be registered.
+        '''
+        sql = "INSERT INTO usernames (lidnummer, username) VALUES (%s, %s)"
+        values = []
+        for member, username in registrations:
+            values.append((str(member.get_lidnummer()), username))
+        self._database.dosql_many(sql, values)
+    
+    def make_users(self, promotions):
+        '''
+        (MemberDatabase, list) -> list
+        
+        Promotes many members to user at once, like Member.make_user does for one.
+        promotions is a list of (Member, username, passwordType). Returns a list with
+        one (password, error) tuple per promotion, in the same order: on success,
+        password is the generated password and error is None; on failure, password
+        is None and error describes why the promotion did not happen.
+        
+        The Members are read in one pipelined batch, all usernames are checked with
+        one query and registered with one multi-row insert, and the uid and password
+        writes are each sent as one pipelined batch.
+        '''
+        errors = [None] * len(promotions)
+        missingLidnummers = set()
+        for member in self.hydrate([member for member, username, passwordType in promotions]):
+            missingLidnummers.add(member.get_lidnummer())
+        seenUsernames = set()
+        seenLidnummers = set()
+        for i, (member, username, passwordType) in enumerate(promotions):
+            if member.get_lidnummer() in missingLidnummers:
+                errors[i] = "The lidnummer does not correspond with an actual Member."
+            elif member.is_user():
+                errors[i] = "Member already is a user, with username %s." % member.get_username()
+            elif member.get_lidnummer() in seenLidnummers:
+                errors[i] = "Member is promoted more than once."
+            elif username in seenUsernames:
+                errors[i] = "Username is used more than once."
+            seenUsernames.add(username)
+            seenLidnummers.add(member.get_lidnummer())
+        candidates = [i for i in range(len(promotions)) if errors[i] is None]
+        try:
+            usedUsernames = self.used_usernames([promotions[i][1] for i in candidates])
+        except SqlConnection.SqlError, e:
+            usedUsernames = set()
+            for i in candidates:
+                errors[i] = "Could not check username: %s" % str(e)
+        for i in candidates:
+            if promotions[i][1] in usedUsernames:
+                errors[i] = "Username has already been assigned before."
+        candidates = [i for i in candidates if errors[i] is None]
+        
+        self._logger.debug("Registering %i usernames." % len(candidates))
+        try:
+            self.register_usernames([(promotions[i][0], promotions[i][1]) for i in candidates])
+        except SqlConnection.SqlError, e:
+            # Nothing was registered, so no username may be set.
+            for i in candidates:
+                errors[i] = "Could not register username: %s" % str(e)
+            candidates = []
+        
+        batch = self._directory.batch()
+        for i in candidates:
+            member, username, passwordType = promotions[i]
+            batch.modify(member.DN(), [(ldap.MOD_ADD, "uid", username.encode("utf-8"))])
+        for i, result in zip(candidates, batch.collect()):
+            if isinstance(result, ldap.LDAPError):
+                errors[i] = "Could not set username: %s" % str(result)
+        candidates = [i for i in candidates if errors[i] is None]
+        
+        passwords = [None] * len(promotions)
+        for i in candidates:
+            member, username, passwordType = promotions[i]
+            passwords[i] = PasswordGenerator.generate_password(passwordType)
+            batch.password(member.DN(), passwords[i])
+        for i, result in zip(candidates, batch.collect()):
+            if isinstance(result, ldap.LDAPError):
+                errors[i] = "Username was set, but the password could not be set: %s" % str(result)
+                passwords[i] = None
+        
+        # Update the cached attributes instead of discarding them, so that callers
+        # can read the promoted Members (e.g. to mail them) without another lookup.
+        for i in range(len(promotions)):
+            member, username, passwordType = promotions[i]
+            if passwords[i] is not None:
+                member.update_cached_attribute('uid', [username])
+                member.update_cached_attribute('userPassword', None)
+            elif errors[i] is not None and errors[i].startswith("Username was set"):
+                member.invalidate_cache()
+        return zip(passwords, errors)
+    
+    def membership_index(self, refresh = False):
+        '''
+        (MemberDatabase, bool) -> dict
+        
+        Returns the reverse membership index of the MemberDatabase: a dict that maps
+        each member DN (in lowercase) to the list of names of the groups that
+        member belongs to. Role names are the group names that start with
+        ROLE_PREFIX. The index is built from one subtree search of all groups and
+        kept for the lifetime of the MemberDatabase, unless refresh is True.
+        
+        The index is a snapshot: changes made to groups afterwards are not reflected
+        in it until it is refreshed.
+        '''
+        if self._membershipIndex is None or refresh:
+            searchFilter = "objectClass=groupOfNames"
+            baseDN = self._directory.GROUPS_BASEDN + self._directory.SUFFIX
+            results = self._directory.search_paged(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['cn', 'member'])
+            index = {}
+            for groupDN, attributes in results:
+                groupName = self._directory.extract_cn(groupDN)
+                for memberDN in attributes.get('member', []):
+                    index.setdefault(memberDN.lower(), []).append(groupName)
+            self._membershipIndex = index
+        return self._membershipIndex
+    
+    def group_member_dns(self, groupPatterns):
+        '''
+        (MemberDatabase, list) -> dict
+        
+        Looks up the groups named in groupPatterns (names may contain '*') in one
+        search. Returns a dict that maps the name of each group found to the set of
+        DNs (in lowercase) of its members, so that membership tests and set
+        operations on them need no further lookups.
+        '''
+        if not groupPatterns:
+            return {}
+        searchFilter = "(&(objectClass=groupOfNames)(|" + "".join(["(cn=%s)" % groupPattern for groupPattern in groupPatterns]) + "))"
+        baseDN = self._directory.GROUPS_BASEDN + self._directory.SUFFIX
+        structuralUser = self._directory.STRUCTURAL_USER.lower()
+        memberSets = {}
+        for groupDN, attributes in self._directory.search_paged(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['cn', 'member']):
+            memberDNs = memberSets.setdefault(self._directory.extract_cn(groupDN), set())
+            for memberDN in attributes.get('member', []):
+                memberDNs.add(memberDN.lower())
+            memberDNs.discard(structuralUser)
+        return memberSets
+    
+    def query_members(self, expression):
+        '''
+        (MemberDatabase, str) -> list
+        
+        Returns the Members that satisfy the membership expression (see
+        MembershipQuery.parse), such as "role-lb - role-ict" for everyone with
+        role-lb but not role-ict, sorted by lidnummer. All groups in the expression
+        are read in one search.
+        
+        Raises a MembershipQuery.QueryError if the expression is not valid or names a
+        group that does not exist.
+        '''
+        tree = MembershipQuery.parse(expression)
+        memberDNs = MembershipQuery.evaluate(tree, self.group_member_dns(MembershipQuery.group_names(tree)))
+        membersBaseDN = ("," + self._directory.MEMBERS_BASEDN + self._directory.SUFFIX).lower()
+        lidnummers = []
+        for memberDN in memberDNs:
+            if memberDN.endswith(membersBaseDN):
+                lidnummers.append(int(self._directory.extract_cn(memberDN)))
+        lidnummers.sort()
+        return [self.get_member(lidnummer) for lidnummer in lidnummers]
+    
+    def load_group_lists(self, members):
+        '''
+        (MemberDatabase, list) -> None
+        
+        Provides each Member in members with its list of groups from the membership
+        index, so that group_list and role_list need no search per Member. Use this
+        before asking the roles of many Members.
+        '''
+        index = self.membership_index()
+        for member in members:
+            member.cache_group_list(index.get(member.DN().lower(), []))
+    
+    def fetch_group_lists(self, members):
+        '''
+        (MemberDatabase, list) -> None
+        
+        Looks up the groups of all Members in members, with one search per
+        MEMBERS_PER_SEARCH Members for the groups that have any of them as a member,
+        and provides each Member with its list of groups (see
+        Member.cache_group_list). Unlike load_group_lists, this reads only the
+        groups of these Members, not all groups in the directory.
+        '''
+        groupLists = {}
+        for member in members:
+            groupLists[member.DN().lower()] = []
+        memberDNs = groupLists.keys()
+        baseDN = self._directory.GROUPS_BASEDN + self._directory.SUFFIX
+        for start in range(0, len(memberDNs), self.MEMBERS_PER_SEARCH):
+            # A group is returned by every search that names one of its members, so
+            # only the Members of this search are matched against it.
+            searchDNs = set(memberDNs[start:start + self.MEMBERS_PER_SEARCH])
+            memberFilter = "".join(["(member=%s)" % memberDN for memberDN in searchDNs])
+            searchFilter = "(&(objectClass=groupOfNames)(|%s))" % memberFilter
+            for groupDN, attributes in self._directory.search_paged(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['cn', 'member']):
+                groupName = self._directory.extract_cn(groupDN)
+                for memberDN in attributes.get('member', []):
+                    if memberDN.lower() in searchDNs:
+                        groupLists[memberDN.lower()].append(groupName)
+        for member in members:
+            member.cache_group_list(groupLists[member.DN().lower()])
+    
+    def iter_batches(self, members, withRoles = True, batchSize = MEMBERS_PER_SEARCH):
+        '''
+        (MemberDatabase, iterable, bool, int) -> generator
+        
+        Streams the Members produced by members (such as iter_users(hydrate=True))
+        in lists of at most batchSize. Every list is yielded as soon as it is
+        complete, with the attributes of all its Members loaded (Members that do not
+        exist are left out) and, if withRoles is True, the group lists of its users
+        loaded, with one search per list (or from the membership index, if it has
+        been built already). Only one list is held at a time, so the time to the
+        first list and the memory used do not depend on the size of the directory.
+        '''
+        batch = []
+        for member in members:
+            batch.append(member)
+            if len(batch) == batchSize:
+                yield self._complete_batch(batch, withRoles)
+                batch = []
+        if batch:
+            yield self._complete_batch(batch, withRoles)
+    
+    def _complete_batch(self, members, withRoles):
+        '''
+        (MemberDatabase, list, bool) -> list
+        
+        Loads what iter_batches promises for one list of Members, and returns the
+        Members that exist.
+        '''
+        missing = set(self.hydrate([member for member in members if not member.has_cached_attributes()]))
+        members = [member for member in members if member not in missing]
+        if withRoles:
+            users = [member for member in members if member.is_user()]
+            if self._membershipIndex is not None:
+                self.load_group_lists(users)
+            else:
+                self.fetch_group_lists(users)
+        return members
+    
+    def snapshot(self):
+        '''
+        (MemberDatabase) -> DirectorySnapshot
+        
+        Reads all members and groups of the MemberDatabase in two searches, and
+        returns them as a DirectorySnapshot for reporting.
+        '''
+        return DirectorySnapshot.DirectorySnapshot(self._directory, self._database, self.get_member)
     
     def number_of_members(self):
         '''
@@ -88,19 +634,153 @@ class MemberDatabase:
         '''
         (MemberDatabase) -> list
         
-        Returns a list of Members with out-of-band status.
+        Returns a list of Members with out-of-band status, sorted by lidnummer.
         '''
-        return Group.Group(self._directory, self._database, "type-outofband").members()
+        lidnummers = []
+        for memberDN in self.get_group("type-outofband").member_dns():
+            if memberDN != self._directory.STRUCTURAL_USER.lower():
+                lidnummers.append(int(self._directory.extract_cn(memberDN)))
+        lidnummers.sort()
+        return [self.get_member(lidnummer) for lidnummer in lidnummers]
         
     def revoke_all_roles(self, member):
         '''
-        (MemberDatabase, Member) -> None
+        (MemberDatabase, Member) -> str (or None)
         
-        Revokes all the roles that have been granted to member.
+        Revokes all the roles that have been granted to member. The roles are found
+        with one search, and the revocations are sent as one pipelined batch.
+        Returns None on success, or a description of why (some of) the roles could
+        not be revoked, e.g. because member is not a user.
+        '''
+        if not member.is_user():
+            return "Can not revoke roles from members who are not users."
+        return self._revoke_all_roles([member])[0]
+    
+    def remove_users(self, removals):
+        '''
+        (MemberDatabase, list) -> list
+        
+        Demotes many users to member at once, like revoke_all_roles followed by
+        Member.remove_user does for one. removals is a list of (Member, username),
+        where username must be the current username of the Member as an additional
+        check. Returns a list with one error per removal, in the same order: None on
+        success, or a description of why the removal did not (fully) happen.
+        
+        The Members are read in one pipelined batch, their roles are found with one
+        search per MEMBERS_PER_SEARCH Members, and all role revocations are sent as
+        one pipelined batch, with one modification per role. The uid deletions are
+        sent as a second pipelined batch, only for the Members whose roles were all
+        revoked: a user whose uid is gone could no longer be found by username to
+        clean up the remaining roles.
+        '''
+        errors = [None] * len(removals)
+        missingLidnummers = set()
+        for member in self.hydrate([member for member, username in removals]):
+            missingLidnummers.add(member.get_lidnummer())
+        seenLidnummers = set()
+        for i, (member, username) in enumerate(removals):
+            if member.get_lidnummer() in missingLidnummers:
+                errors[i] = "Lidnummer does not refer to a Member."
+            elif member.get_lidnummer() in seenLidnummers:
+                errors[i] = "Member is removed more than once."
+            elif not member.is_user():
+                errors[i] = "Member referred to by lidnummer is not a user."
+            elif member.get_username() != username:
+                errors[i] = "Provided username does not match provided lidnummer. User removal canceled."
+            seenLidnummers.add(member.get_lidnummer())
+        candidates = [i for i in range(len(removals)) if errors[i] is None]
+        
+        revocationErrors = self._revoke_all_roles([removals[i][0] for i in candidates])
+        for i, error in zip(candidates, revocationErrors):
+            errors[i] = error
+        
+        batch = self._directory.batch()
+        deletions = [i for i in candidates if errors[i] is None]
+        for i in deletions:
+            batch.modify(removals[i][0].DN(), [(ldap.MOD_DELETE, "uid", None)])
+        for i, result in zip(deletions, batch.collect()):
+            if isinstance(result, ldap.LDAPError):
+                errors[i] = "Roles were revoked, but the username could not be deleted: %s" % str(result)
+        
+        # Update the cached attributes instead of discarding them, so that callers
+        # can still read the names of the removed users without another lookup.
+        for i in candidates:
+            member = removals[i][0]
+            if errors[i] is None:
+                member.update_cached_attribute('uid', None)
+            else:
+                member.invalidate_cache()
+        return errors
+    
+    def _revoke_all_roles(self, members):
         '''
-        memberRoleNameList = member.role_list()
-        for memberRoleName in memberRoleNameList:
-            Role.Role(self._directory, self._database, memberRoleName).revoke(member)
+        (MemberDatabase, list) -> list
+        
+        Revokes all the roles of the users in members, which are found with one
+        search per MEMBERS_PER_SEARCH Members, in one pipelined batch with one
+        modification per role. Returns a list with one error per Member, in the
+        same order: None if all its roles were revoked, and otherwise a description
+        of the first revocation that failed.
+        '''
+        positions = dict([(member.DN().lower(), i) for i, member in enumerate(members)])
+        errors = [None] * len(members)
+        batch = self._directory.batch()
+        operations = []
+        for groupDN, groupMembers, usernames in self._role_groups(members):
+            batch.modify(groupDN, self._removal_modifications(groupMembers, usernames))
+            operations.append(([positions[member.DN().lower()] for member in groupMembers], "Could not revoke role %s: %%s" % self._directory.extract_cn(groupDN)))
+        for (affected, message), result in zip(operations, batch.collect()):
+            if isinstance(result, ldap.LDAPError):
+                for i in affected:
+                    if errors[i] is None:
+                        errors[i] = message % str(result)
+        for member in members:
+            member.invalidate_group_list()
+        return errors
+    
+    def _role_groups(self, members):
+        '''
+        (MemberDatabase, list) -> list
+        
+        Finds the roles of all Members in members, with one search per
+        MEMBERS_PER_SEARCH Members. Returns a list of tuples (groupDN, groupMembers,
+        usernames): the DN of a role group, the Members in members that are in it,
+        and their usernames that are in its memberUid attribute.
+        '''
+        membersByDN = {}
+        for member in members:
+            membersByDN[member.DN().lower()] = member
+        memberDNs = membersByDN.keys()
+        baseDN = self._directory.GROUPS_BASEDN + self._directory.SUFFIX
+        groups = {}
+        for start in range(0, len(memberDNs), self.MEMBERS_PER_SEARCH):
+            # A group is returned by every search that names one of its members, so
+            # only the Members of this search are matched against it.
+            searchMembers = dict([(memberDN, membersByDN[memberDN]) for memberDN in memberDNs[start:start + self.MEMBERS_PER_SEARCH]])
+            memberFilter = "".join(["(member=%s)" % memberDN for memberDN in searchMembers])
+            searchFilter = "(&(cn=%s*)(|%s))" % (self._directory.ROLE_PREFIX, memberFilter)
+            for groupDN, attributes in self._directory.search_paged(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['member', 'memberUid']):
+                groupMembers, usernames = groups.setdefault(groupDN, ([], []))
+                memberUids = set(attributes.get('memberUid', []))
+                for memberDN in attributes.get('member', []):
+                    member = searchMembers.get(memberDN.lower())
+                    if member is not None:
+                        groupMembers.append(member)
+                        if member.get_username() in memberUids:
+                            usernames.append(member.get_username())
+        return [(groupDN, groupMembers, usernames) for groupDN, (groupMembers, usernames) in groups.items()]
+    
+    def _removal_modifications(self, groupMembers, usernames):
+        '''
+        (MemberDatabase, list, list) -> list
+        
+        Returns the modifications that remove groupMembers, and those of their
+        usernames that are in memberUid, from a group.
+        '''
+        modifications = [(ldap.MOD_DELETE, "member", [member.DN() for member in groupMembers])]
+        if usernames:
+            modifications.append((ldap.MOD_DELETE, "memberUid", usernames))
+        return modifications
 
     def all_roles(self):
         '''
@@ -108,14 +788,21 @@ class MemberDatabase:
         
         Returns a list of Roles that have been defined in the MemberDatabase.
         '''
-        roles = []
+        return list(self.iter_roles())
+    
+    def iter_roles(self):
+        '''
+        (MemberDatabase) -> generator
+        
+        Streaming variant of all_roles: returns a generator that yields the Roles
+        while the results arrive page by page.
+        '''
         searchFilter = "cn=%s*" % self._directory.ROLE_PREFIX
-        results = self._directory.search(searchFilter, self._directory.GROUPS_BASEDN+self._directory.SUFFIX, ldap.SCOPE_ONELEVEL, ['cn'])
+        results = self._directory.search_paged(searchFilter, self._directory.GROUPS_BASEDN+self._directory.SUFFIX, ldap.SCOPE_ONELEVEL, ['cn'])
         for result in results:
             DN, attributes = result
             cn = attributes['cn'][0]
-            roles.append(Role.Role(self._directory, self._database, cn))
-        return roles
+            yield self.get_role(cn)
     
     def all_groups(self):
         '''
@@ -123,10 +810,17 @@ class MemberDatabase:
         
         Returns a list of all Groups that have been defined in the MemberDatabase.
         '''
+        return list(self.iter_groups())
+    
+    def iter_groups(self):
+        '''
+        (MemberDatabase) -> generator
+        
+        Streaming variant of all_groups: returns a generator that yields the Groups
+        while the results arrive page by page.
+        '''
         searchFilter = "objectClass=groupOfNames"
         baseDN = self._directory.GROUPS_BASEDN + self._directory.SUFFIX
-        results = self._directory.search(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['cn'])
-        groupList = []
+        results = self._directory.search_paged(searchFilter, baseDN, ldap.SCOPE_SUBTREE, ['cn'])
         for groupEntry in results:
-            groupList.append(Group.Group.from_dn(self._directory, self._database, groupEntry[0]))
-        return groupList
+            yield self.get_group_by_dn(groupEntry[0])
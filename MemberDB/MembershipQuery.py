@@ -0,0 +1,125 @@
+import fnmatch
+import re
+
+# Operators of membership expressions, with the set operation each stands for.
+UNION = "|"
+INTERSECTION = "&"
+DIFFERENCE = "-"
+
+class QueryError(Exception):
+    pass
+
+def parse(expression):
+    '''
+    (str) -> tuple
+    
+    Parses a membership expression into a tree that can be evaluated with
+    evaluate. An expression combines group names with the operators | (union),
+    & (intersection) and - (difference), which must be surrounded by spaces.
+    & binds stronger than | and -, which are applied from left to right;
+    parentheses group. A group name may contain '*' to stand for the union of all
+    groups whose name matches it.
+    
+    Example: "(role-lb | role-ict) - role-*-old & type-outofband"
+    
+    Raises a QueryError if expression is not a valid membership expression.
+    '''
+    tokens = re.findall(r"\(|\)|[^\s()]+", expression)
+    if not tokens:
+        raise QueryError("Empty membership expression.")
+    tree, position = _parse_expression(tokens, 0)
+    if position != len(tokens):
+        raise QueryError("Unexpected '%s' in membership expression." % tokens[position])
+    return tree
+
+def group_names(tree):
+    '''
+    (tuple) -> list
+    
+    Returns the group names (and patterns) that occur in tree, without duplicates.
+    '''
+    if tree[0] == "group":
+        return [tree[1]]
+    names = []
+    for name in group_names(tree[1]) + group_names(tree[2]):
+        if name not in names:
+            names.append(name)
+    return names
+
+def evaluate(tree, memberSets):
+    '''
+    (tuple, dict) -> set
+    
+    Evaluates tree, with memberSets mapping each group name to the set of DNs
+    of its members. Raises a QueryError if a group name in tree (or a pattern)
+    matches no group in memberSets.
+    '''
+    if tree[0] == "group":
+        matches = [groupName for groupName in memberSets if fnmatch.fnmatchcase(groupName.lower(), tree[1].lower())]
+        if not matches:
+            raise QueryError("Group %s does not exist." % tree[1])
+        result = set()
+        for groupName in matches:
+            result.update(memberSets[groupName])
+        return result
+    left = evaluate(tree[1], memberSets)
+    right = evaluate(tree[2], memberSets)
+    if tree[0] == UNION:
+        return left | right
+    elif tree[0] == INTERSECTION:
+        return left & right
+    else:
+        return left - right
+
+def is_valid_group_pattern(groupPattern):
+    '''
+    (str) -> bool
+    
+    Returns True iff groupPattern is a valid group name, possibly with '*'.
+    '''
+    return re.match("^[A-Za-z0-9_\-\*]+$", groupPattern)
+
+def _parse_expression(tokens, position):
+    '''
+    (list, int) -> (tuple, int)
+    
+    Parses a sequence of terms joined by | and - that starts at position.
+    '''
+    tree, position = _parse_term(tokens, position)
+    while position < len(tokens) and tokens[position] in [UNION, DIFFERENCE]:
+        operator = tokens[position]
+        right, position = _parse_term(tokens, position + 1)
+        tree = (operator, tree, right)
+    return tree, position
+
+def _parse_term(tokens, position):
+    '''
+    (list, int) -> (tuple, int)
+    
+    Parses a sequence of operands joined by & that starts at position.
+    '''
+    tree, position = _parse_operand(tokens, position)
+    while position < len(tokens) and tokens[position] == INTERSECTION:
+        right, position = _parse_operand(tokens, position + 1)
+        tree = (INTERSECTION, tree, right)
+    return tree, position
+
+def _parse_operand(tokens, position):
+    '''
+    (list, int) -> (tuple, int)
+    
+    Parses a group name or a parenthesized expression that starts at position.
+    '''
+    if position >= len(tokens):
+        raise QueryError("Membership expression ends unexpectedly.")
+    token = tokens[position]
+    if token in [UNION, INTERSECTION, DIFFERENCE, ")"]:
+        raise QueryError("Unexpected '%s' in membership expression." % token)
+    if token == "(":
+        tree, position = _parse_expression(tokens, position + 1)
+        if position >= len(tokens) or tokens[position] != ")":
+            raise QueryError("Missing ')' in membership expression.")
+        return tree, position + 1
+    if not is_valid_group_pattern(token):
+        raise QueryError("Not a valid group name: %s." % token)
+    return ("group", token), position + 1
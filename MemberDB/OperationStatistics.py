@@ -0,0 +1,254 @@
+import functools
+import heapq
+import math
+import os
+import sys
+import threading
+import time
+
+class OperationStatistics:
+    '''
+    Class to record the LDAP and SQL operations done by a process: how many there
+    are and how long they take, per type of operation and per method that asked
+    for them. Recording is off until start is called.
+    '''
+    SLOWEST_CALLS = 10
+    # Modules that are never reported as the caller of an operation: the
+    # connectors themselves, whose methods only pass on what their caller asked.
+    CONNECTOR_MODULES = ['LdapConnection', 'SqlConnection', 'DirectoryReplica', 'OperationStatistics']
+    
+    def __init__(self):
+        '''
+        (OperationStatistics) -> None
+        
+        Initializes OperationStatistics without any recorded operations.
+        '''
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        '''
+        (OperationStatistics) -> None
+        
+        Forgets all recorded operations.
+        '''
+        self._lock.acquire()
+        try:
+            self._durations = {}
+            self._callers = {}
+            self._slowest = []
+        finally:
+            self._lock.release()
+    
+    def start(self):
+        '''
+        (OperationStatistics) -> None
+        
+        Forgets all recorded operations and starts recording.
+        '''
+        self.reset()
+        self.enabled = True
+    
+    def stop(self):
+        '''
+        (OperationStatistics) -> None
+        
+        Stops recording. The operations recorded so far are kept for report.
+        '''
+        self.enabled = False
+    
+    def record(self, operation, caller, seconds, description):
+        '''
+        (OperationStatistics, str, str, float, str) -> None
+        
+        Records that caller did one operation of type operation that took seconds,
+        with description saying what it was about (a search filter, a DN, a query).
+        '''
+        self._lock.acquire()
+        try:
+            self._durations.setdefault(operation, []).append(seconds)
+            totals = self._callers.setdefault((operation, caller), [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            call = (seconds, operation, caller, description)
+            if len(self._slowest) < self.SLOWEST_CALLS:
+                heapq.heappush(self._slowest, call)
+            else:
+                heapq.heappushpop(self._slowest, call)
+        finally:
+            self._lock.release()
+    
+    def call(self, operation, function, arguments, keywords, description):
+        '''
+        (OperationStatistics, str, function, tuple, dict, function) -> object
+        
+        Calls function with arguments and keywords and returns its result,
+        recording the call as an operation of type operation, described by
+        description(arguments).
+        Operations that are part of another recorded operation (such as the search
+        done by LdapConnection.attributes) are not recorded separately.
+        '''
+        if not self.enabled or getattr(self._local, 'busy', False):
+            return function(*arguments, **keywords)
+        caller = calling_method()
+        self._local.busy = True
+        start = time.time()
+        try:
+            return function(*arguments, **keywords)
+        finally:
+            seconds = time.time() - start
+            self._local.busy = False
+            self.record(operation, caller, seconds, description(arguments))
+    
+    def call_iteration(self, operation, function, arguments, keywords, description):
+        '''
+        (OperationStatistics, str, function, tuple, dict, function) -> generator
+        
+        Like call, for a function that returns a generator. The time spent
+        waiting for its items (but not the time the caller spends in between) is
+        recorded as one operation once the iteration ends.
+        '''
+        if not self.enabled or getattr(self._local, 'busy', False):
+            return function(*arguments, **keywords)
+        return self._iterate(operation, function(*arguments, **keywords), calling_method(), description(arguments))
+    
+    def _iterate(self, operation, iterator, caller, description):
+        '''
+        (OperationStatistics, str, generator, str, str) -> generator
+        
+        Yields the items of iterator while timing them for call_iteration.
+        '''
+        seconds = 0.0
+        try:
+            while True:
+                self._local.busy = True
+                start = time.time()
+                try:
+                    item = iterator.next()
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.time() - start
+                    self._local.busy = False
+                yield item
+        finally:
+            iterator.close()
+            self.record(operation, caller, seconds, description)
+    
+    def report(self):
+        '''
+        (OperationStatistics) -> str
+        
+        Returns a summary of the recorded operations: their number, total and 95th
+        percentile latency per type, their number and total latency per caller,
+        and the slowest calls.
+        '''
+        self._lock.acquire()
+        try:
+            durations = dict([(operation, sorted(seconds)) for operation, seconds in self._durations.items()])
+            callers = sorted(self._callers.items(), key=lambda item: -item[1][1])
+            slowest = sorted(self._slowest, reverse=True)
+        finally:
+            self._lock.release()
+        lines = ["", "Operations:", "  %-20s %8s %10s %10s" % ("operation", "count", "total ms", "p95 ms")]
+        for operation in sorted(durations):
+            seconds = durations[operation]
+            lines.append("  %-20s %8i %10.1f %10.1f" % (operation, len(seconds), sum(seconds) * 1000, percentile(seconds, 95) * 1000))
+        if not durations:
+            lines.append("  (none)")
+        lines.extend(["", "Per caller:", "  %-20s %-40s %8s %10s" % ("operation", "caller", "count", "total ms")])
+        for (operation, caller), (count, seconds) in callers:
+            lines.append("  %-20s %-40s %8i %10.1f" % (operation, caller, count, seconds * 1000))
+        lines.extend(["", "Slowest calls:"])
+        for seconds, operation, caller, description in slowest:
+            lines.append("  %10.1f ms  %-20s %-40s %s" % (seconds * 1000, operation, caller, description))
+        return "\n".join(lines) + "\n"
+
+### END OF CLASS
+
+# The statistics of this process, which all connectors record into.
+STATISTICS = OperationStatistics()
+
+def timed(operation, description = None):
+    '''
+    (str or function, function) -> function
+    
+    Decorator for methods of connectors that records every call in STATISTICS as
+    an operation of type operation, while recording is on. operation may also be
+    a function that returns the type given the arguments of the call (including
+    self). description returns what the call is about given its arguments; by
+    default, this is the first argument after self.
+    '''
+    if description is None:
+        description = describe_first_argument
+    def decorate(function):
+        @functools.wraps(function)
+        def timed_function(*arguments, **keywords):
+            operationType = operation
+            if callable(operation):
+                operationType = operation(arguments)
+            return STATISTICS.call(operationType, function, arguments, keywords, description)
+        return timed_function
+    return decorate
+
+def timed_iteration(operation, description = None):
+    '''
+    (str, function) -> function
+    
+    Decorator like timed, for methods that return a generator. The time spent
+    producing the items is recorded as one operation when the iteration ends.
+    '''
+    if description is None:
+        description = describe_first_argument
+    def decorate(function):
+        @functools.wraps(function)
+        def timed_function(*arguments, **keywords):
+            return STATISTICS.call_iteration(operation, function, arguments, keywords, description)
+        return timed_function
+    return decorate
+
+def calling_method():
+    '''
+    () -> str
+    
+    Returns the name of the method or function, outside the connector modules,
+    that is (indirectly) calling the current connector method, such as
+    'Member.get_mail' or 'list_users.main'.
+    '''
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+        if module not in OperationStatistics.CONNECTOR_MODULES:
+            instance = frame.f_locals.get('self')
+            if instance is not None and hasattr(instance, '__class__'):
+                return instance.__class__.__name__ + "." + frame.f_code.co_name
+            return module + "." + frame.f_code.co_name
+        frame = frame.f_back
+    return "?"
+
+def describe_first_argument(arguments):
+    '''
+    (tuple) -> str
+    
+    Returns the first argument after self of a connector method on one line, to
+    describe what the call is about.
+    '''
+    if len(arguments) < 2:
+        return ""
+    text = " ".join(str(arguments[1]).split())
+    if len(text) > 100:
+        text = text[:97] + "..."
+    return text
+
+def percentile(values, percent):
+    '''
+    (list, int) -> float
+    
+    Returns the percent-th percentile of the sorted list values (nearest rank),
+    or 0.0 if values is empty.
+    '''
+    if not values:
+        return 0.0
+    return values[max(0, int(math.ceil(percent / 100.0 * len(values))) - 1)]
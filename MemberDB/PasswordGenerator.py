@@ -0,0 +1,93 @@
+import os
+import random
+import string
+
+sysrand = random.SystemRandom()
+
+# The word list lives next to the scripts, one directory up from this module.
+WORDLIST_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "woordenlijst")
+
+# Character classes, as used by pwgen.
+DIGITS = string.digits
+UPPERCASE = string.ascii_uppercase
+LOWERCASE = string.ascii_lowercase
+SYMBOLS = string.punctuation
+
+# Password types: (length, alphabet, classes of which at least one character
+# must occur). Each type has at least 50 bits of entropy, like pwgen -s
+# with the same options.
+CHARACTER_TYPES = {
+    0: (8, DIGITS + UPPERCASE + LOWERCASE + SYMBOLS, [DIGITS, UPPERCASE, SYMBOLS]),
+    1: (9, UPPERCASE + LOWERCASE, [UPPERCASE]),
+    2: (11, LOWERCASE, []),
+}
+WORD_TYPE = 3
+NUMBER_OF_WORDS = 5
+
+_wordlist = None
+
+def wordlist():
+    '''
+    () -> tuple
+    
+    Returns the words in WORDLIST_FILE. The file is read only once per process.
+    '''
+    global _wordlist
+    if _wordlist is None:
+        wordFile = open(WORDLIST_FILE, 'r')
+        try:
+            _wordlist = tuple(wordFile.read().splitlines())
+        finally:
+            wordFile.close()
+    return _wordlist
+
+def generate_password(passwordType):
+    '''
+    (int) -> str
+    
+    Generates and returns one password of type passwordType, using the system's
+    source of randomness.
+    
+    Password types are as follows:
+        
+        0 -> 8 characters, uppercase, lowercase, digits, special
+        1 -> 9 characters, uppercase, lowercase
+        2 -> 11 characters, lowercase
+        3 -> 5 random Dutch words, lowercase
+    '''
+    if passwordType == WORD_TYPE:
+        return ''.join(sysrand.sample(wordlist(), NUMBER_OF_WORDS))
+    elif passwordType in CHARACTER_TYPES:
+        length, alphabet, requiredClasses = CHARACTER_TYPES[passwordType]
+        # Draw until all required classes occur, like pwgen does. This keeps the
+        # passwords uniformly distributed over all valid passwords.
+        while True:
+            password = ''.join([sysrand.choice(alphabet) for i in range(length)])
+            if all_classes_occur(password, requiredClasses):
+                return password
+    else:
+        raise Exception("Password type should be 0, 1, 2 or 3.")
+
+def generate_passwords(passwordType, number):
+    '''
+    (int, int) -> list
+    
+    Generates and returns a list of number passwords of type passwordType. See
+    generate_password for the password types.
+    '''
+    return [generate_password(passwordType) for i in range(number)]
+
+def all_classes_occur(password, requiredClasses):
+    '''
+    (str, list) -> bool
+    
+    Returns True iff password contains at least one character of each of the
+    character classes in requiredClasses.
+    '''
+    for characterClass in requiredClasses:
+        for character in password:
+            if character in characterClass:
+                break
+        else:
+            return False
+    return True
@@ -3,10 +3,14 @@ import LdapConnection
 import SqlConnection
 import re
 
-class Role:
+class Role(object):
     '''
     Class to manipulate a role in the MemberDatabase.
+    
+    Roles are hashable (by name). Use MemberDatabase.get_role to get the shared
+    instance for a role.
     '''
+    __slots__ = ('_directory', '_database', '_name', '_roleGroup', '__weakref__')
     
     def __init__(self, directory, database, roleName):
         '''
@@ -46,6 +50,14 @@ class Role:
         '''
         return not self.__eq__(otherRole)
     
+    def __hash__(self):
+        '''
+        (Role) -> int
+        
+        Returns a hash of Role that agrees with __eq__.
+        '''
+        return hash(self._name)
+    
     def create(self):
         '''
         (Role) -> None
@@ -68,27 +80,57 @@ class Role:
         else:
             self._roleGroup.delete()
     
-    def grant(self, member):
+    def grant(self, member, batch = None):
         '''
-        (Role, Member) -> None
+        (Role, Member, LdapBatch) -> None
         
-        Grant this Role to this Member.
+        Grant this Role to this Member. See Group.add for the use of batch.
         '''
         if not member.is_user():
             raise Exception("Can not grant role to members who are not users.")
         else:
-            self._roleGroup.add(member)
+            self._roleGroup.add(member, batch)
     
-    def revoke(self, member):
+    def revoke(self, member, batch = None):
         '''
-        (Role, Member) -> None
+        (Role, Member, LdapBatch) -> None
         
-        Revoke this Role from this Member.
+        Revoke this Role from this Member. See Group.remove for the use of batch.
         '''
         if not member.is_user():
             raise Exception("Can not revoke role from members who are not users.")
         else:
-            self._roleGroup.remove(member)
+            self._roleGroup.remove(member, batch)
+    
+    def grant_many(self, members, batch = None):
+        '''
+        (Role, list, LdapBatch) -> None
+        
+        Grant this Role to all Members in members, in one modification (see
+        Group.add_many).
+        '''
+        self._check_users(members, "Can not grant role to members who are not users.")
+        self._roleGroup.add_many(members, batch)
+    
+    def revoke_many(self, members, batch = None):
+        '''
+        (Role, list, LdapBatch) -> None
+        
+        Revoke this Role from all Members in members, in one modification (see
+        Group.remove_many).
+        '''
+        self._check_users(members, "Can not revoke role from members who are not users.")
+        self._roleGroup.remove_many(members, batch)
+    
+    def _check_users(self, members, message):
+        '''
+        (Role, list, str) -> None
+        
+        Raises an Exception with message if one of members is not a user.
+        '''
+        for member in members:
+            if not member.is_user():
+                raise Exception(message)
     
     def get_name(self):
         '''
@@ -106,6 +148,14 @@ class Role:
         '''
         return self._roleGroup.members()
     
+    def member_dns(self):
+        '''
+        (Role) -> set
+        
+        Returns the lowercase DNs of all users who have this role, as a set.
+        '''
+        return self._roleGroup.member_dns()
+    
     def exists(self):
         '''
         (Role) -> bool
@@ -0,0 +1,287 @@
+import LdapConnection
+import array
+import marshal
+import os
+import re
+
+# Attributes that can be searched by substring through the index.
+INDEXED_ATTRIBUTES = ['sn', 'mail', 'uid']
+
+# Bumped whenever the layout of the index file changes, so old files are rebuilt.
+FORMAT_VERSION = 1
+
+# Type code of the arrays in which postings are stored in the index file.
+POSTING_TYPECODE = 'i'
+
+class SearchIndex:
+    '''
+    Class to answer substring searches on member attributes from a local trigram
+    index instead of the directory.
+    
+    The index is built from one bulk read of all member records and is kept up to
+    date with the modifyTimestamp of the records. It only yields candidates: the
+    matching records are always fetched from the directory by DN afterwards, so a
+    record that was deleted since the index was refreshed is never returned.
+    '''
+    
+    def __init__(self, directory, path, loggingFacility):
+        '''
+        (SearchIndex, LdapConnection, str, Logger) -> None
+        
+        Initializes the SearchIndex stored in the file at path. The file is read if
+        it exists and has the current format; otherwise the index starts out empty
+        and is built on the first refresh.
+        '''
+        self._directory = directory
+        self._path = path
+        self._logger = loggingFacility
+        self._clear()
+        self._load()
+    
+    def __len__(self):
+        '''
+        (SearchIndex) -> int
+        
+        Returns the number of member records in the index.
+        '''
+        return len(self._values)
+    
+    def path(self):
+        '''
+        (SearchIndex) -> str
+        
+        Returns the path of the index file.
+        '''
+        return self._path
+    
+    def refresh(self):
+        '''
+        (SearchIndex) -> int
+        
+        Brings the index up to date: builds it from scratch if it is empty, and
+        otherwise only reads the records modified since the newest modifyTimestamp in
+        the index. The index file is rewritten if anything changed. Returns the
+        number of records that changed.
+        '''
+        if self._newest is None:
+            return self.rebuild()
+        changed = 0
+        searchFilter = "(&(objectClass=inetOrgPerson)(modifyTimestamp>=%s))" % self._newest
+        for entry in self._directory.search_members_paged(searchFilter, ['cn', 'modifyTimestamp'] + INDEXED_ATTRIBUTES):
+            if self._add(entry[1]):
+                changed += 1
+        if changed:
+            self.save()
+        return changed
+    
+    def rebuild(self):
+        '''
+        (SearchIndex) -> int
+        
+        Builds the index from scratch with one paged read of all member records, and
+        writes it to the index file. Returns the number of records read.
+        '''
+        self._clear()
+        for entry in self._directory.search_members_paged("objectClass=inetOrgPerson", ['cn', 'modifyTimestamp'] + INDEXED_ATTRIBUTES):
+            self._add(entry[1])
+        self.save()
+        return len(self._values)
+    
+    def search(self, attribute, pattern, usersOnly = False):
+        '''
+        (SearchIndex, str, str, bool) -> list
+        
+        Returns the sorted lidnummers of the records of which a value of attribute
+        matches pattern, an LDAP substring pattern such as '*jan*berg*' (matched
+        without regard to case). If usersOnly is True, only records with a uid are
+        returned.
+        '''
+        if attribute not in INDEXED_ATTRIBUTES:
+            raise ValueError("Attribute %s is not indexed." % attribute)
+        pattern = pattern.lower()
+        candidates = None
+        for fragment in pattern.split("*"):
+            for trigram in trigrams(fragment):
+                posting = self._posting(attribute, trigram)
+                if candidates is None:
+                    candidates = set(posting)
+                else:
+                    candidates.intersection_update(posting)
+                if not candidates:
+                    return []
+        values = self._values
+        if candidates is None:
+            candidates = values.keys()
+        matcher = compile_pattern(pattern)
+        index = INDEXED_ATTRIBUTES.index(attribute)
+        uidIndex = INDEXED_ATTRIBUTES.index('uid')
+        matches = []
+        for lidnummer in candidates:
+            if usersOnly and not values[lidnummer][uidIndex]:
+                continue
+            for value in values[lidnummer][index]:
+                if matcher.match(value):
+                    matches.append(lidnummer)
+                    break
+        matches.sort()
+        return matches
+    
+    def discard(self, lidnummer):
+        '''
+        (SearchIndex, int) -> None
+        
+        Removes the record of lidnummer from the index, e.g. because it turned out to
+        be deleted from the directory. The index file is not rewritten.
+        '''
+        if lidnummer not in self._values:
+            return
+        for attribute, values in zip(INDEXED_ATTRIBUTES, self._values.pop(lidnummer)):
+            postings = self._postings[attribute]
+            for value in values:
+                for trigram in trigrams(value):
+                    posting = self._posting(attribute, trigram)
+                    posting.discard(lidnummer)
+                    if not posting:
+                        postings.pop(trigram, None)
+    
+    def save(self):
+        '''
+        (SearchIndex) -> None
+        
+        Writes the index to its file. The file is replaced atomically, so concurrent
+        readers see either the old or the new index. It holds names and e-mail
+        addresses, so only its owner can read it.
+        
+        Postings are stored as packed arrays, which load much faster than sets.
+        If the file cannot be written (e.g. the user may not write to its
+        directory), a warning is logged and the index is only kept in memory.
+        '''
+        packed = {}
+        for attribute, postings in self._postings.items():
+            packed[attribute] = {}
+            for trigram, posting in postings.items():
+                if not isinstance(posting, str):
+                    posting = array.array(POSTING_TYPECODE, posting).tostring()
+                packed[attribute][trigram] = posting
+        state = (FORMAT_VERSION, self._newest, self._values, packed)
+        temporaryPath = "%s.%i" % (self._path, os.getpid())
+        try:
+            # A file left behind by an earlier run may have other permissions.
+            if os.path.exists(temporaryPath):
+                os.remove(temporaryPath)
+            indexFile = os.fdopen(os.open(temporaryPath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600), 'wb')
+            try:
+                indexFile.write(marshal.dumps(state))
+            finally:
+                indexFile.close()
+            os.rename(temporaryPath, self._path)
+        except (OSError, IOError), e:
+            self._logger.warning("Could not write search index %s: %s" % (self._path, str(e)))
+            if os.path.exists(temporaryPath):
+                try:
+                    os.remove(temporaryPath)
+                except OSError:
+                    pass
+    
+    def _load(self):
+        '''
+        (SearchIndex) -> None
+        
+        Reads the index from its file, if it exists and has the current format.
+        '''
+        try:
+            indexFile = open(self._path, 'rb')
+        except IOError:
+            return
+        try:
+            try:
+                state = marshal.loads(indexFile.read())
+            except (EOFError, ValueError, TypeError):
+                return
+        finally:
+            indexFile.close()
+        if isinstance(state, tuple) and len(state) == 4 and state[0] == FORMAT_VERSION:
+            self._newest, self._values, self._postings = state[1:]
+    
+    def _posting(self, attribute, trigram):
+        '''
+        (SearchIndex, str, str) -> set
+        
+        Returns the set of lidnummers whose value of attribute contains trigram.
+        Postings read from the index file are unpacked on first use.
+        '''
+        posting = self._postings[attribute].get(trigram)
+        if posting is None:
+            return set()
+        if isinstance(posting, str):
+            posting = set(array.array(POSTING_TYPECODE, posting))
+            self._postings[attribute][trigram] = posting
+        return posting
+    
+    def _clear(self):
+        '''
+        (SearchIndex) -> None
+        
+        Empties the index.
+        '''
+        self._newest = None
+        self._values = {}
+        self._postings = dict([(attribute, {}) for attribute in INDEXED_ATTRIBUTES])
+    
+    def _add(self, attributes):
+        '''
+        (SearchIndex, dict) -> bool
+        
+        Adds (or replaces) the record with the given attributes, as returned by a
+        search, to the index. Returns True iff the index changed.
+        '''
+        lidnummer = int(attributes['cn'][0])
+        values = tuple([tuple([value.lower() for value in attributes.get(attribute, [])]) for attribute in INDEXED_ATTRIBUTES])
+        changed = False
+        for timestamp in attributes.get('modifyTimestamp', []):
+            if self._newest is None or timestamp > self._newest:
+                self._newest = timestamp
+                changed = True
+        if self._values.get(lidnummer) == values:
+            return changed
+        self.discard(lidnummer)
+        self._values[lidnummer] = values
+        for attribute, attributeValues in zip(INDEXED_ATTRIBUTES, values):
+            postings = self._postings[attribute]
+            for value in attributeValues:
+                for trigram in trigrams(value):
+                    posting = self._posting(attribute, trigram)
+                    posting.add(lidnummer)
+                    postings[trigram] = posting
+        return True
+
+### END OF CLASS
+
+def trigrams(value):
+    '''
+    (str) -> set
+    
+    Returns the set of substrings of length 3 of value.
+    '''
+    return set([value[i:i + 3] for i in range(len(value) - 2)])
+
+def compile_pattern(pattern):
+    '''
+    (str) -> regex
+    
+    Compiles an LDAP substring pattern, in which '*' matches any sequence of
+    characters, into a case-insensitive regular expression matching whole values.
+    '''
+    return re.compile("^" + ".*".join([re.escape(fragment) for fragment in pattern.split("*")]) + "$", re.IGNORECASE | re.DOTALL)
+
+def matches(pattern, values):
+    '''
+    (str, list) -> bool
+    
+    Returns True iff one of values matches the LDAP substring pattern.
+    '''
+    matcher = compile_pattern(pattern)
+    for value in values:
+        if matcher.match(value):
+            return True
+    return False
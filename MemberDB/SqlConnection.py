@@ -1,24 +1,47 @@
+import OperationStatistics
 import MySQLdb
 import logging
+import contextlib
+import threading
+import time
+
+class SqlError(Exception):
+    '''
+    Raised when an SQL query fails in a way the caller has to know about: a query
+    that should return rows, or any query inside a transaction.
+    '''
+    pass
 
 class SqlConnection:
     '''
     Class to set up and employ an SQL connection.
     '''
+    POOL_SIZE = 4
     
-    def __init__(self, host, port, database, username, password, loggingFacility):
+    def __init__(self, host, port, database, username, password, loggingFacility, poolSize = POOL_SIZE):
         '''
-        (SqlConnection, str, int, str, str, str, logger) -> None
+        (SqlConnection, str, int, str, str, str, logger, int) -> None
         
         Takes all the credentials to start an SQL connection and creates the connection
         object.
+        
+        Queries are run on connections from a SqlConnectionPool of at most poolSize
+        connections, so that an SqlConnection can be used from several threads at
+        once, and connections that the server has closed in the meantime are
+        replaced automatically.
+        
+        The connections are in autocommit mode: outside a transaction (see
+        transaction), every statement that changes data is committed by the server
+        on its own, and statements that only read do not commit at all.
         '''
-        self.db = MySQLdb.connect(host, username, password, database, port)
-        self._connection = self.db.cursor()
+        self._pool = SqlConnectionPool(host, port, database, username, password, loggingFacility, poolSize)
         self._username = username
         self._database = database
         self._port = port
         self._logger = loggingFacility
+        self._local = threading.local()
+        # Connect right away, so that wrong credentials are reported at once.
+        self._pool.checkin(self._pool.checkout())
 
     def __str__(self):
         '''
@@ -27,8 +50,48 @@ class SqlConnection:
         Returns a human-readable representation of the connection that includes
         the username used to connect and the database where we work.
         '''
-        return self._username + " @ " + self._database + ":" + self._port
+        return self._username + " @ " + self._database + ":" + str(self._port)
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        (SqlConnection) -> context manager
+        
+        Groups all queries done inside a with statement into one transaction, which
+        is committed once at the end, or rolled back if the with statement ends with
+        an exception. Transactions can be nested; only the outermost one commits.
+        The transaction belongs to the current thread, which keeps one connection
+        from the pool for its duration.
+        
+        Example:
+        
+        > with instance.transaction():
+              instance.dosql("INSERT INTO table (firstname) VALUES (%s)", ("John",), False)
+              instance.dosql("INSERT INTO table (firstname) VALUES (%s)", ("Jane",), False)
+        '''
+        if not self.in_transaction():
+            connection = self._pool.checkout()
+            try:
+                connection.cursor().execute("START TRANSACTION")
+            except:
+                self._pool.discard(connection)
+                raise
+            self._local.connection = connection
+            self._local.transactionDepth = 0
+        self._local.transactionDepth += 1
+        try:
+            yield self
+        except:
+            self._local.transactionDepth -= 1
+            if self._local.transactionDepth == 0:
+                self._logger.debug("Rolling back transaction")
+                self._end_transaction(False)
+            raise
+        self._local.transactionDepth -= 1
+        if self._local.transactionDepth == 0:
+            self._end_transaction(True)
            
+    @OperationStatistics.timed(lambda arguments: "sql " + arguments[1].split(None, 1)[0].upper())
     def dosql(self, sql, value, expectRows, dryrun=False):
         '''
         (SqlConnection, str, tuple, bool, bool) -> list (or None)
@@ -42,6 +105,10 @@ class SqlConnection:
         we are in a debugging scenario: if it is True, queries are logged but
         not executed. None is returned whenever dryrun is True.
         
+        If the query fails, the error is logged. An SqlError is raised if expectRows
+        is True, so that a failed query is never mistaken for an empty result, and
+        inside a transaction, so that the transaction is rolled back.
+        
         Examples:
         
         > instance.dosql("INSERT INTO table (firstname, lastname) VALUES (%s, %s)",
@@ -52,20 +119,248 @@ class SqlConnection:
         > instance.dosql("SELECT * FROM complex INNER JOIN query", "", True, True)
         None
         '''
-        if value != "":
-            self._logger.debug((sql % value).encode("utf-8"))
-        else:
-            self._logger.debug(sql.encode("utf-8"))
-        if not dryrun:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            if value != "":
+                self._logger.debug((sql % value).encode("utf-8"))
+            else:
+                self._logger.debug(sql.encode("utf-8"))
+        if dryrun:
+            return None
+        connection = self._acquire()
+        broken = False
+        error = None
+        rows = ()
+        try:
+            cursor = connection.cursor()
             try:
                 if value != "":
-                    self._connection.execute(sql, value)
+                    cursor.execute(sql, value)
                 else:
-                    self._connection.execute(sql)
-                self.db.commit()
-            except:
-                self._logger.error("Error executing previous query")
-        for msg in self._connection.messages:
-            self._logger.debug(msg)
+                    cursor.execute(sql)
+            except MySQLdb.Error, e:
+                self._logger.error("Error executing previous query: %s" % str(e))
+                broken = isinstance(e, MySQLdb.OperationalError)
+                error = e
+            for msg in cursor.messages:
+                self._logger.debug(msg)
+            if expectRows and error is None:
+                rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            self._release(connection, broken)
+        if error is not None and (expectRows or self.in_transaction()):
+            raise SqlError(str(error))
         if expectRows:
-            return self._connection.fetchall()
+            return rows
+
+    @OperationStatistics.timed(lambda arguments: "sql " + arguments[1].split(None, 1)[0].upper())
+    def dosql_many(self, sql, values, dryrun=False):
+        '''
+        (SqlConnection, str, list, bool) -> None
+        
+        Executes the SQL query in sql once for every tuple in values, in one call to
+        the database and in one transaction, like dosql does for a single tuple. Use
+        this to insert many rows at once. dryrun has the same meaning as for dosql.
+        If the query fails, the transaction is rolled back and an SqlError is raised.
+        
+        Example:
+        
+        > instance.dosql_many("INSERT INTO table (firstname, lastname) VALUES (%s, %s)",
+            [("John", "Doe"), ("Jane", "Doe")])
+        None
+        '''
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(("%s (%i rows)" % (sql, len(values))).encode("utf-8"))
+        if dryrun or not values:
+            return
+        with self.transaction():
+            cursor = self._local.connection.cursor()
+            try:
+                cursor.executemany(sql, values)
+            except MySQLdb.Error, e:
+                self._logger.error("Error executing previous query: %s" % str(e))
+                raise SqlError(str(e))
+            finally:
+                for msg in cursor.messages:
+                    self._logger.debug(msg)
+                cursor.close()
+    
+    def in_transaction(self):
+        '''
+        (SqlConnection) -> bool
+        
+        Returns True iff the current thread is inside a transaction.
+        '''
+        return getattr(self._local, 'transactionDepth', 0) > 0
+    
+    def close(self):
+        '''
+        (SqlConnection) -> None
+        
+        Closes all connections that are not in use.
+        '''
+        self._pool.close()
+    
+    def _acquire(self):
+        '''
+        (SqlConnection) -> Connection
+        
+        Returns the connection of the transaction of the current thread, or a
+        connection from the pool if there is no transaction.
+        '''
+        if self.in_transaction():
+            return self._local.connection
+        return self._pool.checkout()
+    
+    def _release(self, connection, broken):
+        '''
+        (SqlConnection, Connection, bool) -> None
+        
+        Gives back a connection obtained with _acquire. A broken connection is
+        thrown away instead of being reused, unless a transaction still needs it.
+        '''
+        if self.in_transaction():
+            return
+        if broken:
+            self._pool.discard(connection)
+        else:
+            self._pool.checkin(connection)
+    
+    def _end_transaction(self, commit):
+        '''
+        (SqlConnection, bool) -> None
+        
+        Commits or rolls back the transaction of the current thread, and gives its
+        connection back to the pool.
+        '''
+        connection = self._local.connection
+        self._local.connection = None
+        try:
+            if commit:
+                connection.commit()
+            else:
+                connection.rollback()
+        except MySQLdb.OperationalError:
+            self._pool.discard(connection)
+            raise
+        self._pool.checkin(connection)
+
+
+class SqlConnectionPool:
+    '''
+    Class to hand out MySQL connections to several threads and reuse them.
+    '''
+    # Connections that have been idle for longer than this many seconds are
+    # pinged before they are handed out again, and replaced if the server has
+    # closed them (e.g. after wait_timeout).
+    PING_AFTER = 60
+    
+    def __init__(self, host, port, database, username, password, loggingFacility, size):
+        '''
+        (SqlConnectionPool, str, int, str, str, str, logger, int) -> None
+        
+        Initialize an empty pool that will open at most size connections with the
+        credentials given.
+        '''
+        self._credentials = (host, username, password, database, port)
+        self._logger = loggingFacility
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Semaphore(size)
+    
+    def checkout(self):
+        '''
+        (SqlConnectionPool) -> Connection
+        
+        Returns a connection that is not in use by anyone else. Reuses an idle
+        connection if there is one, checking first that it is still alive, and
+        opens a new one otherwise. Blocks while all connections are in use.
+        '''
+        self._available.acquire()
+        connection = None
+        try:
+            self._lock.acquire()
+            try:
+                if self._idle:
+                    connection, idleSince = self._idle.pop()
+                else:
+                    connection, idleSince = None, None
+            finally:
+                self._lock.release()
+            if connection is not None and time.time() - idleSince > self.PING_AFTER:
+                try:
+                    connection.ping()
+                except MySQLdb.OperationalError:
+                    self._logger.debug("Replacing SQL connection that was closed by the server")
+                    self._close(connection)
+                    connection = None
+            if connection is None:
+                connection = self._connect()
+            return connection
+        except:
+            # Whatever went wrong (including an interrupt), the slot must be given
+            # back, and an idle connection that failed its check is not reused.
+            if connection is not None:
+                self._close(connection)
+            self._available.release()
+            raise
+    
+    def checkin(self, connection):
+        '''
+        (SqlConnectionPool, Connection) -> None
+        
+        Gives back a connection obtained with checkout, so that it can be reused.
+        '''
+        self._lock.acquire()
+        try:
+            self._idle.append((connection, time.time()))
+        finally:
+            self._lock.release()
+        self._available.release()
+    
+    def discard(self, connection):
+        '''
+        (SqlConnectionPool, Connection) -> None
+        
+        Gives back a connection obtained with checkout that should not be reused,
+        e.g. because it is broken. A new connection will be opened in its place.
+        '''
+        self._close(connection)
+        self._available.release()
+    
+    def close(self):
+        '''
+        (SqlConnectionPool) -> None
+        
+        Closes all idle connections.
+        '''
+        self._lock.acquire()
+        try:
+            idle = self._idle
+            self._idle = []
+        finally:
+            self._lock.release()
+        for connection, idleSince in idle:
+            self._close(connection)
+    
+    def _connect(self):
+        '''
+        (SqlConnectionPool) -> Connection
+        
+        Opens a new connection in autocommit mode.
+        '''
+        host, username, password, database, port = self._credentials
+        connection = MySQLdb.connect(host, username, password, database, port)
+        connection.autocommit(True)
+        return connection
+    
+    def _close(self, connection):
+        '''
+        (SqlConnectionPool, Connection) -> None
+        
+        Closes a connection, ignoring errors of connections that are already gone.
+        '''
+        try:
+            connection.close()
+        except MySQLdb.Error:
+            pass
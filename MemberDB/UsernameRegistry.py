@@ -0,0 +1,145 @@
+import Member
+import SqlConnection
+import unicodedata
+import string
+
+# Words in Dutch names that are not part of the family name proper.
+NAME_PARTICLES = ["van", "de", "den", "der", "het", "ter", "ten", "te", "la", "le", "du", "da", "di", "del", "op", "in", "t", "s"]
+
+class UsernameRegistry:
+    '''
+    Class to check and suggest usernames against all usernames that have ever
+    been assigned, held in memory.
+    '''
+    
+    def __init__(self, database):
+        '''
+        (UsernameRegistry, SqlConnection) -> None
+        
+        Loads all usernames from the usernames table with one query. Afterwards,
+        availability is checked in memory only. The final check against the
+        database happens when the username is registered (see Member.make_user and
+        MemberDatabase.make_users).
+        '''
+        self._database = database
+        self._taken = set()
+        for lidnummer, username in database.dosql("SELECT lidnummer, username FROM usernames", "", True):
+            self._taken.add(username)
+    
+    def __len__(self):
+        '''
+        (UsernameRegistry) -> int
+        
+        Returns the number of usernames that are taken or reserved.
+        '''
+        return len(self._taken)
+    
+    def is_available(self, username):
+        '''
+        (UsernameRegistry, str) -> bool
+        
+        Returns True iff username is a valid username that has never been used and
+        has not been reserved.
+        '''
+        return bool(Member.is_valid_username(username)) and username not in self._taken
+    
+    def reserve(self, username):
+        '''
+        (UsernameRegistry, str) -> None
+        
+        Marks username as taken, so that it is not suggested again. Use this when
+        assigning usernames to many members at once.
+        '''
+        self._taken.add(username)
+    
+    def suggest(self, fullName, number = 5):
+        '''
+        (UsernameRegistry, str, int) -> list
+        
+        Returns at most number available usernames for a member with full name
+        fullName, best first. Returns an empty list if the name contains no letters.
+        '''
+        suggestions = []
+        for candidate in candidates(fullName):
+            if self.is_available(candidate):
+                suggestions.append(candidate)
+                if len(suggestions) == number:
+                    break
+        return suggestions
+    
+    def assign(self, fullName):
+        '''
+        (UsernameRegistry, str) -> str (or None)
+        
+        Returns the best available username for a member with full name fullName
+        and reserves it, or returns None if there is none.
+        '''
+        suggestions = self.suggest(fullName, 1)
+        if not suggestions:
+            return None
+        self.reserve(suggestions[0])
+        return suggestions[0]
+
+### END OF CLASS
+
+def name_parts(fullName):
+    '''
+    (str) -> list
+    
+    Splits fullName into lowercase words without diacritics, consisting of the
+    letters a-z only.
+    '''
+    if isinstance(fullName, str):
+        fullName = fullName.decode("utf-8", "replace")
+    decomposed = unicodedata.normalize("NFKD", fullName)
+    parts = []
+    for word in decomposed.replace("-", " ").split():
+        word = "".join([c for c in word.lower() if c in string.ascii_lowercase])
+        if word:
+            parts.append(str(word))
+    return parts
+
+def candidates(fullName):
+    '''
+    (str) -> generator
+    
+    Yields valid usernames for a member with full name fullName, from most to least
+    preferred, without duplicates. The first name and family name are combined in
+    the usual ways first; after that, letters are appended to the most preferred
+    combination, so the supply of candidates never runs out.
+    '''
+    parts = name_parts(fullName)
+    if not parts:
+        return
+    first = parts[0]
+    rest = parts[1:]
+    family = [part for part in rest if part not in NAME_PARTICLES] or rest
+    last = "".join(family)
+    withParticles = "".join(rest)
+    ranked = [first]
+    if rest:
+        ranked += [first + last, first + withParticles, first[0] + withParticles, first[0] + last, last, withParticles, first + last[:1]]
+    seen = set()
+    for candidate in ranked:
+        if candidate and candidate not in seen and Member.is_valid_username(candidate):
+            seen.add(candidate)
+            yield candidate
+    base = ranked[1] if rest else first
+    length = 1
+    while True:
+        for suffix in letter_sequences(length):
+            yield base + suffix
+        length += 1
+
+def letter_sequences(length):
+    '''
+    (int) -> generator
+    
+    Yields all strings of length letters a-z, in alphabetical order.
+    '''
+    if length == 0:
+        yield ""
+        return
+    for prefix in letter_sequences(length - 1):
+        for letter in string.ascii_lowercase:
+            yield prefix + letter
@@ -7,17 +7,23 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
 
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
     # Parse arguments
     usage = "./admin_create_oob_member.py <memberID> <full name> <email> <department> <username>"
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) != 5:
         parser.error("I require five arguments")
     memberId = str(args[0])
@@ -37,7 +43,7 @@ if __name__ == "__main__":
         parser.error("Not a valid department. Aborting...")
     if not Member.is_valid_username(username):
         parser.error("Not a valid username. Aborting...")
-    newMember = Member.Member(l,s,int(memberId))
+    newMember = mdb.get_member(int(memberId))
     if newMember.exists():
         helper.logger.error("Member %s already exists. Aborting..." % memberId)
         sys.exit()
@@ -45,6 +51,9 @@ if __name__ == "__main__":
     # Create out-of-band member
     newMember.create(fullName, email, department)
     newMember.make_user(username, 3)
-    group = Group.Group(l,s,"type-outofband")
+    group = mdb.get_group("type-outofband")
     group.add(newMember)
     helper.logger.info("Created out-of-band member %s (%s)." % (fullName, memberId))
+
+if __name__ == "__main__":
+    iamd.run_script("admin_create_oob_member", main)
@@ -7,17 +7,23 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
 
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
     # Parse arguments
     usage = "./admin_delete_oob_member.py <memberID>"
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) != 1:
         parser.error("I require one argument")
     memberId = str(args[0])
@@ -25,8 +31,8 @@ if __name__ == "__main__":
     # Check validity of arguments
     if not Member.is_valid_lidnummer(memberId):
         parser.error("Not a valid member ID. Aborting...")
-    member = Member.Member(l,s,int(memberId))
-    group = Group.Group(l,s,"type-outofband")
+    member = mdb.get_member(int(memberId))
+    group = mdb.get_group("type-outofband")
     if not member.exists():
         helper.logger.error("Member %s does not exist. Aborting..." % memberId)
         sys.exit()
@@ -36,8 +42,13 @@ if __name__ == "__main__":
 
     # Delete out-of-band member
     fullName = member.get_full_name()
+    batch = l.batch()
     for group in mdb.all_groups():
         if member in group:
-            group.remove(member)
+            group.remove(member, batch)
+    batch.collect(True)
     member.delete()
     helper.logger.info("Deleted out-of-band member %s (%s)." % (fullName, memberId))
+
+if __name__ == "__main__":
+    iamd.run_script("admin_delete_oob_member", main)
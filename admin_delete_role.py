@@ -7,17 +7,23 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
 
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
     # Parse arguments
     usage = "./admin_delete_role.py <role>"
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) != 1:
         parser.error("I require one argument")
     roleName = str(args[0])
@@ -25,7 +31,7 @@ if __name__ == "__main__":
     # Check validity of arguments
     if not Role.is_valid_role_name(roleName):
         parser.error("Not a valid role name. Aborting...")
-    role = Role.Role(l,s,roleName)
+    role = mdb.get_role(roleName)
     if not role.exists():
         helper.logger.error("Role %s does not exist. Aborting..." % roleName)
         sys.exit()
@@ -33,3 +39,6 @@ if __name__ == "__main__":
     # Delete role
     role.delete()
     helper.logger.info("Deleted role %s." % roleName)
+
+if __name__ == "__main__":
+    iamd.run_script("admin_delete_role", main)
@@ -0,0 +1,363 @@
+#!/usr/bin/python
+
+import sys
+sys.path.append("MemberDB")
+import MemberDatabase
+import LdapConnection
+import FakeLdapConnection
+import FakeSqlConnection
+import helper
+import generate_overview
+import list_users
+import make_user
+import remove_user
+import remove_users_from_csv
+import search_users
+from optparse import OptionParser
+import ldap
+import logging
+import marshal
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+FIRST_NAMES = ["Jan", "Piet", "Klaas", "Anna", "Els", "Kees", "Marie", "Tom", "Lisa", "Bram", "Sophie", "Daan", "Emma", "Lucas", "Julia", "Sem"]
+LAST_NAMES = ["de Vries", "Jansen", "Bakker", "Smit", "Visser", "Mulder", "Bos", "Dekker", "Meijer", "de Boer", "van Dijk", "Brouwer", "de Graaf", "Hendriks"]
+AFDELINGEN = ["Amsterdam", "Utrecht", "Rotterdam", "Groningen", "Leiden", "Nijmegen"]
+FIRST_LIDNUMMER = 10000
+TIMESTAMP = "20240101000000Z"
+
+# Number of users taken away by the remove_users_from_csv scenario: more than
+# MemberDatabase.MEMBERS_PER_SEARCH, so that their roles take several searches.
+BULK_REMOVALS = 250
+
+# The scenarios, as (name, tool module, function that returns the command-line
+# arguments for the generated directory given the options, and function that
+# checks the directory afterwards given the options, or None).
+SCENARIOS = [
+    ("list_users", list_users, lambda options: [], None),
+    ("search_users -n (no index)", search_users, lambda options: ["--no-index", "-n", "jansen"], None),
+    ("search_users -n (cold index)", search_users, lambda options: ["-n", "jansen"], None),
+    ("search_users -n (warm index)", search_users, lambda options: ["-n", "jansen"], None),
+    ("search_users -i", search_users, lambda options: ["-i", str(FIRST_LIDNUMMER + 1)], None),
+    ("generate_overview", generate_overview, lambda options: [], None),
+    ("make_user", make_user, lambda options: [str(FIRST_LIDNUMMER + options.users), "-", "2"], None),
+    ("remove_user", remove_user, lambda options: [str(FIRST_LIDNUMMER), username(0)], None),
+    ("remove_users_from_csv", remove_users_from_csv, lambda options: [options.removalsFile], lambda directory, options: check_removed(directory, bulk_removals(options))),
+]
+
+class NullOutput:
+    '''
+    Class to discard everything written to it, like /dev/null, while counting
+    the number of characters.
+    '''
+    
+    def __init__(self):
+        '''
+        (NullOutput) -> None
+        
+        Initializes the NullOutput with a count of zero.
+        '''
+        self.characters = 0
+    
+    def write(self, text):
+        '''
+        (NullOutput, str) -> None
+        
+        Discards text.
+        '''
+        self.characters += len(text)
+    
+    def flush(self):
+        '''
+        (NullOutput) -> None
+        
+        Does nothing.
+        '''
+        pass
+
+def username(index):
+    '''
+    (int) -> str
+    
+    Returns the generated username of the index-th user, which consists of
+    lowercase letters only.
+    '''
+    letters = ""
+    while True:
+        letters = chr(ord('a') + index % 26) + letters
+        index = index / 26
+        if index == 0:
+            return "user" + letters
+
+def role_name(index):
+    '''
+    (int) -> str
+    
+    Returns the generated name of the index-th role.
+    '''
+    return LdapConnection.LdapConnection.ROLE_PREFIX + username(index)[4:]
+
+def bulk_removals(options):
+    '''
+    (Values) -> int
+    
+    Returns the number of users that the remove_users_from_csv scenario takes away.
+    '''
+    return min(BULK_REMOVALS, options.users)
+
+def write_removals(path, numberOfRemovals):
+    '''
+    (str, int) -> None
+    
+    Writes a CSV file for remove_users_from_csv.py to path, which takes away the
+    first numberOfRemovals users of the generated directory.
+    '''
+    removalsFile = open(path, 'wb')
+    try:
+        removalsFile.write("lidnummer,username\n")
+        for i in range(numberOfRemovals):
+            removalsFile.write("%i,%s\n" % (FIRST_LIDNUMMER + i, username(i)))
+    finally:
+        removalsFile.close()
+
+def check_removed(directory, numberOfRemovals):
+    '''
+    (LdapConnection, int) -> str (or None)
+    
+    Checks that the first numberOfRemovals users of the generated directory no
+    longer have a username or a role. Returns a description of what is wrong, or
+    None if nothing is.
+    '''
+    removedDNs = set()
+    for i in range(numberOfRemovals):
+        removedDNs.add(("cn=%i,%s%s" % (FIRST_LIDNUMMER + i, directory.MEMBERS_BASEDN, directory.SUFFIX)).lower())
+    users = 0
+    for DN, attributes in directory.search("(uid=*)", directory.MEMBERS_BASEDN + directory.SUFFIX, ldap.SCOPE_ONELEVEL, ['cn']):
+        if DN.lower() in removedDNs:
+            users += 1
+    memberships = 0
+    for DN, attributes in directory.search("(cn=%s*)" % directory.ROLE_PREFIX, directory.GROUPS_BASEDN + directory.SUFFIX, ldap.SCOPE_SUBTREE, ['member']):
+        for memberDN in attributes.get('member', []):
+            if memberDN.lower() in removedDNs:
+                memberships += 1
+    if users or memberships:
+        return "%i removed users still have a username, %i role memberships remain" % (users, memberships)
+    return None
+
+def generate_directory(numberOfMembers, numberOfUsers, numberOfRoles, roleSize, seed = 0):
+    '''
+    (int, int, int, int, int) -> (dict, list)
+    
+    Generates a directory of numberOfMembers members, of which the first
+    numberOfUsers are users, and numberOfRoles roles of roleSize users each, plus
+    an out-of-band group. Returns the directory as a dict that maps each DN to its
+    attributes, and the rows (lidnummer, username) of the usernames table.
+    '''
+    connection = LdapConnection.LdapConnection
+    membersBaseDN = connection.MEMBERS_BASEDN + connection.SUFFIX
+    groupsBaseDN = connection.GROUPS_BASEDN + connection.SUFFIX
+    generator = random.Random(seed)
+    entries = {}
+    usernames = []
+    for i in range(numberOfMembers):
+        lidnummer = FIRST_LIDNUMMER + i
+        firstName = generator.choice(FIRST_NAMES)
+        lastName = generator.choice(LAST_NAMES)
+        attributes = {
+            'objectClass': ['inetOrgPerson'],
+            'cn': [str(lidnummer)],
+            'sn': ["%s %s" % (firstName, lastName)],
+            'mail': ["%s.%s.%i@example.nl" % (firstName.lower(), lastName.replace(" ", "").lower(), lidnummer)],
+            'ou': [generator.choice(AFDELINGEN)],
+            'modifyTimestamp': [TIMESTAMP],
+        }
+        if i < numberOfUsers:
+            attributes['uid'] = [username(i)]
+            usernames.append((lidnummer, username(i)))
+        entries["cn=%i,%s" % (lidnummer, membersBaseDN)] = attributes
+    entries[connection.STRUCTURAL_USER] = {'objectClass': ['account'], 'cn': ['structuraluser']}
+    groups = [(role_name(i), generator.sample(range(numberOfUsers), min(roleSize, numberOfUsers))) for i in range(numberOfRoles)]
+    outOfBand = range(numberOfUsers, min(numberOfMembers, numberOfUsers + 10))
+    groups.append(("type-outofband", outOfBand))
+    for groupName, indices in groups:
+        entries["cn=%s,%s" % (groupName, groupsBaseDN)] = {
+            'objectClass': ['groupOfNames', 'posixGroup'],
+            'cn': [groupName],
+            'gidNumber': ['500'],
+            'member': [connection.STRUCTURAL_USER] + ["cn=%i,%s" % (FIRST_LIDNUMMER + i, membersBaseDN) for i in indices],
+            'memberUid': [username(i) for i in indices if i < numberOfUsers],
+            'modifyTimestamp': [TIMESTAMP],
+        }
+    return entries, usernames
+
+def current_memory():
+    '''
+    () -> int (or None)
+    
+    Returns the resident memory of this process in bytes, or None if it can not
+    be determined.
+    '''
+    try:
+        statm = open("/proc/self/statm")
+    except IOError:
+        return None
+    try:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+    finally:
+        statm.close()
+
+def run_scenario(scenario, directory, database, options):
+    '''
+    (tuple, FakeLdapConnection, FakeSqlConnection, Values) -> dict
+    
+    Runs the tool of scenario on a MemberDatabase with the fake connectors, and
+    returns its measurements: the LDAP operations and SQL queries per type, the
+    number of round trips, the wall time in seconds, the peak memory increase in
+    bytes and the error that stopped the tool (or that the check of the scenario
+    found afterwards), if any.
+    '''
+    name, tool, arguments, check = scenario
+    mdb = MemberDatabase.MemberDatabase.from_connectors(directory, database, helper.logger)
+    directory.reset_counts()
+    database.reset_counts()
+    startMemory = current_memory()
+    error = None
+    standardOutput = sys.stdout
+    sys.stdout = NullOutput()
+    start = time.time()
+    try:
+        tool.main(mdb, arguments(options))
+    except SystemExit, e:
+        if e.code not in [None, 0]:
+            error = "exited with status %s" % e.code
+    except Exception, e:
+        error = "%s: %s" % (e.__class__.__name__, e)
+    finally:
+        wallTime = time.time() - start
+        sys.stdout = standardOutput
+    peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if startMemory is not None:
+        peakMemory = max(0, peakMemory - startMemory)
+    operations = dict(directory.operations)
+    operations['sql'] = database.operations.get('sql', 0)
+    roundTrips = directory.roundTrips + database.roundTrips
+    if error is None and check is not None:
+        error = check(directory, options)
+    return {
+        'operations': operations,
+        'roundTrips': roundTrips,
+        'wallTime': wallTime,
+        'peakMemory': peakMemory,
+        'error': error,
+    }
+
+def run_forked(scenario, directory, database, options):
+    '''
+    (tuple, FakeLdapConnection, FakeSqlConnection, Values) -> dict
+    
+    Runs run_scenario in a child process, so that every scenario starts from the
+    same generated directory and its peak memory is measured on its own.
+    '''
+    readEnd, writeEnd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(readEnd)
+        try:
+            try:
+                result = run_scenario(scenario, directory, database, options)
+            except Exception, e:
+                result = {'error': "%s: %s" % (e.__class__.__name__, e)}
+            os.write(writeEnd, marshal.dumps(result))
+        finally:
+            os._exit(0)
+    os.close(writeEnd)
+    data = ""
+    while True:
+        chunk = os.read(readEnd, 65536)
+        if not chunk:
+            break
+        data += chunk
+    os.close(readEnd)
+    os.waitpid(pid, 0)
+    if not data:
+        return {'error': "benchmark process died"}
+    return marshal.loads(data)
+
+def format_result(name, result):
+    '''
+    (str, dict) -> str
+    
+    Formats the measurements of one scenario as a line of the report.
+    '''
+    if 'operations' not in result:
+        return "%-30s %s" % (name, result['error'])
+    operations = result['operations']
+    otherOperations = sum([count for operation, count in operations.items() if operation not in ['search', 'modify', 'sql']])
+    line = "%-30s %8i %8i %8i %8i %8i %10.1f %10.1f" % (name, operations.get('search', 0), operations.get('modify', 0), otherOperations, operations['sql'], result['roundTrips'], result['wallTime'] * 1000, result['peakMemory'] / 1048576.0)
+    if result['error'] is not None:
+        line += "  (%s)" % result['error']
+    return line
+
+def main(argv):
+    '''
+    (list) -> None
+    
+    Runs the benchmark with the command-line arguments in argv (without the
+    program name).
+    '''
+    usage = """./benchmark.py [options] [scenario ...]
+    
+    Runs the tools on a generated directory held in memory, with fake LDAP and
+    SQL connections that add a fixed latency per round trip, and reports for
+    each scenario the LDAP operations, SQL queries, round trips, wall time and
+    peak memory increase. No server is contacted and no mail is sent. Without
+    scenario names, all scenarios are run."""
+    parser = OptionParser(usage)
+    parser.add_option(
+        "--members", type="int", dest="members", default=5000, help="number of members (default 5000)")
+    parser.add_option(
+        "--users", type="int", dest="users", default=2000, help="number of users among the members (default 2000)")
+    parser.add_option(
+        "--roles", type="int", dest="roles", default=20, help="number of roles (default 20)")
+    parser.add_option(
+        "--role-size", type="int", dest="roleSize", default=50, help="number of users per role (default 50)")
+    parser.add_option(
+        "--latency", type="float", dest="latency", default=1.0, help="latency per round trip in milliseconds (default 1)")
+    parser.add_option(
+        "--seed", type="int", dest="seed", default=0, help="seed for generating the directory (default 0)")
+    (options, args) = parser.parse_args(argv)
+    if options.users > options.members:
+        parser.error("There can not be more users than members.")
+    scenarios = SCENARIOS
+    if args:
+        scenarios = [scenario for scenario in SCENARIOS if scenario[0].split()[0] in args or scenario[0] in args]
+        if not scenarios:
+            parser.error("Unknown scenario. Choose from: %s" % ", ".join(sorted(set([scenario[0].split()[0] for scenario in SCENARIOS]))))
+    
+    # The tools log what they do; only warnings and errors are of interest here.
+    helper.logger.setLevel(logging.WARNING)
+    make_user.send_confirmation_email = lambda *arguments: True
+    temporaryDirectory = tempfile.mkdtemp()
+    search_users.INDEX_FILE = os.path.join(temporaryDirectory, "search.idx")
+    options.removalsFile = os.path.join(temporaryDirectory, "removals.csv")
+    write_removals(options.removalsFile, bulk_removals(options))
+    
+    entries, usernames = generate_directory(options.members, options.users, options.roles, options.roleSize, options.seed)
+    directory = FakeLdapConnection.FakeLdapConnection(entries, helper.logger, options.latency / 1000.0)
+    database = FakeSqlConnection.FakeSqlConnection(usernames, helper.logger, options.latency / 1000.0)
+    print "%i members, %i users, %i roles of %i users, %.1f ms latency per round trip" % (options.members, options.users, options.roles, options.roleSize, options.latency)
+    print ""
+    print "%-30s %8s %8s %8s %8s %8s %10s %10s" % ("scenario", "search", "modify", "other", "sql", "trips", "wall ms", "memory MB")
+    try:
+        for scenario in scenarios:
+            print format_result(scenario[0], run_forked(scenario, directory, database, options))
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(temporaryDirectory)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
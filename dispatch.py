@@ -0,0 +1,95 @@
+import sys
+sys.path.append("MemberDB")
+import StringIO
+import helper
+import iamd
+
+import admin_create_oob_member
+import admin_create_role
+import admin_delete_oob_member
+import admin_delete_role
+import generate_overview
+import give_role
+import list_roles
+import list_users
+import make_user
+import make_user_by_name
+import query_members
+import remove_role
+import remove_user
+import reset_password
+import search_users
+import sync_replica
+
+# The tools that can be run in-process, by name. Each module has a function
+# main(mdb, argv) that does what running the script would do.
+TOOLS = {
+    "admin_create_oob_member": admin_create_oob_member,
+    "admin_create_role": admin_create_role,
+    "admin_delete_oob_member": admin_delete_oob_member,
+    "admin_delete_role": admin_delete_role,
+    "generate_overview": generate_overview,
+    "give_role": give_role,
+    "list_roles": list_roles,
+    "list_users": list_users,
+    "make_user": make_user,
+    "make_user_by_name": make_user_by_name,
+    "query_members": query_members,
+    "remove_role": remove_role,
+    "remove_user": remove_user,
+    "reset_password": reset_password,
+    "search_users": search_users,
+    "sync_replica": sync_replica,
+}
+
+def run(mdb, toolName, argv, output = None):
+    '''
+    (MemberDatabase, str, list, file) -> (int, str)
+    
+    Runs the tool toolName in this process on the (already connected) mdb, with
+    command-line arguments argv. Returns the exit status of the tool and everything
+    it printed to standard output. If output is given, the tool prints to output
+    instead, as it goes, and the returned output is empty. A tool that stops with
+    sys.exit does not end the calling process; an unexpected exception is logged
+    and gives status 1.
+    
+    Caches in mdb are cleared first, so that every run sees the current state of
+    the MemberDatabase.
+    '''
+    mdb.clear_caches()
+    captured = output is None
+    if captured:
+        output = StringIO.StringIO()
+    savedStdout = sys.stdout
+    savedArgv = sys.argv
+    sys.stdout = output
+    # Usage and error messages of the tool should mention the tool, not the caller.
+    sys.argv = [toolName + ".py"] + list(argv)
+    status = 0
+    try:
+        iamd.run_main(TOOLS[toolName].main, mdb, argv)
+    except SystemExit, e:
+        status = exit_status(e.code)
+    except Exception:
+        helper.logger.exception("Error while running %s." % toolName)
+        status = 1
+    finally:
+        sys.stdout = savedStdout
+        sys.argv = savedArgv
+    if not captured:
+        return status, ""
+    return status, output.getvalue()
+
+def exit_status(code):
+    '''
+    (object) -> int
+    
+    Converts the argument of sys.exit to the exit status the process would have
+    had, like the Python interpreter does.
+    '''
+    if code is None:
+        return 0
+    elif isinstance(code, int):
+        return code
+    else:
+        return 1
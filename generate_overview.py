@@ -7,15 +7,19 @@ import Role
 import Group
 import Member
 import helper
-
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+import iamd
+import DirectoryReplica
+import listing
+from optparse import OptionParser
 
 SMALL_TAB = 3
 LARGE_TAB = 40
 
 monitoredRoleNames = ["ALL"]
 
+# Fields of the overview records; see overview_records.
+OVERVIEW_FIELDS = ["type", "name", "role", "lidnummer", "count"]
+
 def fill_with_spaces(inputString, resultingLength, frontSpaces = 0):
     '''
     (str, int) -> str
@@ -25,45 +29,116 @@ def fill_with_spaces(inputString, resultingLength, frontSpaces = 0):
     inputString = (" " * frontSpaces) + inputString
     spaces = " " * (resultingLength - len(inputString))
     return inputString + spaces
+
+def monitored_role_names(snapshot):
+    '''
+    (DirectorySnapshot) -> list
     
-if __name__ == "__main__":
+    Returns the names of the monitored roles: monitoredRoleNames, or all roles in
+    snapshot if it is ["ALL"].
+    '''
+    if monitoredRoleNames[0] == "ALL":
+        return snapshot.role_names()
+    return monitoredRoleNames
+
+def overview_records(snapshot):
+    '''
+    (DirectorySnapshot) -> generator
+    
+    Yields the overview of snapshot as records with OVERVIEW_FIELDS, one at a time:
+    the totals, the out-of-band members, the number of users per role and the
+    members of every monitored role. A monitored role that does not exist is
+    logged instead.
+    '''
+    outOfBandMembers = snapshot.out_of_band_members()
+    yield {"type": "total", "name": "members", "count": snapshot.number_of_members()}
+    yield {"type": "total", "name": "out-of-band", "count": len(outOfBandMembers)}
+    yield {"type": "total", "name": "users", "count": snapshot.number_of_users()}
+    for member in outOfBandMembers:
+        yield {"type": "out-of-band member", "name": member.get_full_name(), "lidnummer": member.get_lidnummer()}
+    for roleName in snapshot.role_names():
+        yield {"type": "role", "role": roleName, "count": snapshot.number_of_group_members(roleName)}
+    for roleName in monitored_role_names(snapshot):
+        if not snapshot.has_group(roleName):
+            helper.logger.warning("Monitored role %s does not exist." % roleName)
+            continue
+        for user in snapshot.group_members(roleName):
+            yield {"type": "role member", "role": roleName, "name": user.get_full_name(), "lidnummer": user.get_lidnummer()}
+
+def print_overview(snapshot):
+    '''
+    (DirectorySnapshot) -> None
+    
+    Prints the overview of snapshot as text.
+    '''
     print "*****************************************************************"
     print "*                                                               *"
     print "*             Identity & Access Management Overview             *"
     print "*                                                               *"
     print "*****************************************************************"
     print ""
-    print fill_with_spaces("Number of members:", LARGE_TAB) + str(mdb.number_of_members())
-    print fill_with_spaces("Of which out-of-band:", LARGE_TAB, SMALL_TAB) + str(len(mdb.out_of_band_members()))
-    print fill_with_spaces("Number of users:", LARGE_TAB) + str(mdb.number_of_users())
+    outOfBandMembers = snapshot.out_of_band_members()
+    print fill_with_spaces("Number of members:", LARGE_TAB) + str(snapshot.number_of_members())
+    print fill_with_spaces("Of which out-of-band:", LARGE_TAB, SMALL_TAB) + str(len(outOfBandMembers))
+    print fill_with_spaces("Number of users:", LARGE_TAB) + str(snapshot.number_of_users())
     print ""
     print "Out-of-band members:"
-    for member in mdb.out_of_band_members():
+    for member in outOfBandMembers:
         fullName = member.get_full_name()
         print fill_with_spaces(fullName, 0, LARGE_TAB)
     
     print ""
     print "Number of users per role"
-    roleList = mdb.all_roles()
-    for role in roleList:
-        rolestring = fill_with_spaces(role.get_name()+":", LARGE_TAB, SMALL_TAB)
-        print(rolestring + str(len(role.members())))
+    roleNameList = snapshot.role_names()
+    for roleName in roleNameList:
+        rolestring = fill_with_spaces(roleName+":", LARGE_TAB, SMALL_TAB)
+        print(rolestring + str(snapshot.number_of_group_members(roleName)))
 
     print ""
     print "Monitored roles"
-    monitoredRoles = []
-    if monitoredRoleNames[0] == "ALL":
-        monitoredRoles = roleList
-    else:
-        for roleName in monitoredRoleNames:
-            role = Role.Role(l, s, roleName)
-            monitoredRoles.append(role)    
-    
-    for role in monitoredRoles:
-        if not role.exists():
-            print "WARNING: Monitored role %s does not exist." % str(role)
+    for roleName in monitored_role_names(snapshot):
+        if not snapshot.has_group(roleName):
+            print "WARNING: Monitored role %s does not exist." % roleName
         else:
-            print fill_with_spaces(role.get_name()+":", 0, SMALL_TAB)
-            roleUsers = role.members()
+            print fill_with_spaces(roleName+":", 0, SMALL_TAB)
+            roleUsers = snapshot.group_members(roleName)
             for user in roleUsers:
                 print fill_with_spaces(user.get_full_name(), 0, LARGE_TAB)
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = "./generate_overview.py [--local] [--format text|json|jsonl|csv]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "--local", action="store_true", dest="local", default=False, help="read from the local replica instead of the directory")
+    listing.add_format_option(parser)
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 0:
+        parser.error("I require no arguments")
+    if options.local:
+        try:
+            mdb = mdb.local_replica(helper.REPLICA_FILE)
+        except DirectoryReplica.ReplicaError, e:
+            parser.error(str(e))
+        l,s = mdb.get_connectors()
+
+    try:
+        snapshot = mdb.snapshot()
+        if options.format == "text":
+            print_overview(snapshot)
+        else:
+            listing.write_records(overview_records(snapshot), options.format, OVERVIEW_FIELDS)
+    finally:
+        if options.local:
+            l.close()
+
+if __name__ == "__main__":
+    iamd.run_script("generate_overview", main)
@@ -7,13 +7,19 @@ import os
 # the script-directory, not the current directory.
 SCRIPTDIR = os.path.dirname(os.path.realpath(__file__))
 
+# Local mirror of the directory, used by read-only tools with --local.
+REPLICA_FILE = os.path.join(SCRIPTDIR, "replica.sqlite")
+
+CONFIG_FILE = os.path.join(SCRIPTDIR, "ledenlijst.cfg")
+
+# The log files are only opened when the first message is written to them.
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 ch = logging.StreamHandler()
 ch.setLevel(logging.INFO)
-fhd = logging.FileHandler(os.path.join(SCRIPTDIR, "debug.log"))
+fhd = logging.FileHandler(os.path.join(SCRIPTDIR, "debug.log"), delay=True)
 fhd.setLevel(logging.DEBUG)
-fhi = logging.FileHandler(os.path.join(SCRIPTDIR, "info.log"))
+fhi = logging.FileHandler(os.path.join(SCRIPTDIR, "info.log"), delay=True)
 fhi.setLevel(logging.INFO)
 formatter = logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
 ch.setFormatter(formatter)
@@ -23,8 +29,69 @@ logger.addHandler(ch)
 logger.addHandler(fhd)
 logger.addHandler(fhi)
 
-config = ConfigParser.RawConfigParser()
-config.read(os.path.join(SCRIPTDIR, "ledenlijst.cfg"))
-dbcfg = dict(config.items("database"))
-ldapcfg = dict(config.items("ldapcfg"))
-mailcfg = dict(config.items("mail"))
+# Read from CONFIG_FILE on first use; see config.
+_config = None
+# The MemberDatabase of this process; see member_database.
+_memberDatabase = None
+
+def config():
+    '''
+    () -> RawConfigParser
+
+    Returns the configuration in ledenlijst.cfg, which is read on first use.
+    '''
+    global _config
+    if _config is None:
+        parser = ConfigParser.RawConfigParser()
+        parser.read(CONFIG_FILE)
+        _config = parser
+    return _config
+
+def ldap_config():
+    '''
+    () -> dict
+
+    Returns the [ldapcfg] section of the configuration.
+    '''
+    return dict(config().items("ldapcfg"))
+
+def database_config():
+    '''
+    () -> dict
+
+    Returns the [database] section of the configuration.
+    '''
+    return dict(config().items("database"))
+
+def mail_config():
+    '''
+    () -> dict
+
+    Returns the [mail] section of the configuration.
+    '''
+    return dict(config().items("mail"))
+
+def daemon_config():
+    '''
+    () -> dict
+
+    Returns the optional [daemon] section of the configuration, or an empty dict
+    if there is none.
+    '''
+    if not config().has_section("daemon"):
+        return {}
+    return dict(config().items("daemon"))
+
+def member_database():
+    '''
+    () -> MemberDatabase
+
+    Returns the MemberDatabase of this process, configured by ledenlijst.cfg. It
+    is made on first use and shared by everything that runs in the process; it
+    connects to the directory and the SQL database only when they are first used.
+    '''
+    global _memberDatabase
+    if _memberDatabase is None:
+        import MemberDatabase
+        _memberDatabase = MemberDatabase.MemberDatabase(ldap_config(), database_config(), logger)
+    return _memberDatabase
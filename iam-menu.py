@@ -1,19 +1,19 @@
 #!/usr/bin/python
 import sys
-import subprocess
+sys.path.append("MemberDB")
+import MemberDatabase
+import helper
+import dispatch
+import iamd
 
-# Copied this from the internet, as Python 2.6 does not yet support check_output in module subprocess
-def check_output(*popenargs, **kwargs):
-    process = subprocess.Popen(stdout=subprocess.PIPE, *popenargs, **kwargs)
-    output, unused_err = process.communicate()
-    retcode = process.poll()
-    if retcode:
-        cmd = kwargs.get("args")
-        if cmd is None:
-            cmd = popenargs[0]
-        error = subprocess.CalledProcessError(retcode, cmd)
-        error.output = output
-        #raise error
+# The MemberDatabase that is used for the whole session. It is connected once,
+# when the menu starts.
+mdb = None
+
+# Runs a tool in this process, on the session's MemberDatabase, and returns
+# everything it printed. Replaces spawning a Python process per action.
+def run_tool(toolName, argv):
+    status, output = dispatch.run(mdb, toolName, argv)
     return output
 
 # The initial filler function. Returns the main menu and the tool header.
@@ -67,7 +67,7 @@ def process_input_searchmembers(user_input):
         search_option = "-u"
     else:
         return output, menu, state
-    output = check_output(["python", "search_users.py", "-a", search_option, input_parts[1]])
+    output = run_tool("search_users", ["-a", search_option, input_parts[1]])
     return output, menu, state
 
 # The processing function for state searchusers
@@ -87,7 +87,7 @@ def process_input_searchusers(user_input):
         search_option = "-u"
     else:
         return output, menu, state
-    output = check_output(["python", "search_users.py", search_option, input_parts[1]])
+    output = run_tool("search_users", [search_option, input_parts[1]])
     return output, menu, state
 
 # The processing function for state makeuser
@@ -97,7 +97,7 @@ def process_input_makeuser(user_input):
     input_parts = user_input.split(' ', 2)
     if len(input_parts) < 3:
         return output, menu, state
-    output = check_output(["python", "make_user.py", input_parts[0], input_parts[1], input_parts[2]])
+    output = run_tool("make_user", [input_parts[0], input_parts[1], input_parts[2]])
     return output, menu, state
 
 # The processing function for state makeuserbyname
@@ -107,7 +107,7 @@ def process_input_makeuserbyname(user_input):
     input_parts = user_input.rsplit(' ', 2)
     if len(input_parts) < 3:
         return output, menu, state
-    output = check_output(["python", "make_user_by_name.py", input_parts[0], input_parts[1], input_parts[2]])
+    output = run_tool("make_user_by_name", [input_parts[0], input_parts[1], input_parts[2]])
     return output, menu, state
 
 # The processing function for state resetpassword
@@ -117,7 +117,7 @@ def process_input_resetpassword(user_input):
     input_parts = user_input.split(' ', 1)
     if len(input_parts) < 2:
         return output, menu, state
-    output = check_output(["python", "reset_password.py", input_parts[0], input_parts[1]])
+    output = run_tool("reset_password", [input_parts[0], input_parts[1]])
     return output, menu, state
 
 # The processing function for state removeuser
@@ -127,7 +127,7 @@ def process_input_removeuser(user_input):
     if not ' ' in user_input:
         return output, menu, state
     input_parts = user_input.split(' ', 1)
-    output = check_output(["python", "remove_user.py", input_parts[0], input_parts[1]])
+    output = run_tool("remove_user", [input_parts[0], input_parts[1]])
     return output, menu, state
 
 # The processing function for state giverole
@@ -136,8 +136,7 @@ def process_input_giverole(user_input):
     dummy, menu, state = begin_it()
     if not ' ' in user_input:
         return output, menu, state
-    input_parts = user_input.split(' ', 1)
-    output = check_output(["python", "give_role.py", input_parts[0], input_parts[1]])
+    output = run_tool("give_role", user_input.split())
     return output, menu, state
 
 # The processing function for state removerole
@@ -146,8 +145,7 @@ def process_input_removerole(user_input):
     dummy, menu, state = begin_it()
     if not ' ' in user_input:
         return output, menu, state
-    input_parts = user_input.split(' ', 1)
-    output = check_output(["python", "remove_role.py", input_parts[0], input_parts[1]])
+    output = run_tool("remove_role", user_input.split())
     return output, menu, state
 
 # The processing function for state main
@@ -158,7 +156,7 @@ def process_input_main(user_input):
     state = ""
     if user_input == "1":
         dummy, menu, state = begin_it()
-        output = check_output(["python", "generate_overview.py"])
+        output = run_tool("generate_overview", [])
     elif user_input == "2":
         output = "== Search for members =="
         menu = """(1) Search for lidnummer
@@ -181,10 +179,11 @@ Enter the number of the option followed by your search entry, separated by a spa
         state = "searchusers"
     elif user_input == "4":
         dummy, menu, state = begin_it()
-        output = check_output(["python", "list_users.py"])
+        output = run_tool("list_users", [])
     elif user_input == "5":
         output = "== Make member a user =="
         menu = """Enter lidnummer, desired username and desired password type, separated by spaces (e.g. '12345 myuser 3').
+Enter - as username to choose one automatically (e.g. '12345 - 3').
 
 Password type is one of the following:
 
@@ -230,14 +229,14 @@ Password entropy is always at least 50 bits. Password length is adjusted accordi
         state = "resetpassword"
     elif user_input == "9":
         dummy, menu, state = begin_it()
-        output = check_output(["python", "list_roles.py"])
+        output = run_tool("list_roles", [])
     elif user_input == "0":
         output = "== Assign role to user =="
-        menu = "Enter role and username, separated by a space (e.g. 'role-lb myuser')."
+        menu = "Enter role and one or more usernames, separated by spaces (e.g. 'role-lb myuser otheruser')."
         state = "giverole"
     elif user_input == "-":
         output = "== Remove role from user =="
-        menu = "Enter role and username, separated by a space (e.g. 'role-lb myuser')."
+        menu = "Enter role and one or more usernames, separated by spaces (e.g. 'role-lb myuser otheruser')."
         state = "removerole"
     elif user_input == "=":
         state = "quit"
@@ -267,9 +266,16 @@ def process_input(user_input, state):
         return process_input_removerole(user_input)
     return "", "", "main"
 
-# The main loop
-if __name__ == "__main__":
+# The main loop, on the session's MemberDatabase. argv is not used, but with
+# --stats on the command line, the operations of the whole session are reported
+# when it ends (see iamd.run_main).
+def main(sessionDatabase, argv):
+    global mdb
+    mdb = sessionDatabase
     output, menu, state = begin_it()
     while state != "quit":
         user_input = run_menu(output, menu)
         output, menu, state = process_input(user_input, state)
+
+if __name__ == "__main__":
+    iamd.run_main(main, helper.member_database(), sys.argv[1:])
@@ -0,0 +1,280 @@
+#!/usr/bin/python
+
+import sys
+sys.path.append("MemberDB")
+import MemberDatabase
+import OperationStatistics
+import helper
+from optparse import OptionParser
+import SocketServer
+import StringIO
+import logging
+import socket
+import errno
+import json
+import os
+import signal
+
+# Where the daemon listens, unless configured otherwise in the [daemon] section
+# of ledenlijst.cfg.
+DEFAULT_SOCKET = os.path.join(helper.SCRIPTDIR, "iamd.sock")
+
+# Flag that every tool accepts: report the LDAP and SQL operations it did.
+STATS_FLAG = "--stats"
+
+# The standard output of a tool run by the daemon is sent to the client whenever
+# the tool flushes it, and at the latest when this many bytes have been written.
+CHUNK_SIZE = 65536
+
+def socket_path():
+    '''
+    () -> str
+    
+    Returns the path of the Unix domain socket on which the daemon listens.
+    '''
+    return helper.daemon_config().get('socket', DEFAULT_SOCKET)
+
+def forward(toolName, argv, output):
+    '''
+    (str, list, file) -> tuple (or None)
+    
+    Asks a running daemon to run the tool toolName with command-line arguments
+    argv. The standard output of the tool is written to output as the daemon sends
+    it, so it shows up while the tool is still running. Returns a tuple (status,
+    stderr) with the exit status and the error output of the tool, or None if no
+    daemon is running.
+    '''
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(socket_path())
+        except socket.error, v:
+            if v[0] in (errno.ENOENT, errno.ECONNREFUSED):
+                return None
+            raise
+        stream = connection.makefile("rwb")
+        try:
+            stream.write(json.dumps({"tool": toolName, "argv": argv}) + "\n")
+            stream.flush()
+            while True:
+                response = stream.readline()
+                if not response:
+                    return 1, "The daemon closed the connection without answering.\n"
+                reply = json.loads(response)
+                if "status" in reply:
+                    return reply["status"], reply["stderr"].encode("utf-8")
+                # Output chunks carry the bytes the tool wrote, one character each.
+                output.write(reply["stdout"].encode("latin-1"))
+                output.flush()
+        finally:
+            stream.close()
+    finally:
+        connection.close()
+
+def run_script(toolName, main):
+    '''
+    (str, function) -> None
+    
+    Runs a tool script: as a thin client of the daemon when it is running, and
+    otherwise by connecting to the MemberDatabase directly and calling main.
+    '''
+    result = forward(toolName, sys.argv[1:], sys.stdout)
+    if result is None:
+        run_main(main, helper.member_database(), sys.argv[1:])
+    else:
+        status, errors = result
+        sys.stderr.write(errors)
+        sys.exit(status)
+
+def run_main(main, mdb, argv):
+    '''
+    (function, MemberDatabase, list) -> None
+    
+    Calls the main function of a tool with mdb and the command-line arguments
+    argv. If argv contains --stats, the LDAP and SQL operations of the tool are
+    recorded, and a report of them (counts, total and p95 latency per operation,
+    the time spent per calling method and the slowest calls) is printed to
+    standard error when the tool ends, also if it ends with sys.exit.
+    '''
+    if STATS_FLAG not in argv:
+        main(mdb, argv)
+        return
+    argv = [arg for arg in argv if arg != STATS_FLAG]
+    statistics = OperationStatistics.STATISTICS
+    statistics.start()
+    try:
+        main(mdb, argv)
+    finally:
+        statistics.stop()
+        sys.stderr.write(statistics.report())
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    '''
+    Handles one request to the daemon: a JSON line with the tool to run and its
+    arguments. Streams the standard output of the tool back as JSON lines with
+    a "stdout" chunk each (see OutputChunks), and ends with a JSON line with the
+    exit status and standard error (including log messages) of the tool.
+    '''
+    
+    def handle(self):
+        '''
+        (RequestHandler) -> None
+        
+        Runs the requested tool on the MemberDatabase of the server.
+        '''
+        import dispatch
+        request = json.loads(self.rfile.readline())
+        toolName = str(request["tool"])
+        argv = [arg.encode("utf-8") for arg in request["argv"]]
+        if toolName not in dispatch.TOOLS:
+            self._reply(2, "Unknown tool %s.\n" % toolName)
+            return
+        helper.logger.debug("Running %s %s for a client." % (toolName, argv))
+        errors = StringIO.StringIO()
+        errorHandler = logging.StreamHandler(errors)
+        errorHandler.setLevel(helper.ch.level)
+        errorHandler.setFormatter(helper.formatter)
+        helper.logger.addHandler(errorHandler)
+        savedStderr = sys.stderr
+        sys.stderr = errors
+        output = OutputChunks(self.wfile)
+        try:
+            status = dispatch.run(self.server.mdb, toolName, argv, output)[0]
+        finally:
+            sys.stderr = savedStderr
+            helper.logger.removeHandler(errorHandler)
+        output.flush()
+        self._reply(status, errors.getvalue())
+    
+    def _reply(self, status, errors):
+        '''
+        (RequestHandler, int, str) -> None
+        
+        Sends the end of the result of a request back to the client.
+        '''
+        reply = {"status": status, "stderr": errors.decode("utf-8", "replace")}
+        self.wfile.write(json.dumps(reply) + "\n")
+
+
+class OutputChunks:
+    '''
+    File-like object that stands in for the standard output of a tool run by the
+    daemon, and sends what is written to it to the client as JSON lines
+    {"stdout": chunk}: whenever it is flushed, and whenever CHUNK_SIZE bytes have
+    been written. So the client sees the output of a streaming tool, such as
+    list_users, batch by batch instead of all at once at the end.
+    '''
+    
+    def __init__(self, stream):
+        '''
+        (OutputChunks, file) -> None
+        
+        Initializes the OutputChunks to send the chunks to stream.
+        '''
+        self._stream = stream
+        self._buffer = []
+        self._size = 0
+    
+    def write(self, text):
+        '''
+        (OutputChunks, str) -> None
+        
+        Adds text to the current chunk, and sends the chunk if it is full.
+        '''
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= CHUNK_SIZE:
+            self.flush()
+    
+    def flush(self):
+        '''
+        (OutputChunks) -> None
+        
+        Sends the current chunk, if it is not empty. A chunk may end in the middle
+        of a multi-byte character, so its bytes are sent as one character each
+        (latin-1), and the client turns them back into the same bytes.
+        '''
+        if self._size == 0:
+            return
+        chunk = "".join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        self._stream.write(json.dumps({"stdout": chunk.decode("latin-1")}) + "\n")
+        self._stream.flush()
+
+
+class Server(SocketServer.UnixStreamServer):
+    '''
+    Unix domain socket server that keeps one MemberDatabase connected and handles
+    the requests one at a time on it.
+    '''
+    
+    def __init__(self, path, mdb):
+        '''
+        (Server, str, MemberDatabase) -> None
+        
+        Binds the server to the socket at path. Only the owner of the daemon may use
+        the socket, as it gives full access to the MemberDatabase.
+        '''
+        self.mdb = mdb
+        oldUmask = os.umask(0177)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, RequestHandler)
+        finally:
+            os.umask(oldUmask)
+
+def remove_stale_socket(path):
+    '''
+    (str) -> None
+    
+    Removes the socket at path if no daemon is listening on it anymore. Exits if
+    another daemon is still running.
+    '''
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except socket.error:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    helper.logger.error("Another daemon is already listening on %s. Aborting..." % path)
+    sys.exit(1)
+
+def stop(signalNumber, frame):
+    '''
+    (int, frame) -> None
+    
+    Signal handler that stops the daemon cleanly.
+    '''
+    sys.exit(0)
+
+if __name__ == "__main__":
+    usage = """./iamd.py [--socket <path>]
+    
+    Keeps one connection to the MemberDatabase open and runs the tools for the
+    scripts in this directory, which connect to it automatically while it runs."""
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-s", "--socket", dest="socket", default=socket_path(), help="path of the socket to listen on")
+    (options, args) = parser.parse_args()
+    if len(args) != 0:
+        parser.error("I require no arguments")
+    
+    remove_stale_socket(options.socket)
+    # Connect before listening, so that the first request does not wait for it.
+    mdb = helper.member_database()
+    mdb.connect()
+    server = Server(options.socket, mdb)
+    signal.signal(signal.SIGTERM, stop)
+    helper.logger.info("Listening on %s." % options.socket)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(options.socket)
@@ -7,10 +7,41 @@ import Role
 import Group
 import Member
 import helper
+import iamd
+import DirectoryReplica
+from optparse import OptionParser
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = "./list_roles.py [--local]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "--local", action="store_true", dest="local", default=False, help="read from the local replica instead of the directory")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 0:
+        parser.error("I require no arguments")
+    if options.local:
+        try:
+            mdb = mdb.local_replica(helper.REPLICA_FILE)
+        except DirectoryReplica.ReplicaError, e:
+            parser.error(str(e))
+        l,s = mdb.get_connectors()
+
+    try:
+        for role in mdb.all_roles():
+            print role.get_name()
+    finally:
+        if options.local:
+            l.close()
 
 if __name__ == "__main__":
-    for role in mdb.all_roles():
-        print role.get_name()
+    iamd.run_script("list_roles", main)
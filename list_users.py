@@ -7,19 +7,44 @@ import Role
 import Group
 import Member
 import helper
+import iamd
+import DirectoryReplica
+import listing
+from optparse import OptionParser
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = "./list_users.py [--local] [--format text|json|jsonl|csv]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "--local", action="store_true", dest="local", default=False, help="read from the local replica instead of the directory")
+    listing.add_format_option(parser)
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 0:
+        parser.error("I require no arguments")
+    if options.local:
+        try:
+            mdb = mdb.local_replica(helper.REPLICA_FILE)
+        except DirectoryReplica.ReplicaError, e:
+            parser.error(str(e))
+        l,s = mdb.get_connectors()
+
+    # Print the users batch by batch while the pages of the search arrive, with
+    # the roles of each batch looked up in one search.
+    try:
+        listing.print_members(mdb.iter_batches(mdb.iter_users(hydrate=True)), options.format)
+    finally:
+        if options.local:
+            l.close()
 
 if __name__ == "__main__":
-    members = mdb.search_users()
-    # Print results
-    for member in members:
-        print "SN:          " + member.get_full_name()
-        print "CN:          " + str(member.get_lidnummer())
-        print "E-mail:      " + member.get_mail()
-        print "Afdeling:    " + member.get_afdeling()
-        if member.is_user():
-            print "Username:    " + member.get_username()
-            print "Rollen:      " + str(member.role_list())
-        print ""
+    iamd.run_script("list_users", main)
@@ -0,0 +1,181 @@
+import sys
+import csv
+import json
+
+# Output formats of the listing tools: the human-readable text, or records as
+# one JSON array, as one JSON object per line, or as CSV with a header row.
+FORMATS = ["text", "json", "jsonl", "csv"]
+
+# Fields of the records that describe a Member; see member_record.
+MEMBER_FIELDS = ["lidnummer", "name", "mail", "afdeling", "username", "roles"]
+
+class RecordWriter:
+    '''
+    Class to write records (dicts) to a stream one at a time, in one of the
+    machine-readable FORMATS, without keeping them in memory.
+    '''
+    
+    def __init__(self, stream, outputFormat, fields):
+        '''
+        (RecordWriter, file, str, list) -> None
+        
+        Initializes the RecordWriter to write to stream in outputFormat (json, jsonl
+        or csv). fields are the keys of the records, in the order of the CSV columns.
+        For CSV, the header row is written right away.
+        '''
+        if outputFormat not in ["json", "jsonl", "csv"]:
+            raise ValueError("Unknown output format %s." % outputFormat)
+        self._stream = stream
+        self._format = outputFormat
+        self._fields = fields
+        self._written = 0
+        if outputFormat == "csv":
+            self._csvWriter = csv.writer(stream)
+            self._csvWriter.writerow(fields)
+    
+    def write(self, record):
+        '''
+        (RecordWriter, dict) -> None
+        
+        Writes record. In CSV, a list value becomes one cell with the items
+        separated by ';', and None becomes an empty cell.
+        '''
+        if self._format == "csv":
+            self._csvWriter.writerow([csv_value(record.get(field)) for field in self._fields])
+        elif self._format == "jsonl":
+            self._stream.write(json.dumps(record, sort_keys=True) + "\n")
+        else:
+            if self._written == 0:
+                self._stream.write("[\n")
+            else:
+                self._stream.write(",\n")
+            self._stream.write(json.dumps(record, sort_keys=True))
+        self._written += 1
+    
+    def flush(self):
+        '''
+        (RecordWriter) -> None
+        
+        Flushes the stream, so that everything written so far can be read.
+        '''
+        self._stream.flush()
+    
+    def close(self):
+        '''
+        (RecordWriter) -> None
+        
+        Finishes the output (for JSON, closes the array) and flushes the stream. The
+        stream itself is not closed.
+        '''
+        if self._format == "json":
+            if self._written == 0:
+                self._stream.write("[")
+            else:
+                self._stream.write("\n")
+            self._stream.write("]\n")
+        self.flush()
+
+### END OF CLASS
+
+def add_format_option(parser):
+    '''
+    (OptionParser) -> None
+    
+    Adds the --format option, for one of FORMATS, to parser.
+    '''
+    parser.add_option(
+        "--format", type="choice", choices=FORMATS, dest="format", default="text", help="output format: %s (default text)" % ", ".join(FORMATS))
+
+def csv_value(value):
+    '''
+    (object) -> str
+    
+    Returns value as the text of a CSV cell.
+    '''
+    if value is None:
+        return ""
+    elif isinstance(value, list):
+        return ";".join([str(item) for item in value])
+    return str(value)
+
+def write_records(records, outputFormat, fields):
+    '''
+    (iterable, str, list) -> int
+    
+    Writes the records produced by records to standard output in outputFormat
+    (see RecordWriter) as soon as each arrives, and returns their number.
+    '''
+    writer = RecordWriter(sys.stdout, outputFormat, fields)
+    written = 0
+    for record in records:
+        writer.write(record)
+        written += 1
+    writer.close()
+    return written
+
+def member_record(member):
+    '''
+    (Member) -> dict
+    
+    Returns the record with MEMBER_FIELDS that describes member. For a member who
+    is not a user, username and roles are None. The attributes of member (and,
+    for a user, its group list) should be loaded already.
+    '''
+    record = {
+        "lidnummer": member.get_lidnummer(),
+        "name": member.get_full_name(),
+        "mail": member.get_mail(),
+        "afdeling": member.get_afdeling(),
+        "username": None,
+        "roles": None,
+    }
+    if member.is_user():
+        record["username"] = member.get_username()
+        record["roles"] = member.role_list()
+    return record
+
+def member_lines(member):
+    '''
+    (Member) -> list
+    
+    Returns the lines that describe member in the listings of list_users and
+    search_users, ending with an empty line. The attributes of member (and, for a
+    user, its group list) should be loaded already.
+    '''
+    lines = [
+        "SN:          " + member.get_full_name(),
+        "CN:          " + str(member.get_lidnummer()),
+        "E-mail:      " + member.get_mail(),
+        "Afdeling:    " + member.get_afdeling(),
+    ]
+    if member.is_user():
+        lines.append("Username:    " + member.get_username())
+        lines.append("Rollen:      " + str(member.role_list()))
+    lines.append("")
+    return lines
+
+def print_members(batches, outputFormat = "text"):
+    '''
+    (iterable, str) -> int
+    
+    Prints the Members in batches, lists of Members as yielded by
+    MemberDatabase.iter_batches, as text (see member_lines) or as records in one
+    of the other FORMATS (see member_record). Standard output is flushed after
+    every list, so each list shows up as soon as it is ready. Returns the number
+    of Members printed.
+    '''
+    writer = None
+    if outputFormat != "text":
+        writer = RecordWriter(sys.stdout, outputFormat, MEMBER_FIELDS)
+    printed = 0
+    for batch in batches:
+        for member in batch:
+            if writer is None:
+                sys.stdout.write("\n".join(member_lines(member)) + "\n")
+            else:
+                writer.write(member_record(member))
+        sys.stdout.flush()
+        printed += len(batch)
+    if writer is not None:
+        writer.close()
+    return printed
@@ -0,0 +1,101 @@
+import smtplib
+import socket
+
+SENDER = "ict@jd.nl"
+
+class Mailer:
+    '''
+    Class to send e-mail over one SMTP session that is reused for many messages.
+    '''
+    
+    def __init__(self, host, loggingFacility, sender = SENDER):
+        '''
+        (Mailer, str, Logger, str) -> None
+        
+        Initialize the Mailer for the SMTP relay at host. The session is opened on
+        the first message. sender is the envelope sender of all messages.
+        '''
+        self._host = host
+        self._logger = loggingFacility
+        self._sender = sender
+        self._session = None
+    
+    def __enter__(self):
+        '''
+        (Mailer) -> Mailer
+        
+        Allows a Mailer to be used in a with statement, which closes it afterwards.
+        '''
+        return self
+    
+    def __exit__(self, exceptionType, exception, traceback):
+        '''
+        (Mailer, type, Exception, traceback) -> bool
+        
+        Closes the Mailer at the end of a with statement.
+        '''
+        self.close()
+        return False
+    
+    def send(self, toAddress, message):
+        '''
+        (Mailer, str, Message) -> str (or None)
+        
+        Sends message to toAddress over the SMTP session, opening it if needed.
+        If the session turns out to have been dropped, it is opened again and
+        the message is sent once more. Returns None if the relay accepted the
+        message, and otherwise a description of the reason it was not sent.
+        '''
+        for attempt in range(2):
+            try:
+                if self._session is None:
+                    self._session = smtplib.SMTP(self._host)
+                self._session.sendmail(self._sender, toAddress, message.as_string())
+                return None
+            except (smtplib.SMTPServerDisconnected, socket.error), e:
+                # The connection is gone (or could not be made): start over.
+                self._session = None
+                error = describe_error(e)
+            except smtplib.SMTPException, e:
+                # The relay refused this message; the session itself is still fine.
+                return describe_error(e)
+        return error
+    
+    def send_many(self, messages):
+        '''
+        (Mailer, list) -> list
+        
+        Sends each (toAddress, message) in messages over the same SMTP session.
+        Returns a list with a (message, error) pair for every message, in the order
+        of messages, where error is the result of send: None if the message was
+        accepted, and otherwise the reason it was not.
+        '''
+        results = []
+        for toAddress, message in messages:
+            results.append((message, self.send(toAddress, message)))
+        return results
+    
+    def close(self):
+        '''
+        (Mailer) -> None
+        
+        Ends the SMTP session, if one is open.
+        '''
+        if self._session is not None:
+            try:
+                self._session.quit()
+            except (smtplib.SMTPException, socket.error), e:
+                self._logger.debug("Could not close SMTP session cleanly: %s" % describe_error(e))
+            self._session = None
+
+def describe_error(error):
+    '''
+    (Exception) -> str
+    
+    Returns a short human-readable description of an SMTP or socket error.
+    '''
+    if isinstance(error, socket.error) and len(error.args) > 1:
+        return str(error.args[1]).lower()
+    elif isinstance(error, smtplib.SMTPRecipientsRefused):
+        return "recipient refused"
+    return str(error) or error.__class__.__name__
@@ -7,17 +7,19 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
-import smtplib
 from email.mime.text import MIMEText
-import errno
-import socket
+import mailer
 
-def send_confirmation_email(fullName, username, password, mail):
+# Passing this as username lets the tool choose the best available username.
+AUTO_USERNAME = "-"
+
+def confirmation_email(fullName, username, password, mail):
     '''
-    (str, str, str, str) -> None
+    (str, str, str, str) -> MIMEText
     
-    Sends a confirmation e-mail to a member who has just been promoted to user. The e-mail contains instructions and login credentials.
+    Returns the confirmation e-mail for a member who has just been promoted to user. The e-mail contains instructions and login credentials.
     '''
     msg = MIMEText("""Beste %s,
 
@@ -37,23 +39,58 @@ Het ICT-team""" % (fullName, username, password))
     msg['Subject'] = "Nieuw MijnJD-account aangemaakt"
     msg['From'] = "Jonge Democraten ICT-team <noreply@jd.nl>"
     msg['To'] = "%s <%s>" % (fullName, mail)
+    return msg
 
+def send_confirmation_email(fullName, username, password, mail, sessionMailer = None):
+    '''
+    (str, str, str, str, Mailer) -> bool
+    
+    Sends a confirmation e-mail to a member who has just been promoted to user. If sessionMailer is given, its SMTP session is used, so that many e-mails can be sent over one session. Otherwise, a session is opened for this e-mail only. Returns True iff the e-mail was sent.
+    '''
+    ownMailer = sessionMailer is None
+    if ownMailer:
+        sessionMailer = mailer.Mailer(helper.mail_config()['host'], helper.logger)
     try:
-        sm = smtplib.SMTP('localhost')
-        sm.sendmail("ict@jd.nl", mail, msg.as_string())
-        sm.quit()
-    except socket.error, v:
-        errorCode = v[0]
-        if errorCode == errno.ECONNREFUSED:
-            helper.logger.error("Could not send confirmation e-mail to %s: connection refused." % (fullName))
+        error = sessionMailer.send(mail, confirmation_email(fullName, username, password, mail))
+    finally:
+        if ownMailer:
+            sessionMailer.close()
+    if error is not None:
+        helper.logger.error("Could not send confirmation e-mail to %s: %s." % (fullName, error))
+    return error is None
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
+def choose_username(mdb, member):
+    '''
+    (MemberDatabase, Member) -> str
+    
+    Returns the best available username for member, based on its full name. Exits
+    if the member does not exist or no username can be made from its name.
+    '''
+    if not member.exists():
+        helper.logger.error("The lidnummer does not correspond with an actual Member.")
+        sys.exit()
+    username = mdb.username_registry().assign(member.get_full_name())
+    if username is None:
+        helper.logger.error("Could not make a username from the name of member %s. Choose a username." % member.get_lidnummer())
+        sys.exit()
+    helper.logger.info("Chose username %s for member %s." % (username, member.get_lidnummer()))
+    return username
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
     # Parse arguments
     usage = """./make_user.py <lidnummer> <username> <passwordType>
     
+    Use - as username to choose the best available username automatically.
+    
     Password types are as follows:
         
         0 -> 8 characters, uppercase, lowercase, digits, special
@@ -61,7 +98,7 @@ if __name__ == "__main__":
         2 -> 11 characters, lowercase
         3 -> 5 random Dutch words, lowercase"""
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) != 3:
         parser.error("I require three arguments")
     lidnummer = str(args[0])
@@ -74,13 +111,15 @@ if __name__ == "__main__":
     # Check validity of arguments
     if passwordType < 0 or passwordType > 3:
         parser.error("passwordType should be 0, 1, 2 or 3.")
-    if not Member.is_valid_username(username):
+    if username != AUTO_USERNAME and not Member.is_valid_username(username):
         parser.error("Username contains illegal characters.")
     if not Member.is_valid_lidnummer(lidnummer):
         parser.error("Lidnummer is not numerical. Remember: lidnummer first, then username. Aborting...")
     
     # The function make_user also checks whether the provided lidnummer is not already a user.
-    member = Member.Member(l,s,int(lidnummer))
+    member = mdb.get_member(int(lidnummer))
+    if username == AUTO_USERNAME:
+        username = choose_username(mdb, member)
     try:
         password = member.make_user(username, passwordType)
     except Member.UsernameError:
@@ -100,4 +139,6 @@ if __name__ == "__main__":
     send_confirmation_email(fullName, username, password, mail)
 
     helper.logger.info("Promoted member %s (%s) to user %s" % (fullName, lidnummer, username))
-    
+
+if __name__ == "__main__":
+    iamd.run_script("make_user", main)
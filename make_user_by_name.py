@@ -7,6 +7,7 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
 import smtplib
 from email.mime.text import MIMEText
@@ -15,12 +16,20 @@ import socket
 import ldap
 import make_user
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
     # Parse arguments
-    usage = """./make_user.py <full name> <username> <passwordType>
+    usage = """./make_user_by_name.py <full name> <username> <passwordType>
+    
+    Use - as username to choose the best available username automatically.
     
     Password types are as follows:
         
@@ -29,7 +38,7 @@ if __name__ == "__main__":
         2 -> 11 characters, lowercase
         3 -> 5 random Dutch words, lowercase"""
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) < 3:
         parser.error("I require three arguments")
     fullName = ' '.join(args[:-2])
@@ -42,14 +51,14 @@ if __name__ == "__main__":
     # Check validity of arguments
     if passwordType < 0 or passwordType > 3:
         parser.error("passwordType should be 0, 1, 2 or 3.")
-    if not Member.is_valid_username(username):
+    if username != make_user.AUTO_USERNAME and not Member.is_valid_username(username):
         parser.error("Username contains illegal characters.")
     if not Member.is_valid_full_name(fullName):
         parser.error("Full name contains invalid characters.")
     
     # Determine which Member is meant by fullName
     try:
-        members = mdb.search_members("sn=*%s*" % fullName)
+        members = mdb.search_members("sn=*%s*" % fullName, hydrate=True)
     except ldap.NO_RESULTS_RETURNED:
         helper.logger.error("No member found by that name.")
         sys.exit()
@@ -58,6 +67,8 @@ if __name__ == "__main__":
         sys.exit()
     else:
         member = members[0]
+        if username == make_user.AUTO_USERNAME:
+            username = make_user.choose_username(mdb, member)
         
         # The function make_user also checks whether the provided lidnummer is not already a user.
         try:
@@ -78,4 +89,6 @@ if __name__ == "__main__":
         make_user.send_confirmation_email(fullName, username, password, mail)
     
         helper.logger.info("Promoted member %s (%s) to user %s" % (fullName, member.get_lidnummer(), username))
-        
+
+if __name__ == "__main__":
+    iamd.run_script("make_user_by_name", main)
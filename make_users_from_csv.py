@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+import sys
+sys.path.append("MemberDB")
+import MemberDatabase
+import Role
+import Group
+import Member
+import helper
+import iamd
+import make_user
+import mailer
+from optparse import OptionParser
+import csv
+
+
+def read_promotions(csvFile):
+    '''
+    (file) -> list
+    
+    Reads the rows (lidnummer, username, passwordType) from csvFile and returns them
+    as a list of tuples (lineNumber, lidnummer, username, passwordType), with all
+    values as str. Empty lines, lines starting with '#' and a header line starting
+    with 'lidnummer' are skipped.
+    '''
+    rows = []
+    lineNumber = 0
+    for row in csv.reader(csvFile):
+        lineNumber += 1
+        if len(row) == 0 or row[0].strip() == "" or row[0].startswith("#"):
+            continue
+        if lineNumber == 1 and row[0].strip().lower() == "lidnummer":
+            continue
+        row = [value.strip() for value in row] + ["", "", ""]
+        rows.append((lineNumber, row[0], row[1], row[2]))
+    return rows
+
+def check_promotion(lidnummer, username, passwordType):
+    '''
+    (str, str, str) -> str (or None)
+    
+    Returns a description of what is wrong with a row, or None if it is valid.
+    '''
+    if not Member.is_valid_lidnummer(lidnummer):
+        return "Lidnummer is not numerical."
+    elif username not in ["", make_user.AUTO_USERNAME] and not Member.is_valid_username(username):
+        return "Username contains illegal characters."
+    elif passwordType not in ["0", "1", "2", "3"]:
+        return "passwordType should be 0, 1, 2 or 3."
+    return None
+
+def assign_usernames(mdb, promotions):
+    '''
+    (MemberDatabase, list) -> list
+    
+    Chooses usernames for the promotions (lineNumber, Member, username, passwordType)
+    that have no username or -, based on the member's full name. Usernames given in
+    the file are reserved first, so they are never chosen for another member.
+    Returns the promotions with the chosen usernames filled in; promotions for
+    which no username could be chosen are logged and left out.
+    '''
+    registry = mdb.username_registry()
+    automatic = []
+    for lineNumber, member, username, passwordType in promotions:
+        if username in ["", make_user.AUTO_USERNAME]:
+            automatic.append(member)
+        else:
+            registry.reserve(username)
+    missing = set([member.get_lidnummer() for member in mdb.hydrate(automatic)])
+    assigned = []
+    for lineNumber, member, username, passwordType in promotions:
+        if username in ["", make_user.AUTO_USERNAME]:
+            if member.get_lidnummer() in missing:
+                helper.logger.error("Line %i (%s): The lidnummer does not correspond with an actual Member." % (lineNumber, member.get_lidnummer()))
+                continue
+            username = registry.assign(member.get_full_name())
+            if username is None:
+                helper.logger.error("Line %i (%s): Could not make a username from the name of the member." % (lineNumber, member.get_lidnummer()))
+                continue
+        assigned.append((lineNumber, member, username, passwordType))
+    return assigned
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = """./make_users_from_csv.py <csv file>
+    
+    Promotes many members to user at once. Each line of the CSV file contains
+    lidnummer, username and passwordType, separated by commas. If the username is
+    empty or -, the best available username is chosen automatically.
+    
+    Password types are as follows:
+        
+        0 -> 8 characters, uppercase, lowercase, digits, special
+        1 -> 9 characters, uppercase, lowercase
+        2 -> 11 characters, lowercase
+        3 -> 5 random Dutch words, lowercase"""
+    parser = OptionParser(usage)
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("I require one argument")
+    try:
+        csvFile = open(args[0], 'rb')
+    except IOError, e:
+        parser.error("Could not open %s: %s" % (args[0], e.strerror))
+    try:
+        rows = read_promotions(csvFile)
+    finally:
+        csvFile.close()
+    
+    # Check validity of rows; only valid rows are promoted
+    promotions = []
+    for lineNumber, lidnummer, username, passwordType in rows:
+        error = check_promotion(lidnummer, username, passwordType)
+        if error is not None:
+            helper.logger.error("Line %i (%s, %s): %s" % (lineNumber, lidnummer, username, error))
+        else:
+            promotions.append((lineNumber, mdb.get_member(int(lidnummer)), username, int(passwordType)))
+    promotions = assign_usernames(mdb, promotions)
+    
+    # Promote members and send confirmation e-mails over one SMTP session
+    results = mdb.make_users([(member, username, passwordType) for lineNumber, member, username, passwordType in promotions])
+    promoted = 0
+    with mailer.Mailer(helper.mail_config()['host'], helper.logger) as sessionMailer:
+        for (lineNumber, member, username, passwordType), (password, error) in zip(promotions, results):
+            if error is not None:
+                helper.logger.error("Line %i (%s, %s): %s" % (lineNumber, member.get_lidnummer(), username, error))
+                continue
+            fullName = member.get_full_name()
+            make_user.send_confirmation_email(fullName, username, password, member.get_mail(), sessionMailer)
+            helper.logger.info("Promoted member %s (%s) to user %s" % (fullName, member.get_lidnummer(), username))
+            promoted += 1
+    helper.logger.info("Promoted %i of %i members in %s." % (promoted, len(rows), args[0]))
+
+if __name__ == "__main__":
+    # Reads a local file, so it always connects directly instead of through iamd.
+    iamd.run_main(main, helper.member_database(), sys.argv[1:])
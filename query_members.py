@@ -0,0 +1,60 @@
+#!/usr/bin/python
+
+import sys
+sys.path.append("MemberDB")
+import MemberDatabase
+import MembershipQuery
+import Member
+import helper
+import iamd
+from optparse import OptionParser
+
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = """./query_members.py [-v] "<expression>"
+    
+    Lists the members that satisfy a membership expression, which combines group
+    names with | (union), & (intersection) and - (difference). Operators must be
+    surrounded by spaces; & binds stronger than | and -, and parentheses group.
+    A group name with * stands for all groups whose name matches.
+    
+    Examples:
+        "role-lb - role-ict"          members with role-lb but not role-ict
+        "type-outofband & role-*"     out-of-band members that hold any role
+        "role-lb & role-ict"          members with both roles"""
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-v", "--verbose", action="store_true", dest="verbose", default=False, help="also print name and username of each member")
+    (options, args) = parser.parse_args(argv)
+    if len(args) < 1:
+        parser.error("I require a membership expression")
+    
+    # Evaluate the expression
+    try:
+        members = mdb.query_members(" ".join(args))
+    except MembershipQuery.QueryError, e:
+        parser.error(str(e))
+    
+    # Print results
+    if options.verbose:
+        mdb.hydrate(members)
+    for member in members:
+        if not options.verbose:
+            print member.get_lidnummer()
+        elif member.is_user():
+            print "%s\t%s\t%s" % (member.get_lidnummer(), member.get_full_name(), member.get_username())
+        else:
+            print "%s\t%s" % (member.get_lidnummer(), member.get_full_name())
+    helper.logger.info("%i members found." % len(members))
+
+if __name__ == "__main__":
+    iamd.run_script("query_members", main)
@@ -7,41 +7,66 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
 
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
     # Parse arguments
-    usage = "./remove_role.py <role> <username>"
+    usage = """./remove_role.py <role> <username> [<username> ...]
+    
+    With more than one username, the role is revoked from all of them in one
+    modification."""
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
-    if len(args) != 2:
-        parser.error("I require two arguments")
+    (options, args) = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("I require at least two arguments")
     roleName = str(args[0])
-    username = str(args[1])
+    usernames = []
+    for username in args[1:]:
+        if str(username) not in usernames:
+            usernames.append(str(username))
 
     # Check validity of arguments
     if not Role.is_valid_role_name(roleName):
         parser.error("Not a valid role name. Aborting...")
-    role = Role.Role(l,s,roleName)
+    role = mdb.get_role(roleName)
     if not role.exists():
         helper.logger.error("Role %s does not exist. Aborting..." % roleName)
         sys.exit()
-    if not Member.is_valid_username(username):
-        parser.error("Not a valid username. Aborting...")
-    helper.logger.debug("Looking up username %s." % username)
-    try:
-        member = Member.Member.from_username(l,s,username)
-    except Member.UsernameError:
-        helper.logger.error("Username %s does not exist. Aborting..." % username)
-        sys.exit()
-    if not member in role.members():
-        helper.logger.error("User %s does not have role %s. Aborting..." % (username, roleName))
+    for username in usernames:
+        if not Member.is_valid_username(username):
+            parser.error("Not a valid username: %s. Aborting..." % username)
+    helper.logger.debug("Looking up usernames %s." % ", ".join(usernames))
+    users = mdb.users_by_username(usernames)
+    for username in usernames:
+        if username not in users:
+            helper.logger.error("Username %s does not exist. Aborting..." % username)
+            sys.exit()
+    roleMemberDNs = role.member_dns()
+    members = []
+    for username in usernames:
+        member = users[username]
+        if member.DN().lower() not in roleMemberDNs:
+            helper.logger.error("User %s does not have role %s." % (username, roleName))
+        else:
+            members.append(member)
+    if not members:
+        helper.logger.error("Nothing to do. Aborting...")
         sys.exit()
     
-    # Revoke role from user
-    role.revoke(member)
-    helper.logger.info("Revoked role %s from user %s." % (roleName, username))
+    # Revoke role from users, in one modification
+    role.revoke_many(members)
+    for member in members:
+        helper.logger.info("Revoked role %s from user %s." % (roleName, member.get_username()))
+
+if __name__ == "__main__":
+    iamd.run_script("remove_role", main)
@@ -7,16 +7,23 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
     # Parse arguments
     usage = """./makeuser.py <lidnummer> <username>"""
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) != 2:
         parser.error("I require two arguments")
     lidnummer = str(args[0])
@@ -28,21 +35,15 @@ if __name__ == "__main__":
     if not Member.is_valid_lidnummer(lidnummer):
         parser.error("Lidnummer is not numerical. Remember: lidnummer first, then username. Aborting...")
     
-    # The function make_user also checks whether the provided lidnummer is actually a user.
-    member = Member.Member(l,s,int(lidnummer))
-    if not member.exists():
-        helper.logger.error("User with this lidnummer does not exist. Aborting...")
-        sys.exit()
-    try:
-        mdb.revoke_all_roles(member)
-        password = member.remove_user(lidnummer, username)
-    except Member.UsernameError, e:
-        helper.logger.error(e)
-        sys.exit()
-    except Member.LidnummerError, e:
-        helper.logger.error(e)
-        sys.exit()
-    except Member.MemberError, e:
-        helper.logger.error(e)
+    # The function remove_users also checks whether the provided lidnummer is
+    # actually a user with this username. It revokes all roles and deletes the
+    # username in one pipelined batch.
+    member = mdb.get_member(int(lidnummer))
+    error = mdb.remove_users([(member, username)])[0]
+    if error is not None:
+        helper.logger.error(error)
         sys.exit()
     helper.logger.info("User status and username %s were successfully taken away from member %s (%s)" % (username, member.get_full_name(), lidnummer))
+
+if __name__ == "__main__":
+    iamd.run_script("remove_user", main)
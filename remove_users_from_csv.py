@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+import sys
+sys.path.append("MemberDB")
+import MemberDatabase
+import Member
+import helper
+import iamd
+from optparse import OptionParser
+import csv
+
+
+def read_removals(csvFile):
+    '''
+    (file) -> list
+    
+    Reads the rows (lidnummer, username) from csvFile and returns them as a list
+    of tuples (lineNumber, lidnummer, username), with all values as str. Empty
+    lines, lines starting with '#' and a header line starting with 'lidnummer'
+    are skipped.
+    '''
+    rows = []
+    lineNumber = 0
+    for row in csv.reader(csvFile):
+        lineNumber += 1
+        if len(row) == 0 or row[0].strip() == "" or row[0].startswith("#"):
+            continue
+        if lineNumber == 1 and row[0].strip().lower() == "lidnummer":
+            continue
+        row = [value.strip() for value in row] + ["", ""]
+        rows.append((lineNumber, row[0], row[1]))
+    return rows
+
+def check_removal(lidnummer, username):
+    '''
+    (str, str) -> str (or None)
+    
+    Returns a description of what is wrong with a row, or None if it is valid.
+    '''
+    if not Member.is_valid_lidnummer(lidnummer):
+        return "Lidnummer is not numerical."
+    elif not Member.is_valid_username(username):
+        return "Username contains illegal characters."
+    return None
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = """./remove_users_from_csv.py <csv file>
+    
+    Takes user status away from many members at once, e.g. lapsed members at the
+    end of the year. Each line of the CSV file contains lidnummer and username,
+    separated by a comma. All roles of these users are revoked and their usernames
+    deleted."""
+    parser = OptionParser(usage)
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("I require one argument")
+    try:
+        csvFile = open(args[0], 'rb')
+    except IOError, e:
+        parser.error("Could not open %s: %s" % (args[0], e.strerror))
+    try:
+        rows = read_removals(csvFile)
+    finally:
+        csvFile.close()
+    
+    # Check validity of rows; only valid rows are removed
+    removals = []
+    for lineNumber, lidnummer, username in rows:
+        error = check_removal(lidnummer, username)
+        if error is not None:
+            helper.logger.error("Line %i (%s, %s): %s" % (lineNumber, lidnummer, username, error))
+        else:
+            removals.append((lineNumber, mdb.get_member(int(lidnummer)), username))
+    
+    # Remove users in one pass
+    errors = mdb.remove_users([(member, username) for lineNumber, member, username in removals])
+    removed = 0
+    for (lineNumber, member, username), error in zip(removals, errors):
+        if error is not None:
+            helper.logger.error("Line %i (%s, %s): %s" % (lineNumber, member.get_lidnummer(), username, error))
+            continue
+        helper.logger.info("User status and username %s were successfully taken away from member %s (%s)" % (username, member.get_full_name(), member.get_lidnummer()))
+        removed += 1
+    helper.logger.info("Removed %i of %i users in %s." % (removed, len(rows), args[0]))
+
+if __name__ == "__main__":
+    # Reads a local file, so it always connects directly instead of through iamd.
+    iamd.run_main(main, helper.member_database(), sys.argv[1:])
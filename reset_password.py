@@ -7,17 +7,44 @@ import Role
 import Group
 import Member
 import helper
+import iamd
 from optparse import OptionParser
-import smtplib
 from email.mime.text import MIMEText
-import errno
-import socket
+import mailer
 
+def password_reset_email(fullName, username, password, mail):
+    '''
+    (str, str, str, str) -> MIMEText
+    
+    Returns the e-mail that tells a user the new password that has been set for them.
+    '''
+    msg = MIMEText("""Beste %s,
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+Er is een nieuw wachtwoord ingesteld voor je MijnJD-account. Je inloggegevens vind je hieronder. Bewaar ze goed, en houd ze geheim. Als je je wachtwoord nog eens vergeet, kan de Algemeen Secretaris van het Landelijk Bestuur je een nieuw wachtwoord geven.
+
+  Gebruikersnaam: %s
+  Wachtwoord: %s
+
+Als je nog vragen hebt over dit systeem, neem dan contact op met het ICT-team op ict@jd.nl.
+
+Hartelijke groeten,
+
+Het ICT-team""" % (fullName, username, password))
+
+    msg['Subject'] = "Wachtwoord-reset voor MijnJD-account"
+    msg['From'] = "Jonge Democraten ICT-team <noreply@jd.nl>"
+    msg['To'] = "%s <%s>" % (fullName, mail)
+    return msg
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
     # Parse arguments
     usage = """./reset_password.py <lidnummer> <passwordType> or ./resetpassword.py <username> <passwordType>
     
@@ -28,7 +55,7 @@ if __name__ == "__main__":
         2 -> 11 characters, lowercase
         3 -> 5 random Dutch words, lowercase"""
     parser = OptionParser(usage)
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     if len(args) != 2:
         parser.error("I require two arguments.")
     numberOrName = str(args[0])
@@ -42,12 +69,12 @@ if __name__ == "__main__":
         parser.error("passwordType should be 0, 1, 2 or 3.")
     if Member.is_valid_lidnummer(numberOrName):
         lidnummer = numberOrName
-        member = Member.Member(l,s,int(lidnummer))
+        member = mdb.get_member(int(lidnummer))
         if not member.exists():
-            logger.error("Could not find lidnummer in MemberDatabase. Aborting...")
+            helper.logger.error("Could not find lidnummer in MemberDatabase. Aborting...")
             sys.exit()
         elif not member.is_user():
-            logger.error("Member is not a user. Promote him to user to set a password.")
+            helper.logger.error("Member is not a user. Promote him to user to set a password.")
             sys.exit()
         username = member.get_username()
     elif Member.is_valid_username(numberOrName):
@@ -55,7 +82,7 @@ if __name__ == "__main__":
         try:
             member = Member.Member.from_username(l,s,username)
         except Member.UsernameError:
-            logger.error("Could not find username in MemberDatabase. Aborting...")
+            helper.logger.error("Could not find username in MemberDatabase. Aborting...")
             sys.exit()
     else:
         parser.error("This is neither a valid lidnummer, nor a valid username. Aborting...")
@@ -68,30 +95,12 @@ if __name__ == "__main__":
     member.set_password(password)
     
     # Send new password to user
-    msg = MIMEText("""Beste %s,
-
-Er is een nieuw wachtwoord ingesteld voor je MijnJD-account. Je inloggegevens vind je hieronder. Bewaar ze goed, en houd ze geheim. Als je je wachtwoord nog eens vergeet, kan de Algemeen Secretaris van het Landelijk Bestuur je een nieuw wachtwoord geven.
-
-  Gebruikersnaam: %s
-  Wachtwoord: %s
-
-Als je nog vragen hebt over dit systeem, neem dan contact op met het ICT-team op ict@jd.nl.
-
-Hartelijke groeten,
-
-Het ICT-team""" % (fullName, username, password))
-
-    msg['Subject'] = "Wachtwoord-reset voor MijnJD-account"
-    msg['From'] = "Jonge Democraten ICT-team <noreply@jd.nl>"
-    msg['To'] = "%s <%s>" % (fullName, mail)
-
-    try:
-        sm = smtplib.SMTP(helper.mailcfg['host'])
-        sm.sendmail("ict@jd.nl", mail, msg.as_string())
-        sm.quit()
-    except socket.error, v:
-        errorCode = v[0]
-        if errorCode == errno.ECONNREFUSED:
-            helper.logger.error("Could not send new password e-mail to %s: connection refused." % (fullName))
+    with mailer.Mailer(helper.mail_config()['host'], helper.logger) as sessionMailer:
+        error = sessionMailer.send(mail, password_reset_email(fullName, username, password, mail))
+    if error is not None:
+        helper.logger.error("Could not send new password e-mail to %s: %s." % (fullName, error))
 
     helper.logger.info("Performed a password reset for %s (%s), username %s " % (fullName, member.get_lidnummer(), username))
+
+if __name__ == "__main__":
+    iamd.run_script("reset_password", main)
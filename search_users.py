@@ -7,12 +7,25 @@ import Role
 import Group
 import Member
 import helper
+import iamd
+import DirectoryReplica
+import listing
 from optparse import OptionParser
+import os
 
-mdb = MemberDatabase.MemberDatabase(helper.ldapcfg, helper.dbcfg, helper.logger)
-l,s = mdb.get_connectors()
+# Local trigram index for substring searches on name, e-mail address and username.
+INDEX_FILE = os.path.join(helper.SCRIPTDIR, "search.idx")
+
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
 
-if __name__ == "__main__":
     # Define command-line options
     usage = """
     %prog options arguments
@@ -20,7 +33,10 @@ if __name__ == "__main__":
       -n :  in name mode, argument is part of name for which to search
       -e :  in e-mail address mode, argument is part of e-mail address for which to search
       -u :  in username mode, argument is part of a username for which to search
-      -a :  search all members, not just users"""
+      -a :  search all members, not just users
+      --no-index :  search the directory directly instead of the local index
+      --local :  search the local replica instead of the directory
+      --format :  output as text (default), json, jsonl or csv"""
     parser = OptionParser(usage)
     parser.add_option(
         "-i", "--id", action="store_true", dest="id", help="search by member id")
@@ -32,8 +48,13 @@ if __name__ == "__main__":
         "-u", "--username", action="store_true", dest="username", help="search by username")
     parser.add_option(
         "-a", "--all", action="store_true", dest="all", help="search all members, not just users")
+    parser.add_option(
+        "--no-index", action="store_false", dest="index", default=True, help="search the directory directly instead of the local index")
+    parser.add_option(
+        "--local", action="store_true", dest="local", default=False, help="read from the local replica instead of the directory")
+    listing.add_format_option(parser)
     # Read options and check sanity 
-    (options, args) = parser.parse_args()
+    (options, args) = parser.parse_args(argv)
     numoptions = 0
     if options.id:
         numoptions += 1
@@ -87,20 +108,29 @@ if __name__ == "__main__":
             sys.exit()
     if searchFilter == "":
         parser.error("Invalid option.")
+    if options.local:
+        try:
+            mdb = mdb.local_replica(helper.REPLICA_FILE)
+        except DirectoryReplica.ReplicaError, e:
+            parser.error(str(e))
+        l,s = mdb.get_connectors()
     
-    # Search for users or members, depending on -a option.
-    if options.all:
-        members = mdb.search_members(searchFilter)
-    else:
-        members = mdb.search_users(searchFilter)
+    # Search for users or members, depending on -a option. Substring searches are
+    # answered by the local index; slapd would scan every entry for them.
+    try:
+        if options.index and not options.id and not options.local:
+            attribute, pattern = searchFilter.split("=", 1)
+            members = mdb.search_members_indexed(INDEX_FILE, attribute, pattern, not options.all)
+        elif options.all:
+            members = mdb.iter_members(searchFilter, hydrate=True)
+        else:
+            members = mdb.iter_users(searchFilter, hydrate=True)
         
-    # Print results
-    for member in members:
-        print "SN:          " + member.get_full_name()
-        print "CN:          " + str(member.get_lidnummer())
-        print "E-mail:      " + member.get_mail()
-        print "Afdeling:    " + member.get_afdeling()
-        if member.is_user():
-            print "Username:    " + member.get_username()
-            print "Rollen:      " + str(member.role_list())
-        print ""
+        # Print the results batch by batch as they arrive
+        listing.print_members(mdb.iter_batches(members), options.format)
+    finally:
+        if options.local:
+            l.close()
+
+if __name__ == "__main__":
+    iamd.run_script("search_users", main)
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+
+import sys
+sys.path.append("MemberDB")
+import MemberDatabase
+import helper
+import iamd
+from optparse import OptionParser
+
+
+def main(mdb, argv):
+    '''
+    (MemberDatabase, list) -> None
+    
+    Runs the tool on mdb, with the command-line arguments in argv (without the
+    program name).
+    '''
+    l,s = mdb.get_connectors()
+
+    # Parse arguments
+    usage = """./sync_replica.py [--full]
+    
+    Brings the local mirror of ou=users and ou=groups, which read-only tools use
+    with --local, up to date. Only the changes since the last run are read, unless
+    --full is given. Run it from cron to keep the mirror fresh."""
+    parser = OptionParser(usage)
+    parser.add_option(
+        "--full", action="store_true", dest="full", default=False, help="copy all records instead of only the changes")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 0:
+        parser.error("I require no arguments")
+    
+    replica = mdb.replica(helper.REPLICA_FILE)
+    try:
+        written, deleted = replica.sync(l, options.full)
+    finally:
+        replica.close()
+    helper.logger.info("Synchronized the local replica: %i records written, %i deleted." % (written, deleted))
+
+if __name__ == "__main__":
+    iamd.run_script("sync_replica", main)